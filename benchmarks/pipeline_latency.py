@@ -0,0 +1,128 @@
+"""Upsert throughput of Target vs PipelinedTarget over a high latency link.
+
+Runs a local TCP proxy in front of the TARGET database that delays every
+packet by half the given round trip time, then upserts the same records into
+a scratch table with Target (one page in flight) and PipelinedTarget at
+several pipeline depths. Needs psycopg 3 next to psycopg2.
+
+    TARGET=... python benchmarks/pipeline_latency.py [--rows N] [--rtt MS ...] [--depth N ...]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+from base_loader.persistence import PipelinedTarget, Target
+
+UPSERT = (
+    "INSERT INTO pipeline_bench VALUES %s "
+    "ON CONFLICT (gvkey, datadate) DO UPDATE SET v = EXCLUDED.v "
+    "RETURNING (xmax = 0) AS inserted;"
+)
+
+
+class DelayProxy:
+    """TCP proxy delaying each direction by 'delay' seconds, order kept."""
+
+    def __init__(self, upstream: dict, delay: float) -> None:
+        self.upstream = upstream
+        self.delay = delay
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self._serve, args=(started,), daemon=True).start()
+        started.wait()
+
+    def _serve(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        started.set()
+        self._loop.run_forever()
+
+    async def _handle(self, client_reader, client_writer) -> None:
+        host = self.upstream.get("host") or "localhost"
+        port = int(self.upstream.get("port") or 5432)
+        if host.startswith("/"):
+            reader, writer = await asyncio.open_unix_connection(f"{host}/.s.PGSQL.{port}")
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        await asyncio.gather(
+            self._pipe(client_reader, writer), self._pipe(reader, client_writer)
+        )
+
+    async def _pipe(self, reader, writer) -> None:
+        packets: asyncio.Queue = asyncio.Queue()
+
+        async def deliver() -> None:
+            while True:
+                due, data = await packets.get()
+                await asyncio.sleep(max(due - time.monotonic(), 0))
+                if not data:
+                    writer.close()
+                    return
+                writer.write(data)
+                await writer.drain()
+
+        task = asyncio.ensure_future(deliver())
+        while True:
+            data = await reader.read(65536)
+            packets.put_nowait((time.monotonic() + self.delay, data))
+            if not data:
+                break
+        await task
+
+
+def upsert_seconds(target: Target, rows: int) -> float:
+    """Times upserting new records into a scratch table, then rolls back."""
+    base = datetime(2000, 1, 3)
+    records = [(base + timedelta(days=i % 5000), i // 5000, 1.0) for i in range(rows)]
+    target.execute_query(
+        "CREATE TEMP TABLE pipeline_bench (datadate TIMESTAMP, gvkey INTEGER, v FLOAT, "
+        "PRIMARY KEY (gvkey, datadate));"
+    )
+    start = time.perf_counter()
+    inserted, _, _ = target.upsert(UPSERT, records)
+    seconds = time.perf_counter() - start
+    assert inserted == rows
+    target.rollback_transaction()
+    return seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--rtt", type=float, action="append", help="round trip time in ms")
+    parser.add_argument("--depth", type=int, action="append", help="pipeline depth")
+    args = parser.parse_args()
+
+    dsn = os.environ["TARGET"]
+    rtts = args.rtt or [0.0, 2.0, 10.0]
+    depths = args.depth or [1, 4, 16]
+    print(f"{args.rows} rows, {-(-args.rows // 100)} pages per upsert")
+
+    for rtt in rtts:
+        proxy = DelayProxy(conninfo_to_dict(dsn), rtt / 2000)
+        proxied = make_conninfo(dsn, host="127.0.0.1", port=str(proxy.port), sslmode="disable")
+
+        target = Target(proxied)
+        baseline = upsert_seconds(target, args.rows)
+        target.disconnect()
+        line = f"rtt {rtt:>5.1f} ms: Target {args.rows / baseline:>9.0f} rows/s"
+        for depth in depths:
+            target = PipelinedTarget(proxied, depth=depth)
+            seconds = upsert_seconds(target, args.rows)
+            target.disconnect()
+            line += f", depth {depth} {args.rows / seconds:>9.0f} rows/s ({baseline / seconds:.1f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
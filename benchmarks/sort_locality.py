@@ -0,0 +1,105 @@
+"""Index locality of upserts in file order vs (gvkey, datadate) order.
+
+Simulates the leaf pages of the (gvkey, datadate) primary key B-tree and an
+LRU buffer cache, then counts the page misses caused by writing the same keys
+in the order they arrive from the source files and in primary key order.
+With TARGET set, the same rows are also upserted into a scratch table.
+
+    python benchmarks/sort_locality.py [--gvkeys N] [--days N] [--files N]
+"""
+
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import os
+import time
+
+import numpy as np
+
+
+def page_misses(pages: np.ndarray, buffer_pages: int) -> int:
+    """Counts LRU buffer misses for a sequence of page accesses."""
+    cache = OrderedDict()
+    misses = 0
+    for page in pages.tolist():
+        if page in cache:
+            cache.move_to_end(page)
+            continue
+        misses += 1
+        cache[page] = None
+        if len(cache) > buffer_pages:
+            cache.popitem(last=False)
+    return misses
+
+
+def arrival_orders(gvkeys: int, days: int, files: int, rng: np.random.Generator):
+    """Key arrival orders of the source layouts, as (gvkey, day) arrays."""
+    g, d = np.meshgrid(np.arange(gvkeys), np.arange(days), indexing="ij")
+    g, d = g.ravel(), d.ravel()
+
+    # Wide files split by date range, unflattened gvkey-major within a file.
+    file_of_day = d * files // days
+    wide = np.lexsort((d, g, file_of_day))
+    # Record files (astec) arrive date-major, gvkeys shuffled within a date.
+    record = np.lexsort((rng.random(g.size), d))
+
+    return {"wide files": (g[wide], d[wide]), "record files": (g[record], d[record])}
+
+
+def upsert_seconds(dsn: str, keys) -> float:
+    """Times upserting the keys into a scratch table on the target."""
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    g, d = keys
+    base = datetime(2000, 1, 3)
+    records = [(base + timedelta(days=int(dd)), int(gg), 1.0) for gg, dd in zip(g, d)]
+    with psycopg2.connect(dsn) as connection, connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE locality (datadate TIMESTAMP, gvkey INTEGER, v FLOAT, "
+            "PRIMARY KEY (gvkey, datadate));"
+        )
+        execute_values(cursor, "INSERT INTO locality VALUES %s", sorted(records, key=lambda r: (r[1], r[0])))
+        cursor.execute("ANALYZE locality;")
+        start = time.perf_counter()
+        execute_values(
+            cursor,
+            "INSERT INTO locality VALUES %s ON CONFLICT (gvkey, datadate) DO UPDATE SET v=EXCLUDED.v",
+            records,
+            page_size=10_000,
+        )
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--gvkeys", type=int, default=2_000)
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--keys-per-page", type=int, default=200)
+    parser.add_argument("--buffer-pages", type=int, default=256)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.gvkeys * args.days
+    print(f"{n} keys, {n // args.keys_per_page} leaf pages, {args.buffer_pages} buffer pages")
+
+    for name, (g, d) in arrival_orders(args.gvkeys, args.days, args.files, rng).items():
+        # Leaf page of a key = its rank in (gvkey, datadate) order / keys per page.
+        pages = (g * args.days + d) // args.keys_per_page
+        unsorted = page_misses(pages, args.buffer_pages)
+        ordered = page_misses(np.sort(pages), args.buffer_pages)
+        print(
+            f"{name:>12}: {unsorted:>9} misses in file order, {ordered:>7} in key order "
+            f"({unsorted / max(ordered, 1):.1f}x)"
+        )
+
+        if os.environ.get("TARGET"):
+            order = np.lexsort((d, g))
+            file_order = upsert_seconds(os.environ["TARGET"], (g, d))
+            key_order = upsert_seconds(os.environ["TARGET"], (g[order], d[order]))
+            print(f"{'':>12}  upserts: {file_order:.2f}s in file order, {key_order:.2f}s in key order")
+
+
+if __name__ == "__main__":
+    main()
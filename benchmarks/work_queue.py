@@ -0,0 +1,133 @@
+"""Exactly-once check and throughput of the load_jobs work queue.
+
+Starts several local worker processes claiming units from one queue in the
+TARGET database, the way 'python -m base_loader work' does. Each unit writes a
+marker row and completes its job in the same transaction. Some workers are
+killed in the middle of a unit, leaving their lease to expire, and are
+restarted like a supervisor would. At the end every unit must be done and
+have exactly one committed marker.
+
+Everything runs in a scratch schema, dropped afterwards.
+
+    TARGET=... python benchmarks/work_queue.py [--workers N] [--units N] [--crash-rate R]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+from base_loader.jobs import JobQueue
+
+SCHEMA = "work_queue_check"
+
+
+def work(dsn: str, worker: str, lease: int, unit_seconds: float, crash_rate: float) -> None:
+    """Claims and completes units until none is available, maybe dying on one."""
+    queue = JobQueue(dsn, worker, lease, max_attempts=100)
+    connection = psycopg2.connect(dsn)
+    rng = random.Random(worker)
+    while True:
+        job = queue.claim()
+        if job is None:
+            break
+        with queue.leased(job), connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO work_done (job_id, worker) VALUES (%s, %s);", (job.job_id, worker)
+            )
+            time.sleep(unit_seconds)
+            if rng.random() < crash_rate:
+                # Dies with the transaction open, as a killed worker would.
+                os._exit(1)
+            queue.complete(job, cursor)
+        connection.commit()
+    queue.close()
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--units", type=int, default=500)
+    parser.add_argument("--unit-seconds", type=float, default=0.01)
+    parser.add_argument("--crash-rate", type=float, default=0.02)
+    parser.add_argument("--lease", type=int, default=2, help="lease of a claimed unit, seconds")
+    args = parser.parse_args()
+
+    dsn = make_dsn(os.environ["TARGET"], options=f"-c search_path={SCHEMA}")
+    admin = psycopg2.connect(os.environ["TARGET"])
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+
+    try:
+        queue = JobQueue(dsn, "coordinator")
+        queue.create()
+        with admin.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {SCHEMA}.work_done (job_id BIGINT, worker TEXT);")
+        queue.enqueue(
+            ("returns", f"unit-{i:06d}.parquet", 0, "daily_base") for i in range(args.units)
+        )
+
+        context = multiprocessing.get_context("spawn")
+        processes = {}
+        started = crashed = 0
+        start = time.perf_counter()
+        while True:
+            for slot, process in list(processes.items()):
+                if not process.is_alive():
+                    crashed += process.exitcode != 0
+                    del processes[slot]
+            status = queue.status()
+            if not status.get("pending") and not status.get("running"):
+                break
+            for slot in range(args.workers):
+                if slot not in processes:
+                    started += 1
+                    processes[slot] = context.Process(
+                        target=work,
+                        args=(
+                            dsn,
+                            f"worker-{started}",
+                            args.lease,
+                            args.unit_seconds,
+                            args.crash_rate,
+                        ),
+                    )
+                    processes[slot].start()
+            time.sleep(0.1)
+        seconds = time.perf_counter() - start
+        for process in processes.values():
+            process.join()
+
+        with admin.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*), COUNT(DISTINCT job_id), "
+                f"(SELECT COUNT(*) FROM {SCHEMA}.load_jobs WHERE status = 'done'), "
+                f"(SELECT COUNT(*) FROM {SCHEMA}.load_jobs WHERE attempts > 1) "
+                f"FROM {SCHEMA}.work_done;"
+            )
+            markers, units, done, retried = cursor.fetchone()
+        queue.close()
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+        admin.close()
+
+    print(
+        f"{args.units} units, {args.workers} workers: {seconds:.1f}s "
+        f"({args.units / seconds:.0f} units/s), {started} workers started, {crashed} killed, "
+        f"{retried} units claimed more than once"
+    )
+    print(f"{done} done, {markers} markers committed for {units} distinct units")
+    if not done == markers == units == args.units:
+        raise SystemExit("FAILED: some units were lost or done more than once.")
+    print("OK: every unit done exactly once.")
+
+
+if __name__ == "__main__":
+    main()
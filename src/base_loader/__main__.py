@@ -1,169 +1,688 @@
-"""File loader."""
+"""File loader.
 
+Usage:
+    python -m base_loader load [--entity NAME ...] [--from DATE] [--to DATE]
+                               [--glob PATTERN] [--target daily|true|both]
+                               [--on-duplicate last|first] [--sort]
+                               [--key-index] [--detect-changes] [--one-pass]
+                               [--workers N] [--memory-budget GB]
+                               [--no-cleanup] [--dry-run] [--discard-spool]
+                               [--cleanup-workers N] [--cleanup-chunk-days N]
+                               [--no-maintenance] [--vacuum-dead-ratio R]
+                               [--vacuum-modified-ratio R]
+    python -m base_loader cleanup [--cleanup-workers N] [--cleanup-chunk-days N]
+                                  [--no-maintenance]
+    python -m base_loader --spool-dir DIR replay [--no-cleanup] [--cleanup-workers N]
+                                                [--cleanup-chunk-days N]
+    python -m base_loader winsorize [--from DATE] [--to DATE]
+    python -m base_loader features [--from DATE] [--to DATE] [--chunk-days N]
+    python -m base_loader reconcile [--entity NAME ...] [--glob PATTERN]
+                                    [--target daily|true] [--from DATE] [--to DATE]
+                                    [--on-duplicate last|first] [--examples N]
+    python -m base_loader enqueue [--entity NAME ...] [--glob PATTERN]
+                                  [--target daily|true|both]
+    python -m base_loader work [--worker-id ID] [--lease SECONDS]
+                               [--max-attempts N] [--from DATE] [--to DATE]
+    python -m base_loader export DIR [--table daily_base|true_base]
+                                 [--column NAME ...] [--gvkey N ...]
+                                 [--from DATE] [--to DATE]
+
+Heavy dependencies (pyarrow, pandas, psycopg2) are only imported once a command
+actually needs them, so '--help' and '--dry-run' return immediately.
+"""
+
+import argparse
+from datetime import date, datetime
 import logging
 import os
 from sys import stdout
-from typing import List
+from typing import List, Optional
 
-import base_loader.model as model
-from base_loader.model.entity import Entity
-from base_loader.persistence import source, target
-import base_loader.queries as queries
-
-logging.basicConfig(
-    level="INFO",
-    format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d]: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    stream=stdout,
-)
+from base_loader.discovery import list_files, resolve_source
+from base_loader.registry import ENTITIES
 
 logger = logging.getLogger(__name__)
 
 
-class Loader:
-    """Loader class for astec files data."""
-
-    _entities = {
-        "astec": Entity.ASTEC,
-        "market_cap": Entity.MARKET_CAP,
-        "returns": Entity.RETURNS,
-        "shares_out": Entity.SHARES_OUT,
-        "volume": Entity.VOLUME
-    }
-
-    _source_dirs = {
-        Entity.ASTEC: "astec",
-        Entity.MARKET_CAP: "market_cap",
-        Entity.RETURNS: "returns",
-        Entity.SHARES_OUT: "shares_out",
-        Entity.VOLUME: "volume"
-    }
-
-    _model_type = {
-        Entity.ASTEC: model.Astec,
-        Entity.MARKET_CAP: model.MarketCap,
-        Entity.RETURNS: model.Returns,
-        Entity.SHARES_OUT: model.SharesOut,
-        Entity.VOLUME: model.Volume,
-    }
-
-    _queries = {
-        Entity.ASTEC: queries.AstecQueries,
-        Entity.MARKET_CAP: queries.MarketCapQueries,
-        Entity.RETURNS: queries.ReturnsQueries,
-        Entity.SHARES_OUT: queries.SharesOutQueries,
-        Entity.VOLUME: queries.VolumeQueries,
-    }
-
-    def __init__(self) -> None:
-        self.source = source.Source(os.environ.get("SOURCE"))
-        self.target = target.Target(os.environ.get("TARGET"))
-
-    def run(self, true_base=False) -> None:
-        """Persists tables."""
-        for entity in self._entities.values():
-            logger.info(f"Starting to process {entity}...")
-
-            transpose = False
-            if entity == Entity.SHARES_OUT:
-                transpose = True
-
-            unflatten = True
-            if entity == Entity.ASTEC:
-                unflatten = False
-
-            self.source.set_source_dir(self._source_dirs[entity])
-            i = 0
-            for file in os.listdir(self.source.source_dir):
-                logger.info(f"{i}/{len(os.listdir(self.source.source_dir))} files persisted.")
-                raw_records = self.source.get_records(
-                    file_name=file, unflatten=unflatten, transpose=transpose
+def parse_date(value: str) -> date:
+    """Parses a YYYY-MM-DD command line date."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+def add_cleanup_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the cleanup options to a subcommand."""
+    parser.add_argument(
+        "--cleanup-workers",
+        type=int,
+        default=4,
+        help="connections deleting datadate chunks in parallel (default: 4)",
+    )
+    parser.add_argument(
+        "--cleanup-chunk-days",
+        type=int,
+        default=30,
+        help="days of datadate deleted per transaction (default: 30)",
+    )
+
+
+def add_maintenance_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the post-load maintenance options to a subcommand."""
+    parser.add_argument(
+        "--no-maintenance",
+        dest="maintenance",
+        action="store_false",
+        help="skip VACUUM (ANALYZE) of the written tables",
+    )
+    parser.add_argument(
+        "--vacuum-dead-ratio",
+        type=float,
+        default=0.1,
+        help="dead tuple share above which a table is vacuumed (default: 0.1)",
+    )
+    parser.add_argument(
+        "--vacuum-modified-ratio",
+        type=float,
+        default=0.1,
+        help="share of tuples modified since the last analyze above which "
+        "a table is vacuumed (default: 0.1)",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the command line parser."""
+    parser = argparse.ArgumentParser(prog="base_loader", description=__doc__.split("\n")[0])
+    parser.add_argument("--source", help="source data directory (default: $SOURCE)")
+    parser.add_argument("--dsn", help="target connection string (default: $TARGET)")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument(
+        "--cache-dir", help="cache decoded source files here (default: no cache)"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=20.0,
+        help="decoded file cache size cap in GB (default: 20)",
+    )
+    parser.add_argument(
+        "--spool-dir", help="spool modeled batches here before writing (default: no spool)"
+    )
+    parser.add_argument(
+        "--max-rows-per-second",
+        type=float,
+        help="write rate limit, shared by --workers (default: none)",
+    )
+    parser.add_argument(
+        "--max-mb-per-second",
+        type=float,
+        help="write volume limit, shared by --workers (default: none)",
+    )
+    parser.add_argument(
+        "--max-statement-latency",
+        type=float,
+        help="seconds per statement above which the write limits back off",
+    )
+    parser.add_argument(
+        "--max-replication-lag",
+        type=float,
+        help="replica lag in seconds above which the write limits back off",
+    )
+    parser.add_argument(
+        "--validate",
+        metavar="RULES",
+        help="drop records failing the rules of this JSON file, e.g. "
+        "config/validation_rules.json, needs --quarantine-dir (default: no validation)",
+    )
+    parser.add_argument(
+        "--quarantine-dir", help="with --validate, write the dropped records here"
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=int,
+        default=0,
+        help="write pages kept in flight per connection, needs psycopg 3 (default: 0, off)",
+    )
+    parser.add_argument(
+        "--features",
+        action="store_true",
+        help="rebuild the daily_features rows around the daily_base dates a load or replay "
+        "wrote, after cleanup",
+    )
+    parser.add_argument(
+        "--feature-window",
+        dest="feature_windows",
+        type=int,
+        action="append",
+        help="business days of the rolling feature windows, repeatable (default: 20 and 60)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="load source files into daily_base/true_base")
+    load.add_argument(
+        "--entity",
+        dest="entities",
+        action="append",
+        choices=tuple(ENTITIES),
+        help="entity to load, repeatable (default: all)",
+    )
+    load.add_argument("--glob", dest="pattern", default="*", help="source file pattern")
+    load.add_argument("--from", dest="date_from", type=parse_date, help="first date, inclusive")
+    load.add_argument("--to", dest="date_to", type=parse_date, help="last date, inclusive")
+    load.add_argument(
+        "--target",
+        dest="tables",
+        choices=("daily", "true", "both"),
+        default="both",
+        help="tables to load (default: both)",
+    )
+    load.add_argument(
+        "--on-duplicate",
+        choices=("last", "first"),
+        default="last",
+        help="record kept when a (datadate, gvkey) key repeats in a file (default: last)",
+    )
+    load.add_argument(
+        "--sort",
+        action="store_true",
+        help="write each entity in (gvkey, datadate) order, spilling to disk if needed",
+    )
+    load.add_argument(
+        "--sort-memory-rows",
+        type=int,
+        default=5_000_000,
+        help="records sorted in memory before spilling a run (default: 5000000)",
+    )
+    load.add_argument("--spill-dir", help="directory for sorted runs (default: temp dir)")
+    load.add_argument(
+        "--key-index",
+        action="store_true",
+        help="COPY new keys and bulk UPDATE existing ones, using the table's loaded keys",
+    )
+    load.add_argument(
+        "--detect-changes",
+        action="store_true",
+        help="only write (gvkey, month) blocks whose content hash changed since the last load",
+    )
+    load.add_argument(
+        "--one-pass",
+        action="store_true",
+        help="with --target both, write true_base from the daily_base pass "
+        "instead of reading every file again",
+    )
+    load.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="worker processes loading row groups, largest first (default: 1)",
+    )
+    load.add_argument(
+        "--memory-budget",
+        type=float,
+        default=8.0,
+        help="estimated memory of the row groups loaded at once in GB, with --workers "
+        "(default: 8)",
+    )
+    load.add_argument(
+        "--no-cleanup",
+        dest="cleanup",
+        action="store_false",
+        help="skip the daily_base cleanup after loading it",
+    )
+    load.add_argument(
+        "--dry-run", action="store_true", help="list the files that would be loaded"
+    )
+    load.add_argument(
+        "--discard-spool",
+        action="store_true",
+        help="drop the spool segments a failed load left instead of refusing to start",
+    )
+    add_cleanup_arguments(load)
+    add_maintenance_arguments(load)
+
+    cleanup = commands.add_parser("cleanup", help="clean daily_base")
+    add_cleanup_arguments(cleanup)
+    add_maintenance_arguments(cleanup)
+    replay = commands.add_parser("replay", help="write the spool left by a failed load")
+    replay.add_argument(
+        "--no-cleanup",
+        dest="cleanup",
+        action="store_false",
+        help="skip the daily_base cleanup after replaying",
+    )
+    add_cleanup_arguments(replay)
+
+    enqueue = commands.add_parser(
+        "enqueue", help="queue (entity, file, row group) units for 'work' processes"
+    )
+    enqueue.add_argument(
+        "--entity",
+        dest="entities",
+        action="append",
+        choices=tuple(ENTITIES),
+        help="entity to load, repeatable (default: all)",
+    )
+    enqueue.add_argument("--glob", dest="pattern", default="*", help="source file pattern")
+    enqueue.add_argument(
+        "--target",
+        dest="tables",
+        choices=("daily", "true", "both"),
+        default="both",
+        help="tables to load (default: both)",
+    )
+
+    export = commands.add_parser(
+        "export", help="write a daily_base/true_base slice to parquet, partitioned by year"
+    )
+    export.add_argument("output_dir", help="directory to write the parquet dataset to")
+    export.add_argument(
+        "--table", choices=("daily_base", "true_base"), default="daily_base"
+    )
+    export.add_argument(
+        "--column",
+        dest="columns",
+        action="append",
+        help="non-key column to export, repeatable (default: all)",
+    )
+    export.add_argument(
+        "--gvkey", dest="gvkeys", type=int, action="append", help="gvkey, repeatable (default: all)"
+    )
+    export.add_argument("--from", dest="date_from", type=parse_date, help="first date, inclusive")
+    export.add_argument("--to", dest="date_to", type=parse_date, help="last date, inclusive")
+
+    work = commands.add_parser("work", help="load queued units until the queue is drained")
+    work.add_argument("--worker-id", help="worker name (default: host:pid)")
+    work.add_argument(
+        "--lease", type=int, default=300, help="seconds a claimed unit is leased (default: 300)"
+    )
+    work.add_argument(
+        "--max-attempts", type=int, default=3, help="attempts per unit (default: 3)"
+    )
+    work.add_argument("--from", dest="date_from", type=parse_date, help="first date, inclusive")
+    work.add_argument("--to", dest="date_to", type=parse_date, help="last date, inclusive")
+    work.add_argument(
+        "--on-duplicate",
+        choices=("last", "first"),
+        default="last",
+        help="record kept when a (datadate, gvkey) key repeats in a unit (default: last)",
+    )
+
+    winsorize = commands.add_parser(
+        "winsorize", help="recompute daily_base winsorized_5_rtn, e.g. after a cleanup"
+    )
+    winsorize.add_argument(
+        "--from", dest="date_from", type=parse_date, help="first date, inclusive"
+    )
+    winsorize.add_argument("--to", dest="date_to", type=parse_date, help="last date, inclusive")
+
+    features = commands.add_parser(
+        "features", help="rebuild daily_features rows whose windows include a date range"
+    )
+    features.add_argument(
+        "--from", dest="date_from", type=parse_date, help="first changed date, inclusive"
+    )
+    features.add_argument(
+        "--to", dest="date_to", type=parse_date, help="last changed date, inclusive"
+    )
+    features.add_argument(
+        "--chunk-days",
+        type=int,
+        default=365,
+        help="days of datadate computed per transaction (default: 365)",
+    )
+
+    reconcile = commands.add_parser(
+        "reconcile",
+        help="compare source files with daily_base/true_base by (entity, month) blocks",
+    )
+    reconcile.add_argument(
+        "--entity",
+        dest="entities",
+        action="append",
+        choices=tuple(ENTITIES),
+        help="entity to compare, repeatable (default: all)",
+    )
+    reconcile.add_argument("--glob", dest="pattern", default="*", help="source file pattern")
+    reconcile.add_argument(
+        "--target",
+        dest="tables",
+        choices=("daily", "true"),
+        default="daily",
+        help="table to compare with, daily_base before cleanup (default: daily)",
+    )
+    reconcile.add_argument(
+        "--from", dest="date_from", type=parse_date, help="a date of the first month"
+    )
+    reconcile.add_argument(
+        "--to", dest="date_to", type=parse_date, help="a date of the last month"
+    )
+    reconcile.add_argument(
+        "--on-duplicate",
+        choices=("last", "first"),
+        default="last",
+        help="record the load kept when a (datadate, gvkey) key repeats in a file "
+        "(default: last)",
+    )
+    reconcile.add_argument(
+        "--examples",
+        type=int,
+        default=5,
+        help="mismatching keys logged per kind and block (default: 5)",
+    )
+
+    return parser
+
+
+def dry_run(args: argparse.Namespace) -> None:
+    """Logs the files a load would process, without touching the database."""
+    root = resolve_source(args.source or os.environ.get("SOURCE"))
+    for name in args.entities or ENTITIES:
+        source_dir = os.path.join(root, ENTITIES[name].source_dir)
+        files = list_files(source_dir, args.pattern) if os.path.isdir(source_dir) else []
+        logger.info(f"{name}: {len(files)} files in {source_dir}")
+        for file in files:
+            logger.info(f"  {file}")
+
+
+def build_loader(args: argparse.Namespace):
+    """Builds a Loader from the global options."""
+    from base_loader.features import default_features
+    from base_loader.loader import Loader
+    from base_loader.throttle import Throttle
+    from base_loader.validation import load_rules
+
+    throttle = None
+    if args.max_rows_per_second or args.max_mb_per_second:
+        throttle = Throttle(
+            args.max_rows_per_second,
+            args.max_mb_per_second * 1024**2 if args.max_mb_per_second else None,
+            args.max_statement_latency,
+            args.max_replication_lag,
+        )
+    features = ()
+    if args.features or args.command == "features":
+        features = default_features(args.feature_windows or (20, 60))
+    return Loader(
+        args.source,
+        args.dsn,
+        cache_dir=args.cache_dir,
+        cache_bytes=int(args.cache_size * 1024**3),
+        spool_dir=args.spool_dir,
+        throttle=throttle,
+        pipeline_depth=args.pipeline_depth,
+        quarantine_dir=args.quarantine_dir,
+        features=features,
+        validation_rules=load_rules(args.validate) if args.validate else (),
+    )
+
+
+def load(args: argparse.Namespace) -> int:
+    """Runs the daily_base and/or true_base loads."""
+    loader = build_loader(args)
+    try:
+        if loader.spool is not None and loader.spool.segments():
+            if not args.discard_spool:
+                logger.error(
+                    f"{args.spool_dir} holds {len(loader.spool.segments())} segments of a "
+                    "failed load: run 'replay' first, or load with --discard-spool."
                 )
-                raw_records = self.list_slicer(raw_records, 1_000_000)
-                n = len(raw_records)
-
-                while raw_records:
-                    logger.info(f"Processed {n - len(raw_records)}/{n} million records")
-                    logger.info("Modeling...")
-                    records = []
-                    for r in raw_records[0]:
-                        record = self._model_type[entity].build_record(r)
-                        if not record.is_empty and not record.is_weekend:
-                            if not true_base:
-                                if entity == Entity.RETURNS:
-                                    record.move_date_backwards()
-                                else:
-                                    record.move_date_forward()
-                            records.append(record.as_tuple())
-                    del raw_records[0]
-
-                    records = self.list_slicer(records, 250_000)
-                    j = 0
-                    logger.info("Executing records")
-                    for records_slice in records:
-                        logger.debug(f"{j * 250_000}/{1_000_000} records executed.")
-                        if not true_base:
-                            self.target.execute(self._queries[entity].UPSERT.format(tbl='daily_base'), records_slice)
-                        else:
-                            self.target.execute(self._queries[entity].UPSERT.format(tbl='true_base'), records_slice)
-                        j += 1
-
-                self.target.commit_transaction()
-                i += 1
-            logger.info(f"{entity} persisted.")
-
-        logger.info("Process finished.")
-
-    def cleanup(self):
-        """Restricts universe to U.S. and removes every useless records from the data"""
-        logger.info("Cleaning daily_base table...")
-        logger.info("Removing invalid records (no market_cap/no volume/returns data/below thresholds)...")
-        self.target.execute_query(queries.CleanupQueries.CLEAN_MKTCAP_VOL_RTN)
-        self.target.commit_transaction()
-
-        logger.info("Removing invalid records (no astec data)...")
-        self.target.execute_query(queries.CleanupQueries.CLEAN_ASTEC)
-        self.target.commit_transaction()
-
-        logger.info("Restricting to U.S. gvkeys only...")
-        us_keys = set(self.target.fetch_us_keys())
-        keys = set(self.target.fetch_keys())
-        invalid_keys = list(keys - us_keys)
-        n = len(invalid_keys)
-
-        invalid_keys = self.list_slicer(invalid_keys, 100)
-        i = 0
-        for keys_slice in invalid_keys:
-            logger.debug(f"Deleted {i * 100}/{n} invalid keys.")
-            self.target.execute(queries.CleanupQueries.CLEAN_GVKEYS, keys_slice)
-            self.target.commit_transaction()
-            i += 1
-
-        logger.debug(f"Deleted {n}/{n} invalid keys.")
-        logger.info("daily_base is now composed only of valid U.S. records.")
-
-    @staticmethod
-    def list_slicer(lst: List, slice_len: int) -> List[List]:
-        """Slice list into list of lists.
-
-        Args:
-            lst: list to slice.
-            slice_len: size of each slice.
-
-        Returns:
-            Sliced list.
-        """
-        res = []
-        i = 0
-        while i + slice_len < len(lst):
-            res.append(lst[i : i + slice_len])  # noqa
-            i = i + slice_len
-        res.append(lst[i:])
-        return res
-
-
-loader = Loader()
-loader.run()
-loader.cleanup()
-
-loader.run(true_base=True)
+                return 2
+            loader.spool.discard()
+        if args.workers > 1:
+            return load_parallel(loader, args)
+        selection = dict(
+            entities=args.entities,
+            pattern=args.pattern,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            on_duplicate=args.on_duplicate,
+            sort=args.sort,
+            sort_memory_rows=args.sort_memory_rows,
+            spill_dir=args.spill_dir,
+            key_index=args.key_index,
+            detect_changes=args.detect_changes,
+        )
+        if args.tables in ("daily", "both"):
+            loader.run(one_pass=args.one_pass, **selection)
+            if args.cleanup:
+                loader.cleanup(args.cleanup_workers, args.cleanup_chunk_days)
+            loader.update_winsorized()
+            if loader.features:
+                loader.update_features()
+        if args.tables == "true" or (args.tables == "both" and not args.one_pass):
+            loader.run(true_base=True, **selection)
+        if args.maintenance:
+            tables = {"daily": ["daily_base"], "true": ["true_base"]}
+            loader.maintain(
+                tables.get(args.tables, ["daily_base", "true_base"]),
+                args.vacuum_dead_ratio,
+                args.vacuum_modified_ratio,
+            )
+    finally:
+        loader.close()
+    return 0
+
+
+def load_parallel(loader, args: argparse.Namespace) -> int:
+    """Runs the loads on worker processes, stopping after a load with failed units."""
+    selection = dict(
+        entities=args.entities,
+        pattern=args.pattern,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        on_duplicate=args.on_duplicate,
+    )
+    budget = int(args.memory_budget * 1024**3)
+    if args.tables in ("daily", "both"):
+        if loader.run_parallel(args.workers, budget, **selection):
+            return 1
+        if args.cleanup:
+            loader.cleanup(args.cleanup_workers, args.cleanup_chunk_days)
+        loader.update_winsorized()
+        if loader.features:
+            loader.update_features()
+    if args.tables in ("true", "both"):
+        if loader.run_parallel(args.workers, budget, true_base=True, **selection):
+            return 1
+    if args.maintenance:
+        tables = {"daily": ["daily_base"], "true": ["true_base"]}
+        loader.maintain(
+            tables.get(args.tables, ["daily_base", "true_base"]),
+            args.vacuum_dead_ratio,
+            args.vacuum_modified_ratio,
+        )
+    return 0
+
+
+def cleanup(args: argparse.Namespace) -> None:
+    """Runs the daily_base cleanup."""
+    loader = build_loader(args)
+    try:
+        loader.cleanup(args.cleanup_workers, args.cleanup_chunk_days)
+        if args.maintenance:
+            loader.maintain(["daily_base"], args.vacuum_dead_ratio, args.vacuum_modified_ratio)
+    finally:
+        loader.close()
+
+
+def replay(args: argparse.Namespace) -> int:
+    """Writes the spool left by a failed load."""
+    if not args.spool_dir:
+        logger.error("replay needs --spool-dir.")
+        return 2
+
+    loader = build_loader(args)
+    try:
+        loader.replay()
+        if args.cleanup:
+            loader.cleanup(args.cleanup_workers, args.cleanup_chunk_days)
+        loader.update_winsorized()
+        if loader.features:
+            loader.update_features()
+    finally:
+        loader.close()
+    return 0
+
+
+def enqueue(args: argparse.Namespace) -> None:
+    """Fills the work queue."""
+    from base_loader.jobs import JobQueue
+
+    tables = {"daily": ["daily_base"], "true": ["true_base"]}
+    loader = build_loader(args)
+    queue = JobQueue(args.dsn or os.environ.get("TARGET"))
+    try:
+        loader.enqueue(
+            queue, tables.get(args.tables, ["daily_base", "true_base"]), args.entities, args.pattern
+        )
+    finally:
+        queue.close()
+        loader.close()
+
+
+def work(args: argparse.Namespace) -> None:
+    """Loads queued units until the queue is drained."""
+    from base_loader.jobs import JobQueue
+
+    loader = build_loader(args)
+    queue = JobQueue(
+        args.dsn or os.environ.get("TARGET"), args.worker_id, args.lease, args.max_attempts
+    )
+    try:
+        loader.work(queue, args.date_from, args.date_to, args.on_duplicate)
+    finally:
+        queue.close()
+        loader.close()
+
+
+def export(args: argparse.Namespace) -> None:
+    """Writes a table slice to parquet."""
+    from base_loader.persistence.reader import Reader
+
+    Reader(args.dsn or os.environ.get("TARGET")).write_parquet(
+        args.table,
+        args.output_dir,
+        columns=args.columns,
+        gvkeys=args.gvkeys,
+        date_from=args.date_from,
+        date_to=args.date_to,
+    )
+
+
+def features(args: argparse.Namespace) -> None:
+    """Rebuilds daily_features over a date range."""
+    loader = build_loader(args)
+    try:
+        loader.build_features(args.date_from, args.date_to, args.chunk_days)
+        loader.metrics.log()
+    finally:
+        loader.close()
+
+
+def reconcile(args: argparse.Namespace) -> int:
+    """Compares the source files with a loaded table, 1 if they differ."""
+    loader = build_loader(args)
+    try:
+        mismatches = loader.reconcile(
+            args.tables == "true",
+            args.entities,
+            args.pattern,
+            args.date_from,
+            args.date_to,
+            args.on_duplicate,
+            args.examples,
+        )
+    finally:
+        loader.close()
+    return 1 if mismatches else 0
+
+
+def winsorize(args: argparse.Namespace) -> None:
+    """Recomputes daily_base winsorized_5_rtn over a date range."""
+    loader = build_loader(args)
+    try:
+        dates = loader.target.fetch_dates("daily_base", args.date_from, args.date_to)
+        loader.winsorize(dates)
+        loader.metrics.log()
+    finally:
+        loader.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d]: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        stream=stdout,
+    )
+
+    if (args.max_statement_latency or args.max_replication_lag) and not (
+        args.max_rows_per_second or args.max_mb_per_second
+    ):
+        logger.error("Latency feedback needs --max-rows-per-second or --max-mb-per-second.")
+        return 2
+
+    if bool(args.validate) != bool(args.quarantine_dir):
+        logger.error("--validate and --quarantine-dir go together: dropped records are kept.")
+        return 2
+
+    if args.pipeline_depth < 0:
+        logger.error("--pipeline-depth must not be negative.")
+        return 2
+
+    if args.feature_windows and min(args.feature_windows) < 1:
+        logger.error("--feature-window must be positive.")
+        return 2
+
+    if args.command == "load" and args.workers > 1:
+        serial = {
+            "--sort": args.sort,
+            "--key-index": args.key_index,
+            "--detect-changes": args.detect_changes,
+            "--one-pass": args.one_pass,
+            "--spool-dir": args.spool_dir,
+        }
+        unsupported = [option for option, value in serial.items() if value]
+        if unsupported:
+            logger.error(f"--workers does not support {', '.join(unsupported)}.")
+            return 2
+
+    if args.command == "load" and args.one_pass and args.tables != "both":
+        logger.error("--one-pass needs --target both.")
+        return 2
+
+    if args.command in ("load", "winsorize", "work", "export", "features", "reconcile"):
+        if args.date_from and args.date_to and args.date_from > args.date_to:
+            logger.error("--from must not be after --to.")
+            return 2
+
+    if args.command == "load" and args.dry_run:
+        dry_run(args)
+    elif args.command == "load":
+        return load(args)
+    elif args.command == "cleanup":
+        cleanup(args)
+    elif args.command == "replay":
+        return replay(args)
+    elif args.command == "winsorize":
+        winsorize(args)
+    elif args.command == "features":
+        features(args)
+    elif args.command == "reconcile":
+        return reconcile(args)
+    elif args.command == "enqueue":
+        enqueue(args)
+    elif args.command == "work":
+        work(args)
+    elif args.command == "export":
+        export(args)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
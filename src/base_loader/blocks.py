@@ -0,0 +1,119 @@
+"""Change detection over (gvkey, month) blocks of modeled records."""
+
+from datetime import date
+import hashlib
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from base_loader.queries import BlocksQueries, table_ddl
+
+logger = logging.getLogger(__name__)
+
+
+def row_hashes(records: List[Tuple]) -> np.ndarray:
+    """64-bit hashes of modeled records, stable across processes."""
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(repr(r).encode(), digest_size=8).digest(), "little")
+            for r in records
+        ),
+        dtype=np.uint64,
+        count=len(records),
+    )
+
+
+def block_months(records: List[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+    """gvkeys and months since year 0 of modeled (datadate, gvkey, ...) records."""
+    gvkeys = np.fromiter((r[1] for r in records), dtype=np.int64, count=len(records))
+    months = np.array([r[0] for r in records], dtype="datetime64[M]").view(np.int64)
+    return gvkeys, months + 1970 * 12
+
+
+def month_start(month: int) -> date:
+    """First day of a month counted since year 0."""
+    return date(month // 12, month % 12 + 1, 1)
+
+
+class ChangeDetector:
+    """Skips (gvkey, month) blocks whose modeled records did not change.
+
+    Each block's hash is the sum, modulo 2**64, of the hashes of its records,
+    so it does not depend on record order. Hashes and row counts are compared
+    with the ones stored in block_hashes for the table and entity, and only
+    the records of blocks that differ are kept.
+
+    New hashes are held until flush(), which writes them in the caller's
+    transaction: they must only be committed with, or after, the records they
+    describe. A block only partly present in a batch, e.g. at the edge of a
+    date range, never matches the whole block's hash, so it is written again,
+    which is safe.
+    """
+
+    def __init__(self, target, table: str, entity: str) -> None:
+        self.target = target
+        self.table = table
+        self.entity = entity
+        # Hash rows of the changed blocks by (table, entity, gvkey, month): a
+        # block seen again, e.g. in overlapping files, keeps its last hash.
+        self._pending: Dict[Tuple, Tuple] = {}
+        target.execute_query(table_ddl("block_hashes"))
+
+    def changed(self, records: List[Tuple]) -> List[Tuple]:
+        """Keeps the records of the blocks that changed.
+
+        Args:
+            records: modeled records, all the records of a file.
+
+        Returns:
+            Records of changed blocks, in their original order.
+        """
+        if not records:
+            return records
+        gvkeys, months = block_months(records)
+        blocks = (gvkeys << 32) | months
+        unique, inverse = np.unique(blocks, return_inverse=True)
+        hashes = np.zeros(len(unique), dtype=np.uint64)
+        np.add.at(hashes, inverse, row_hashes(records))
+        rows = np.bincount(inverse, minlength=len(unique))
+
+        stored = {
+            (gvkey, month.year * 12 + month.month - 1): (hash_, n)
+            for gvkey, month, hash_, n in self.target.fetch_block_hashes(
+                self.table,
+                self.entity,
+                np.unique(gvkeys).tolist(),
+                month_start(int(months.min())),
+                month_start(int(months.max())),
+            )
+        }
+        signed = hashes.view(np.int64).tolist()
+        changed = np.array(
+            [
+                stored.get((int(b >> 32), int(b & 0xFFFFFFFF))) != (h, n)
+                for b, h, n in zip(unique.tolist(), signed, rows.tolist())
+            ],
+            dtype=bool,
+        )
+
+        for b, h, n, c in zip(unique.tolist(), signed, rows.tolist(), changed.tolist()):
+            if c:
+                key = (self.table, self.entity, int(b >> 32), month_start(int(b & 0xFFFFFFFF)))
+                self._pending[key] = key + (h, n)
+        keep = changed[inverse]
+        logger.info(
+            f"{int(changed.sum())}/{len(unique)} blocks changed, "
+            f"{int(keep.sum())}/{len(records)} records to write."
+        )
+        return [r for r, k in zip(records, keep.tolist()) if k]
+
+    def flush(self) -> None:
+        """Writes the hashes of the changed blocks, without committing.
+
+        Each block is written once, so no upsert touches a row twice.
+        """
+        pending = list(self._pending.values())
+        for start in range(0, len(pending), 10_000):
+            self.target.execute(BlocksQueries.UPSERT, pending[start : start + 10_000])  # noqa
+        self._pending = {}
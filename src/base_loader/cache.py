@@ -0,0 +1,100 @@
+"""Local cache of decoded source files."""
+
+import hashlib
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# Bytes hashed at the end of a parquet file: the footer, with its schema,
+# row group offsets and column statistics, changes whenever the data does.
+FOOTER_BYTES = 64 * 1024
+
+
+class DecodedCache:
+    """Arrow IPC cache of decoded source files, with LRU eviction.
+
+    Entries are keyed by a fingerprint of the source file (path, size, mtime
+    and a hash of its footer) and of how it was decoded (layout, projection,
+    date range). They are stored uncompressed so reads are memory-mapped
+    rather than decoded, and evicted least recently used first once the cache
+    exceeds 'max_bytes'.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 20 * 1024**3) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(file_path: str, key: Tuple) -> str:
+        """Fingerprints a source file and the way it is decoded.
+
+        Args:
+            file_path: source file.
+            key: decoding parameters, e.g. layout and date range.
+
+        Returns:
+            Hex digest naming the cache entry.
+        """
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(os.path.abspath(file_path).encode())
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}:{key!r}".encode())
+        with open(file_path, "rb") as f:
+            f.seek(max(stat.st_size - FOOTER_BYTES, 0))
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def get(self, fingerprint: str) -> Optional[pa.Table]:
+        """Reads an entry back through a memory map.
+
+        Args:
+            fingerprint: entry fingerprint.
+
+        Returns:
+            Cached table, None on a miss.
+        """
+        path = self._path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        logger.info(f"Reading decoded file from cache ({fingerprint[:12]})...")
+        return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+    def put(self, fingerprint: str, table: pa.Table) -> None:
+        """Writes an entry, then evicts old entries above the size cap.
+
+        Args:
+            fingerprint: entry fingerprint.
+            table: decoded table.
+        """
+        path = self._path(fingerprint)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used entries until under the size cap."""
+        entries: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".arrow"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Evicting {name} from the decoded file cache.")
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, f"{fingerprint}.arrow")
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS block_hashes
+(
+    target_table                        VARCHAR(16),
+    entity                              VARCHAR(16),
+    gvkey                               INTEGER,
+    month                               DATE,
+
+    hash                                BIGINT NOT NULL,
+    rows                                INTEGER NOT NULL,
+
+    PRIMARY KEY (target_table, entity, gvkey, month)
+);
@@ -22,4 +22,7 @@ CREATE TABLE daily_base
     winsorized_5_rtn                    DECIMAL(25,15),
 
     PRIMARY KEY (gvkey, datadate)
-);
\ No newline at end of file
+);
+
+-- Date range scans: cleanup chunks, date bounds, feature windows.
+CREATE INDEX IF NOT EXISTS daily_base_datadate_idx ON daily_base (datadate);
\ No newline at end of file
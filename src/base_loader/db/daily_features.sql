@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS daily_features
+(
+    datadate                            TIMESTAMP,
+    gvkey                               INTEGER,
+
+    avg_volume_20                       DOUBLE PRECISION,
+    avg_volume_60                       DOUBLE PRECISION,
+    volatility_20                       DOUBLE PRECISION,
+    volatility_60                       DOUBLE PRECISION,
+
+    PRIMARY KEY (gvkey, datadate)
+);
+
+-- Date range deletes: each rebuild chunk replaces the rows of its dates.
+CREATE INDEX IF NOT EXISTS daily_features_datadate_idx ON daily_features (datadate);
\ No newline at end of file
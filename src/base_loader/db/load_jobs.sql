@@ -0,0 +1,21 @@
+CREATE TABLE IF NOT EXISTS load_jobs
+(
+    job_id                              BIGSERIAL,
+    entity                              VARCHAR(16) NOT NULL,
+    file_name                           TEXT NOT NULL,
+    -- -1 for a whole file, whose row groups share keys.
+    row_group                           INTEGER NOT NULL,
+    target_table                        VARCHAR(16) NOT NULL,
+
+    status                              VARCHAR(8) NOT NULL DEFAULT 'pending',
+    worker                              TEXT,
+    attempts                            INTEGER NOT NULL DEFAULT 0,
+    leased_until                        TIMESTAMP,
+    error                               TEXT,
+    updated_at                          TIMESTAMP NOT NULL DEFAULT now(),
+
+    PRIMARY KEY (job_id),
+    UNIQUE (target_table, entity, file_name, row_group)
+);
+
+CREATE INDEX IF NOT EXISTS load_jobs_status_idx ON load_jobs (status, job_id);
@@ -0,0 +1,61 @@
+"""In-batch deduplication of modeled records."""
+
+from enum import Enum
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicatePolicy(str, Enum):
+    """Which record wins when a (datadate, gvkey) key repeats."""
+
+    LAST = "last"
+    FIRST = "first"
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+def deduplicate(
+    records: List[Tuple], policy: DuplicatePolicy = DuplicatePolicy.LAST
+) -> Tuple[List[Tuple], int]:
+    """Collapses records sharing a (datadate, gvkey) key.
+
+    Postgres refuses an upsert whose VALUES list touches the same key twice,
+    so keys must be unique within a statement. Keys are sorted once with
+    numpy; surviving records keep their original relative order.
+
+    Args:
+        records: modeled records, (datadate, gvkey, ...) tuples.
+        policy: keep the last or the first occurrence of a key.
+
+    Returns:
+        Deduplicated records and the number of records collapsed.
+    """
+    n = len(records)
+    if n < 2:
+        return records, 0
+
+    gvkeys = np.fromiter((r[1] for r in records), dtype=np.int64, count=n)
+    dates = np.array([r[0] for r in records], dtype="datetime64[us]").view(np.int64)
+    order = np.lexsort((np.arange(n), dates, gvkeys))
+
+    sorted_gvkeys = gvkeys[order]
+    sorted_dates = dates[order]
+    new_key = (sorted_gvkeys[1:] != sorted_gvkeys[:-1]) | (
+        sorted_dates[1:] != sorted_dates[:-1]
+    )
+    if new_key.all():
+        return records, 0
+
+    keep = np.ones(n, dtype=bool)
+    if policy == DuplicatePolicy.LAST:
+        keep[:-1] = new_key
+    else:
+        keep[1:] = new_key
+    survivors = np.sort(order[keep])
+
+    return [records[i] for i in survivors], n - len(survivors)
@@ -0,0 +1,42 @@
+"""Source file discovery.
+
+Only the standard library is used here so that listing files (e.g. for a dry
+run) does not pay for pyarrow/pandas/psycopg2 imports.
+"""
+
+from fnmatch import fnmatch
+import os
+from pathlib import Path
+from typing import List
+
+
+def resolve_source(source: str) -> str:
+    """Resolves the root of the source data directory.
+
+    Relative paths are resolved two levels above the current directory, which
+    is where 'local_data' lives next to the repository.
+
+    Args:
+        source: source directory, absolute or relative.
+
+    Returns:
+        Absolute path to the source root.
+    """
+    return os.path.join(Path(os.path.abspath(os.curdir)).parent.parent, source)
+
+
+def list_files(source_dir: str, pattern: str = "*") -> List[str]:
+    """Lists source files matching a glob pattern.
+
+    Args:
+        source_dir: directory holding an entity's files.
+        pattern: shell-style pattern matched against file names.
+
+    Returns:
+        Sorted file names, so runs are reproducible.
+    """
+    return sorted(
+        f
+        for f in os.listdir(source_dir)
+        if fnmatch(f, pattern) and os.path.isfile(os.path.join(source_dir, f))
+    )
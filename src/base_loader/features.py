@@ -0,0 +1,137 @@
+"""Trailing rolling-window features of daily_base series."""
+
+from datetime import date
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+import numpy as np
+
+# Business days are counted from this Monday.
+BUSINESS_EPOCH = np.datetime64("1900-01-01", "D")
+# gvkeys are packed above business days, so keys sort in (gvkey, day) order.
+KEY_STRIDE = 1 << 32
+
+
+class Feature(NamedTuple):
+    """Rolling aggregate of a daily_base column, per gvkey.
+
+    The window of a row spans the 'window' business days ending on its
+    datadate. Rows closer than that to the first date of a gvkey get a
+    partial window, like a SQL window frame does; NULL values are skipped.
+    """
+
+    name: str
+    column: str
+    window: int
+    # 'mean', or 'std' for the sample standard deviation.
+    aggregate: str
+
+
+def default_features(windows: Iterable[int] = (20, 60)) -> Tuple[Feature, ...]:
+    """Average volume and volatility of returns over each window.
+
+    Raises:
+        ValueError: if a window is not positive.
+    """
+    windows = sorted(set(windows))
+    if not windows or windows[0] < 1:
+        raise ValueError("Feature windows must be positive business day counts.")
+    return tuple(Feature(f"avg_volume_{w}", "volume", w, "mean") for w in windows) + tuple(
+        Feature(f"volatility_{w}", "rtn", w, "std") for w in windows
+    )
+
+
+def business_days(datadates: np.ndarray) -> np.ndarray:
+    """Business days since BUSINESS_EPOCH of weekday dates."""
+    return np.busday_count(BUSINESS_EPOCH, datadates.astype("datetime64[D]"))
+
+
+def lookback(day: date, window: int) -> date:
+    """First date of the window ending on 'day'."""
+    first = np.busday_offset(np.datetime64(day, "D"), -(window - 1), roll="backward")
+    return first.astype(object)
+
+
+def lookahead(day: date, window: int) -> date:
+    """Last date whose window includes 'day'."""
+    last = np.busday_offset(np.datetime64(day, "D"), window - 1, roll="forward")
+    return last.astype(object)
+
+
+def compute(
+    gvkeys: np.ndarray,
+    datadates: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    features: Iterable[Feature],
+) -> Dict[str, np.ndarray]:
+    """Computes features over many gvkey series at once.
+
+    Rows are sorted by (gvkey, business day) once. For each column, running
+    counts, sums and sums of squares are accumulated over all the series with
+    cumsum; the aggregate of any window is then the difference between the
+    running totals at its two ends, found with one searchsorted over the
+    packed keys. Values are centered on their gvkey's mean before squaring
+    and totals are accumulated in extended precision, so that small
+    variances survive the difference of two large running totals.
+
+    Args:
+        gvkeys: gvkey of each row.
+        datadates: datadate of each row, weekdays, as datetime64.
+        columns: feature source columns, NaN for NULL.
+        features: features to compute.
+
+    Returns:
+        Feature name to values, NaN for empty windows and for standard
+        deviations of less than two values, in the order of the rows given.
+    """
+    keys = gvkeys.astype(np.int64) * KEY_STRIDE + business_days(datadates)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    _, group_starts, group_sizes = np.unique(
+        keys // KEY_STRIDE, return_index=True, return_counts=True
+    )
+
+    results = {}
+    totals = {}
+    for feature in features:
+        if feature.column not in totals:
+            values = columns[feature.column][order]
+            present = ~np.isnan(values)
+            counts = present.astype(np.int64)
+            if len(values):
+                sums = np.add.reduceat(np.where(present, values, 0.0), group_starts)
+                sizes = np.add.reduceat(counts, group_starts)
+                center = np.repeat(sums / np.maximum(sizes, 1), group_sizes)
+            else:
+                center = values
+            centered = np.where(present, values - center, 0.0)
+            totals[feature.column] = (
+                center,
+                _running(counts),
+                _running(centered),
+                _running(centered * centered),
+            )
+        center, counts, sums, squares = totals[feature.column]
+
+        end = np.arange(1, len(keys) + 1)
+        start = np.searchsorted(keys, keys - (feature.window - 1), side="left")
+        n = counts[end] - counts[start]
+        total = sums[end] - sums[start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if feature.aggregate == "mean":
+                value = np.where(n > 0, total / n + center, np.nan)
+            elif feature.aggregate == "std":
+                variance = (squares[end] - squares[start] - total * total / n) / (n - 1)
+                value = np.where(n > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+            else:
+                raise ValueError(f"Unknown aggregate '{feature.aggregate}'.")
+
+        unsorted = np.empty(len(value), dtype=np.float64)
+        unsorted[order] = value
+        results[feature.name] = unsorted
+    return results
+
+
+def _running(values: np.ndarray) -> np.ndarray:
+    """Running totals with a leading zero, so window sums are differences."""
+    dtype = np.int64 if values.dtype.kind == "i" else np.longdouble
+    return np.concatenate([np.zeros(1, dtype=dtype), np.cumsum(values, dtype=dtype)])
@@ -0,0 +1,153 @@
+"""Postgres work queue for loading from several processes or hosts."""
+
+from contextlib import contextmanager
+import logging
+import os
+import socket
+import threading
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from base_loader.queries import JobsQueries, table_ddl
+
+logger = logging.getLogger(__name__)
+
+# load_jobs.row_group of a unit covering the whole file.
+WHOLE_FILE = -1
+
+
+class Job(NamedTuple):
+    """Unit of work: one row group of a source file, loaded into one table.
+
+    The row group is None for a whole file.
+    """
+
+    job_id: int
+    entity: str
+    file_name: str
+    row_group: Optional[int]
+    target_table: str
+
+
+class JobQueue:
+    """Work queue over the load_jobs table.
+
+    A coordinator enqueues (entity, file, row group, table) units once; any
+    number of workers then claim them with FOR UPDATE SKIP LOCKED, so each
+    unit goes to one worker without blocking the others. A claimed unit is
+    leased for 'lease' seconds and the lease is extended by a heartbeat while
+    it is processed: units of dead workers are claimed again once their lease
+    expires, up to 'max_attempts' times.
+
+    Claims and heartbeats run in autocommit on the queue's own connection.
+    Completion is written by the worker in the transaction of the unit's
+    data, so a unit is done exactly when its records are committed.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        worker: Optional[str] = None,
+        lease: int = 300,
+        max_attempts: int = 3,
+    ) -> None:
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._connection = psycopg2.connect(connection_string)
+        self._connection.autocommit = True
+        self._lock = threading.Lock()
+
+    def create(self) -> None:
+        """Creates the load_jobs table of db/load_jobs.sql if it does not exist."""
+        self._execute(table_ddl("load_jobs"))
+
+    def enqueue(self, units: Iterable[Tuple[str, str, Optional[int], str]]) -> int:
+        """Adds units, skipping the ones already queued.
+
+        Args:
+            units: (entity, file name, row group, target table) tuples, row
+                group None for a whole file.
+
+        Returns:
+            Number of units added.
+        """
+        with self._lock, self._connection.cursor() as cursor:
+            rows = execute_values(
+                cursor,
+                JobsQueries.ENQUEUE,
+                [(e, f, WHOLE_FILE if g is None else g, t) for e, f, g, t in units],
+                fetch=True,
+            )
+        return len(rows)
+
+    def claim(self) -> Optional[Job]:
+        """Claims the oldest available unit.
+
+        Returns:
+            Claimed job, None if no unit is available.
+        """
+        params = {"worker": self.worker, "lease": self.lease, "max_attempts": self.max_attempts}
+        self._execute(JobsQueries.EXPIRE, params)
+        row = self._execute(JobsQueries.CLAIM, params, fetch=True)
+        if not row:
+            return None
+        job = Job(*row)
+        return job._replace(row_group=None) if job.row_group == WHOLE_FILE else job
+
+    @contextmanager
+    def leased(self, job: Job) -> Iterator[None]:
+        """Extends the job's lease in the background while it is processed."""
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(self.lease / 3):
+                params = {"job_id": job.job_id, "worker": self.worker, "lease": self.lease}
+                try:
+                    self._execute(JobsQueries.HEARTBEAT, params)
+                except psycopg2.Error as e:
+                    logger.warning(f"Heartbeat of job {job.job_id} failed: {e}")
+
+        thread = threading.Thread(target=beat, name=f"heartbeat-{job.job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job: Job, cursor) -> None:
+        """Marks a job done, inside the caller's data transaction.
+
+        Args:
+            job: job to complete.
+            cursor: cursor of the transaction that wrote the job's records.
+        """
+        cursor.execute(JobsQueries.COMPLETE, {"job_id": job.job_id, "worker": self.worker})
+
+    def fail(self, job: Job, error: str) -> None:
+        """Releases a job after an error, failing it after its last attempt."""
+        params = {
+            "job_id": job.job_id,
+            "worker": self.worker,
+            "max_attempts": self.max_attempts,
+            "error": error,
+        }
+        self._execute(JobsQueries.FAIL, params)
+
+    def status(self) -> Dict[str, int]:
+        """Counts jobs per status."""
+        with self._lock, self._connection.cursor() as cursor:
+            cursor.execute(JobsQueries.STATUS)
+            return dict(cursor.fetchall())
+
+    def close(self) -> None:
+        """Closes the queue connection."""
+        self._connection.close()
+
+    def _execute(self, query: str, params: Optional[Dict] = None, fetch: bool = False):
+        with self._lock, self._connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchone() if fetch else None
@@ -0,0 +1,94 @@
+"""Client-side index of the keys already present in a target table."""
+
+from datetime import date
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from base_loader.persistence.reader import binary_rows
+
+logger = logging.getLogger(__name__)
+
+# Keys pack the gvkey in the high 32 bits and the days since 1900-01-01 in the
+# low 32 bits, so a key fits an int64 and sorts in primary key order.
+EPOCH = date(1900, 1, 1)
+EPOCH_OFFSET = (date(1970, 1, 1) - EPOCH).days
+# Row of the binary COPY of packed keys: field count, length, key.
+KEY_ROW = np.dtype([("fields", ">i2"), ("length", ">i4"), ("key", ">i8")])
+
+
+def encode(gvkeys: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Packs gvkeys and days since 1970-01-01 into int64 keys."""
+    return (gvkeys.astype(np.int64) << 32) | (days.astype(np.int64) + EPOCH_OFFSET)
+
+
+def record_keys(records: List[Tuple]) -> np.ndarray:
+    """Packed keys of modeled (datadate, gvkey, ...) records."""
+    gvkeys = np.fromiter((r[1] for r in records), dtype=np.int64, count=len(records))
+    days = np.array([r[0] for r in records], dtype="datetime64[D]").view(np.int64)
+    return encode(gvkeys, days)
+
+
+class KeyIndex:
+    """Sorted array of the (gvkey, datadate) keys present in a table.
+
+    Lets the writer send keys that are not in the table through a plain COPY
+    and the others through a bulk UPDATE, instead of paying ON CONFLICT for all
+    of them. The index reflects the table when it was loaded plus the keys the
+    loader inserted since.
+    """
+
+    def __init__(self, keys: np.ndarray) -> None:
+        self._keys = np.unique(keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def load(
+        cls,
+        target,
+        table: str,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> "KeyIndex":
+        """Loads the keys of a table with a single binary COPY.
+
+        The stream is decoded in place with numpy, so memory stays near the
+        14 wire bytes per key plus the 8 bytes of the index.
+
+        Args:
+            target: database target.
+            table: table to index.
+            date_from: first date to index, inclusive, all dates if None.
+            date_to: last date to index, inclusive, all dates if None.
+
+        Returns:
+            Key index.
+        """
+        logger.info(f"Loading {table} keys...")
+        data = target.copy_keys(table, EPOCH, date_from, date_to)
+        keys = binary_rows(data, KEY_ROW)["key"].astype(np.int64)
+        del data
+        logger.info(f"Loaded {len(keys)} {table} keys.")
+        return cls(keys)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Tells which keys are in the index.
+
+        Args:
+            keys: packed keys.
+
+        Returns:
+            Boolean mask, true where the key is present.
+        """
+        if not len(self._keys):
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.searchsorted(self._keys, keys)
+        pos[pos == len(self._keys)] = 0
+        return self._keys[pos] == keys
+
+    def add(self, keys: np.ndarray) -> None:
+        """Adds keys, e.g. after inserting them."""
+        self._keys = np.union1d(self._keys, keys)
@@ -0,0 +1,1047 @@
+"""Loader."""
+
+from datetime import date, datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import logging
+import multiprocessing
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from base_loader.blocks import ChangeDetector
+from base_loader.cache import DecodedCache
+from base_loader.date_helpers import one_day_backwards, one_day_forward
+from base_loader.dedup import deduplicate, DuplicatePolicy
+from base_loader.discovery import list_files
+from base_loader.features import compute, Feature, lookahead, lookback
+from base_loader.jobs import JobQueue
+from base_loader.key_index import EPOCH, KeyIndex, record_keys
+from base_loader.maintenance import Maintenance
+from base_loader.metrics import LoadMetrics
+from base_loader.persistence import source, target
+from base_loader.persistence.chunked import ChunkedExecutor, date_chunks, month_chunks
+from base_loader.persistence.pipelined import PipelinedTarget
+from base_loader.persistence.reader import Reader
+from base_loader.schedule import discover_units, next_unit, Progress, Unit
+import base_loader.queries as queries
+from base_loader.reconcile import Mismatch, month_start, Reconciler
+from base_loader.registry import ENTITIES, Entity, EntitySpec, Layout
+from base_loader.schema import ENTITY_COLUMNS, KEY_COLUMNS, record_columns
+from base_loader.sort import ExternalSorter
+from base_loader.spool import Spool
+from base_loader.throttle import Throttle
+from base_loader.transform import build_records, model_arrays
+from base_loader.validation import Rule, Validator
+from base_loader.winsorize import percentile_bounds
+
+logger = logging.getLogger(__name__)
+
+
+class Loader:
+    """Loader class for astec files data."""
+
+    def __init__(
+        self,
+        source_path: Optional[str] = None,
+        target_dsn: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        cache_bytes: int = 20 * 1024**3,
+        spool_dir: Optional[str] = None,
+        throttle: Optional[Throttle] = None,
+        pipeline_depth: int = 0,
+        quarantine_dir: Optional[str] = None,
+        features: Sequence[Feature] = (),
+        validation_rules: Sequence[Rule] = (),
+    ) -> None:
+        # Lets worker processes build the same loader.
+        self._options = dict(
+            source_path=source_path,
+            target_dsn=target_dsn,
+            cache_dir=cache_dir,
+            cache_bytes=cache_bytes,
+            throttle=throttle,
+            pipeline_depth=pipeline_depth,
+            quarantine_dir=quarantine_dir,
+            features=features,
+            validation_rules=validation_rules,
+        )
+        cache = DecodedCache(cache_dir, cache_bytes) if cache_dir else None
+        self.spool = Spool(spool_dir) if spool_dir else None
+        if validation_rules and not quarantine_dir:
+            raise ValueError("Validation needs a quarantine directory for rejected records.")
+        self.validator = Validator(quarantine_dir, validation_rules) if validation_rules else None
+        self.source = source.Source(source_path or os.environ.get("SOURCE"), cache)
+        self._target_dsn = target_dsn or os.environ.get("TARGET")
+        self._target = None
+        self._throttle = throttle
+        self._pipeline_depth = pipeline_depth
+        self.metrics = LoadMetrics()
+        self._rtn_dates: Set[datetime] = set()
+        self.features = tuple(features)
+        # daily_base dates written with a feature source column.
+        self._feature_dates: Set[datetime] = set()
+
+    @property
+    def target(self) -> target.Target:
+        """Database target, connected on first use."""
+        if self._target is None and self._pipeline_depth:
+            self._target = PipelinedTarget(
+                self._target_dsn, self._throttle, self._pipeline_depth
+            )
+        elif self._target is None:
+            self._target = target.Target(self._target_dsn, self._throttle)
+        return self._target
+
+    @classmethod
+    def resolve_entities(cls, names: Optional[Iterable[str]] = None) -> List[Entity]:
+        """Maps entity names to entities, keeping the default processing order.
+
+        Args:
+            names: entity names, all entities if None.
+
+        Returns:
+            Entities to process.
+        """
+        if not names:
+            return [Entity(n) for n in ENTITIES]
+        unknown = set(names) - set(ENTITIES)
+        if unknown:
+            raise ValueError(f"Unknown entities: {', '.join(sorted(unknown))}")
+        return [Entity(n) for n in ENTITIES if n in set(names)]
+
+    def run(
+        self,
+        true_base=False,
+        entities: Optional[Iterable[str]] = None,
+        pattern: str = "*",
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        on_duplicate: str = DuplicatePolicy.LAST,
+        sort: bool = False,
+        sort_memory_rows: int = 5_000_000,
+        spill_dir: Optional[str] = None,
+        key_index: bool = False,
+        detect_changes: bool = False,
+        one_pass: bool = False,
+    ) -> None:
+        """Persists tables.
+
+        Args:
+            true_base: load into true_base (unshifted dates) instead of daily_base.
+            entities: entity names to load, all if None.
+            pattern: glob selecting source files inside each entity directory.
+            date_from: first source date to load, inclusive.
+            date_to: last source date to load, inclusive.
+            on_duplicate: 'last' or 'first', which record of a repeated
+                (datadate, gvkey) key within a file is written.
+            sort: write each entity's records in (gvkey, datadate) primary key
+                order instead of file order, for index locality.
+            sort_memory_rows: records kept in memory before spilling a sorted
+                run to disk.
+            spill_dir: directory for sorted runs, the system temp dir if None.
+            key_index: load the table's existing keys first, then COPY new keys
+                and bulk UPDATE existing ones instead of upserting everything.
+            detect_changes: only write the (gvkey, month) blocks of each file
+                whose content hash differs from the one stored by earlier loads.
+            one_pass: also write each file's unshifted records into true_base,
+                so only the dates of the loaded files are rewritten there and
+                no second pass over the files is needed. daily_base loads only.
+
+        Raises:
+            ValueError: if one_pass is set for a true_base load, or if the
+                spool holds segments of a failed run: replaying them after
+                this load would overwrite its newer rows.
+        """
+        if one_pass and true_base:
+            raise ValueError("One pass loads start from daily_base.")
+        if self.spool is not None and self.spool.segments():
+            raise ValueError(
+                f"{len(self.spool.segments())} spool segments from a failed run were never "
+                "replayed, replay or discard them first."
+            )
+        policy = DuplicatePolicy(on_duplicate)
+        self.metrics = LoadMetrics()
+        self._rtn_dates = set()
+        self._feature_dates = set()
+
+        index = None
+        if key_index:
+            # Daily dates are shifted by up to three days around weekends.
+            margin = timedelta(days=0 if true_base else 4)
+            index = KeyIndex.load(
+                self.target,
+                "true_base" if true_base else "daily_base",
+                date_from - margin if date_from else None,
+                date_to + margin if date_to else None,
+            )
+        true_dates = set()
+        for entity in self.resolve_entities(entities):
+            logger.info(f"Starting to process {entity}...")
+
+            self.source.set_source_dir(ENTITIES[entity.value].source_dir)
+            files = list_files(self.source.source_dir, pattern)
+            tbl = "true_base" if true_base else "daily_base"
+            detector = ChangeDetector(self.target, tbl, entity.value) if detect_changes else None
+            sorter = None
+            if sort:
+                sorter = ExternalSorter(
+                    record_columns(entity.value), sort_memory_rows, spill_dir
+                )
+            i = 0
+            for file in files:
+                logger.info(f"{i}/{len(files)} files persisted.")
+                if one_pass:
+                    true_records = self.read_records(
+                        entity, file, True, date_from, date_to, policy
+                    )
+                    self.write(entity, true_records, True)
+                    if sorter is not None:
+                        self.commit()
+                    true_dates.update(r[0] for r in true_records)
+                    records, _ = deduplicate(self.shift_records(entity, true_records), policy)
+                else:
+                    records = self.read_records(
+                        entity, file, true_base, date_from, date_to, policy
+                    )
+                if detector is not None:
+                    n = len(records)
+                    records = detector.changed(records)
+                    self.metrics.add(tbl, entity.value, skipped=n - len(records))
+
+                if sorter is not None:
+                    sorter.add(records)
+                else:
+                    self.write(entity, records, true_base, index)
+                    if detector is not None:
+                        detector.flush()
+                    self.commit()
+                i += 1
+
+            if sorter is not None:
+                with sorter:
+                    logger.info(f"Executing {len(sorter)} records in primary key order")
+                    for records in self.iter_slicer(iter(sorter), 1_000_000):
+                        # Keys repeated across files are now adjacent.
+                        records, _ = deduplicate(records, policy)
+                        self.write(entity, records, true_base, index)
+                        self.commit()
+                if detector is not None:
+                    # Hashes are committed once every sorted record is.
+                    detector.flush()
+                    self.commit()
+            logger.info(f"{entity} persisted.")
+
+        if one_pass:
+            logger.info(f"true_base rewritten on {len(true_dates)} dates in the same pass.")
+        self.metrics.log()
+        logger.info("Process finished.")
+
+    def run_parallel(
+        self,
+        workers: int,
+        memory_budget: int,
+        true_base: bool = False,
+        entities: Optional[Iterable[str]] = None,
+        pattern: str = "*",
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        on_duplicate: str = DuplicatePolicy.LAST,
+    ) -> List[Unit]:
+        """Persists tables from several worker processes.
+
+        Files are split into row group units sized from their footers, unless
+        their row groups share keys. Units are started largest first on the
+        next free worker, as long as the estimated memory of the running
+        units stays within 'memory_budget', so no single large file is left
+        running alone at the end. Each unit is written and committed by its
+        worker. Write rate limits are shared evenly by the workers.
+
+        A failed unit is logged and the others go on; the failed units are
+        reported at the end.
+
+        Args:
+            workers: worker processes.
+            memory_budget: estimated memory all running units may use, in bytes.
+            true_base: load into true_base (unshifted dates) instead of daily_base.
+            entities: entity names to load, all if None.
+            pattern: glob selecting source files inside each entity directory.
+            date_from: first source date to load, inclusive.
+            date_to: last source date to load, inclusive.
+            on_duplicate: 'last' or 'first', which record of a repeated
+                (datadate, gvkey) key of a file is written.
+
+        Returns:
+            Units that failed or were not started, empty if all were loaded.
+
+        Raises:
+            ValueError: if the loader spools, the spool is not shared by workers.
+        """
+        if self.spool is not None:
+            raise ValueError("Parallel loads do not support the spool.")
+        self.metrics = LoadMetrics()
+        self._rtn_dates = set()
+        self._feature_dates = set()
+
+        directories = []
+        for entity in self.resolve_entities(entities):
+            self.source.set_source_dir(ENTITIES[entity.value].source_dir)
+            directories.append((entity.value, self.source.source_dir))
+        pending = discover_units(directories, pattern)
+        progress = Progress(pending)
+        failed: List[Unit] = []
+
+        options = dict(self._options)
+        if self._throttle is not None:
+            options["throttle"] = self._throttle.share(workers)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            workers,
+            context,
+            initializer=_init_worker,
+            initargs=(options, logging.getLogger().getEffectiveLevel()),
+        ) as executor:
+            running = {}
+            while pending or running:
+                while pending and len(running) < workers:
+                    in_flight = sum(u.memory for u in running.values())
+                    i = next_unit(pending, in_flight, memory_budget)
+                    if i < 0:
+                        break
+                    unit = pending.pop(i)
+                    try:
+                        future = executor.submit(
+                            _load_unit, unit, true_base, date_from, date_to, on_duplicate
+                        )
+                    except BrokenProcessPool:
+                        logger.error(f"Worker pool broken, {len(pending) + 1} units not started.")
+                        failed.append(unit)
+                        failed.extend(pending)
+                        pending = []
+                        break
+                    running[future] = unit
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    unit = running.pop(future)
+                    try:
+                        counts, rtn_dates, feature_dates = future.result()
+                    except Exception:
+                        logger.exception(f"Unit {_describe(unit)} failed.")
+                        failed.append(unit)
+                        continue
+                    for key, counter in counts.items():
+                        self.metrics.counts[key].update(counter)
+                    self._rtn_dates.update(rtn_dates)
+                    self._feature_dates.update(feature_dates)
+                    progress.advance(unit)
+
+        self.metrics.log()
+        if failed:
+            logger.error(
+                f"{len(failed)} of {progress.total_units} units not loaded, the others "
+                f"are committed:\n" + "\n".join(f"  {_describe(u)}" for u in failed)
+            )
+        logger.info("Process finished.")
+        return failed
+
+    def enqueue(
+        self,
+        queue: JobQueue,
+        tables: Iterable[str],
+        entities: Optional[Iterable[str]] = None,
+        pattern: str = "*",
+    ) -> None:
+        """Enqueues one unit per (entity, file, row group, table) for workers.
+
+        Only file footers are read, and the key columns of files whose row
+        groups may share keys. Units are enqueued largest first, and
+        workers claim them in that order, so large files do not finish last.
+
+        Args:
+            queue: work queue.
+            tables: tables to load, 'daily_base' and/or 'true_base'.
+            entities: entity names to load, all if None.
+            pattern: glob selecting source files inside each entity directory.
+        """
+        queue.create()
+        directories = []
+        for entity in self.resolve_entities(entities):
+            self.source.set_source_dir(ENTITIES[entity.value].source_dir)
+            directories.append((entity.value, self.source.source_dir))
+        units = [
+            (u.entity, u.file_name, u.row_group, tbl)
+            for u in discover_units(directories, pattern)
+            for tbl in tables
+        ]
+
+        n = queue.enqueue(units)
+        logger.info(f"Enqueued {n} new units out of {len(units)}.")
+        logger.info(f"Queue: {queue.status()}")
+
+    def work(
+        self,
+        queue: JobQueue,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        on_duplicate: str = DuplicatePolicy.LAST,
+    ) -> None:
+        """Claims and loads queued units until none is left.
+
+        Each unit is written and marked done in one transaction. Failed units
+        are rolled back and released for another attempt. Cross-sectional and
+        whole-table stages (winsorize, cleanup, features, maintenance) are
+        left to run once the queue is drained.
+
+        Args:
+            queue: work queue.
+            date_from: first source date to load, inclusive.
+            date_to: last source date to load, inclusive.
+            on_duplicate: 'last' or 'first', which record of a repeated
+                (datadate, gvkey) key of a file is written.
+        """
+        policy = DuplicatePolicy(on_duplicate)
+        self.metrics = LoadMetrics()
+        logger.info(f"Worker {queue.worker} started.")
+        done = 0
+        while True:
+            job = queue.claim()
+            if job is None:
+                break
+            part = "" if job.row_group is None else f" row group {job.row_group}"
+            logger.info(
+                f"Job {job.job_id}: {job.entity} {job.file_name}{part} "
+                f"into {job.target_table}..."
+            )
+            entity = Entity(job.entity)
+            true_base = job.target_table == "true_base"
+            try:
+                with queue.leased(job):
+                    records = self.read_records(
+                        entity, job.file_name, true_base, date_from, date_to, policy, job.row_group
+                    )
+                    # As in run_parallel: one key order across workers, no deadlocks.
+                    records.sort(key=lambda r: (r[1], r[0]))
+                    self.write(entity, records, true_base)
+                    queue.complete(job, self.target.cursor)
+                    self.commit()
+            except Exception as e:
+                self.target.rollback_transaction()
+                queue.fail(job, repr(e))
+                logger.exception(f"Job {job.job_id} failed.")
+                continue
+            done += 1
+
+        logger.info(f"Worker {queue.worker} finished, {done} units loaded.")
+        self.metrics.log()
+
+    def read_records(
+        self,
+        entity: Entity,
+        file: str,
+        true_base: bool = False,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        policy: DuplicatePolicy = DuplicatePolicy.LAST,
+        row_group: Optional[int] = None,
+    ) -> List[Tuple]:
+        """Reads, models, validates and deduplicates the records of a source file.
+
+        Args:
+            entity: entity the file belongs to.
+            file: file inside the entity's source directory.
+            true_base: keep source dates instead of shifting them for daily_base.
+            date_from: first source date to read, inclusive.
+            date_to: last source date to read, inclusive.
+            policy: record kept when a (datadate, gvkey) key repeats.
+            row_group: only read this parquet row group, the whole file if None.
+
+        Returns:
+            Modeled records.
+        """
+        spec = ENTITIES[entity.value]
+        table = self.read_table(spec, file, date_from, date_to, row_group)
+
+        logger.info(f"Modeling {table.num_rows} rows...")
+        parts = [model_arrays(spec, b, true_base) for b in table.to_batches(1_000_000)]
+        del table
+        if not parts:
+            return []
+        micros = np.concatenate([p[0] for p in parts])
+        gvkeys = np.concatenate([p[1] for p in parts])
+        values = {c: np.concatenate([p[2][c] for p in parts]) for c in spec.columns}
+        del parts
+
+        tbl = "true_base" if true_base else "daily_base"
+        if self.validator is not None:
+            name = f"{tbl}-{entity.value}-{os.path.splitext(file)[0]}"
+            if row_group is not None:
+                name += f"-{row_group}"
+            valid, violations = self.validator.validate(spec, micros, gvkeys, values, name)
+            if violations:
+                self.metrics.add(
+                    tbl, entity.value, quarantined=len(valid) - int(valid.sum()), **violations
+                )
+                micros, gvkeys = micros[valid], gvkeys[valid]
+                values = {c: v[valid] for c, v in values.items()}
+        records = build_records(spec, micros, gvkeys, values)
+        del micros, gvkeys, values
+
+        records, collapsed = deduplicate(records, policy)
+        if collapsed:
+            self.metrics.add(tbl, entity.value, duplicates=collapsed)
+            logger.warning(
+                f"{file}: collapsed {collapsed} duplicate (datadate, gvkey) records, "
+                f"keeping the {policy.value}."
+            )
+
+        return records
+
+    def read_table(
+        self,
+        spec: EntitySpec,
+        file: str,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> pa.Table:
+        """Reads a source file of an entity as the batches its spec models.
+
+        Args:
+            spec: entity spec.
+            file: file inside the entity's source directory.
+            date_from: first source date to read, inclusive.
+            date_to: last source date to read, inclusive.
+            row_group: only read this parquet row group, the whole file if None.
+
+        Returns:
+            The spec's source columns of a RECORDS layout, the (gvkey, date,
+            value) cells of a wide or transposed one.
+        """
+        self.source.set_source_dir(spec.source_dir)
+        if spec.layout == Layout.RECORDS:
+            return self.source.get_column_table(
+                file_name=file,
+                columns=spec.source_columns,
+                date_from=date_from,
+                date_to=date_to,
+                row_group=row_group,
+            )
+        return self.source.get_long_table(
+            file_name=file,
+            transpose=spec.layout == Layout.TRANSPOSED,
+            date_from=date_from,
+            date_to=date_to,
+            row_group=row_group,
+        )
+
+    @staticmethod
+    def shift_records(entity: Entity, records: List[Tuple]) -> List[Tuple]:
+        """Shifts true_base records to their daily_base dates.
+
+        Dates move one business day in the entity spec's direction, as
+        they do when loading daily_base.
+
+        Args:
+            entity: entity the records belong to.
+            records: modeled records with source dates.
+
+        Returns:
+            Records with daily_base dates.
+        """
+        shift = one_day_backwards if ENTITIES[entity.value].shift < 0 else one_day_forward
+        return [(shift(r[0]),) + tuple(r[1:]) for r in records]
+
+    def write(
+        self,
+        entity: Entity,
+        records: List[Tuple],
+        true_base: bool,
+        index: Optional[KeyIndex] = None,
+    ) -> None:
+        """Writes modeled records in batches, without committing.
+
+        Args:
+            entity: entity the records belong to.
+            records: modeled records.
+            true_base: write into true_base instead of daily_base.
+            index: keys present in the table; if given, new keys are copied
+                and existing keys updated, otherwise everything is upserted.
+        """
+        tbl = "true_base" if true_base else "daily_base"
+        if self.spool is not None:
+            self.spool.append(entity.value, tbl, records)
+        if entity == Entity.RETURNS and not true_base:
+            self._rtn_dates.update(r[0] for r in records)
+        if not true_base and self._feeds_features(entity):
+            self._feature_dates.update(r[0] for r in records)
+
+        entity_queries = queries.entity_queries(ENTITIES[entity.value].columns)
+        if index is None:
+            self.execute(entity, tbl, entity_queries.UPSERT.format(tbl=tbl), records)
+            return
+
+        keys = record_keys(records)
+        exists = index.contains(keys)
+        new = [r for r, e in zip(records, exists.tolist()) if not e]
+        existing = [r for r, e in zip(records, exists.tolist()) if e]
+        logger.info(f"{len(new)} new keys to copy, {len(existing)} existing keys to update.")
+
+        columns = KEY_COLUMNS + entity_queries.COLUMNS
+        for records_slice in self.list_slicer(new, 250_000):
+            if not records_slice:
+                continue
+            if self.target.copy(tbl, columns, records_slice):
+                self.metrics.add(tbl, entity.value, inserted=len(records_slice))
+            else:
+                logger.warning("Keys were added since the key index was loaded, upserting.")
+                self.execute(entity, tbl, entity_queries.UPSERT.format(tbl=tbl), records_slice)
+        index.add(keys[~exists])
+
+        self.execute(
+            entity,
+            tbl,
+            entity_queries.UPDATE.format(tbl=tbl),
+            existing,
+            entity_queries.TEMPLATE,
+        )
+
+    def execute(
+        self,
+        entity: Entity,
+        tbl: str,
+        query: str,
+        records: List[Tuple],
+        template: Optional[str] = None,
+    ) -> None:
+        """Executes an upsert or update query over records in batches.
+
+        Args:
+            entity: entity the records belong to.
+            tbl: target table.
+            query: query returning one 'inserted' boolean per written row.
+            records: modeled records.
+            template: VALUES row template, psycopg2's default if None.
+        """
+        n = len(records)
+        logger.info("Executing records")
+        for j, records_slice in enumerate(self.list_slicer(records, 250_000)):
+            if not records_slice:
+                continue
+            logger.debug(f"{j * 250_000}/{n} records executed.")
+            inserted, updated, unchanged = self.target.upsert(query, records_slice, template)
+            logger.info(
+                f"Batch of {len(records_slice)}: {inserted} inserted, "
+                f"{updated} updated, {unchanged} unchanged."
+            )
+            self.metrics.add(
+                tbl, entity.value, inserted=inserted, updated=updated, unchanged=unchanged
+            )
+
+    def commit(self) -> None:
+        """Commits the transaction and drops its batches from the spool."""
+        self.target.commit_transaction()
+        if self.spool is not None:
+            self.spool.ack()
+
+    def replay(self) -> None:
+        """Writes the spool segments left by a failed run to the database.
+
+        Source files are not read again: segments hold the modeled records
+        and are upserted as-is, one transaction per segment.
+
+        Raises:
+            ValueError: if the loader has no spool.
+        """
+        if self.spool is None:
+            raise ValueError("Replaying needs a spool directory.")
+
+        self.metrics = LoadMetrics()
+        self._rtn_dates = set()
+        self._feature_dates = set()
+        segments = self.spool.segments()
+        logger.info(f"Replaying {len(segments)} spool segments...")
+        for i, path in enumerate(segments):
+            name, tbl, records = self.spool.read(path)
+            entity = Entity(name)
+            records = list(records)
+            upsert = queries.entity_queries(ENTITIES[entity.value].columns).UPSERT
+            self.execute(entity, tbl, upsert.format(tbl=tbl), records)
+            self.target.commit_transaction()
+            self.spool.remove(path)
+            if entity == Entity.RETURNS and tbl == "daily_base":
+                self._rtn_dates.update(r[0] for r in records)
+            if tbl == "daily_base" and self._feeds_features(entity):
+                self._feature_dates.update(r[0] for r in records)
+            logger.info(f"{i + 1}/{len(segments)} segments replayed.")
+
+        self.metrics.log()
+
+    def update_winsorized(self) -> None:
+        """Recomputes winsorized_5_rtn on the daily_base dates the last load,
+        parallel load or replay wrote returns on.
+
+        Runs after cleanup, so bounds are computed over the rows that stay.
+        """
+        if not self._rtn_dates:
+            logger.info("No returns were written, winsorized_5_rtn is up to date.")
+            return
+        self.winsorize(sorted(self._rtn_dates))
+
+    def winsorize(self, dates: Optional[Sequence[date]] = None) -> None:
+        """Fills daily_base winsorized_5_rtn, clipping rtn to its 5th and 95th
+        percentiles on each date.
+
+        Every cross-section is read whole from the table, so dates are
+        recomputed over the returns already there plus the ones just loaded.
+        Percentiles are computed client side for many dates at once, and only
+        the per-date bounds are sent back; rows whose value did not change are
+        not rewritten.
+
+        Args:
+            dates: dates to recompute, every date in daily_base if None.
+        """
+        if dates is None:
+            dates = self.target.fetch_dates("daily_base")
+        logger.info(f"Winsorizing returns on {len(dates)} dates...")
+
+        total = 0
+        for dates_slice in self.list_slicer(list(dates), 250):
+            if not dates_slice:
+                continue
+            data = self.target.copy_values("daily_base", "rtn", EPOCH, dates_slice)
+            values = np.array(data.split(), dtype=np.float64).reshape(-1, 2)
+            days, lower, upper = percentile_bounds(values[:, 0].astype(np.int64), values[:, 1])
+            bounds = [
+                (EPOCH + timedelta(days=d), lo, hi)
+                for d, lo, hi in zip(days.tolist(), lower.tolist(), upper.tolist())
+            ]
+            if bounds:
+                _, updated, _ = self.target.upsert(
+                    queries.WinsorizeQueries.UPDATE,
+                    bounds,
+                    queries.WinsorizeQueries.TEMPLATE,
+                )
+                self.metrics.add("daily_base", "winsorized_5_rtn", updated=updated)
+                total += updated
+            self.target.commit_transaction()
+        logger.info(f"winsorized_5_rtn updated on {total} rows.")
+
+    def _feeds_features(self, entity: Entity) -> bool:
+        columns = ENTITY_COLUMNS[entity.value]
+        return any(f.column in columns for f in self.features)
+
+    def update_features(self) -> None:
+        """Rebuilds the features around the daily_base dates the last load,
+        parallel load or replay wrote a feature source column on.
+
+        Runs after cleanup, so features are computed over the rows that stay.
+        """
+        if not self._feature_dates:
+            logger.info("No feature source column was written, features are up to date.")
+            return
+        self.build_features(min(self._feature_dates).date(), max(self._feature_dates).date())
+
+    def build_features(
+        self,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        chunk_days: int = 365,
+    ) -> None:
+        """Rebuilds the daily_features rows whose windows include a date range.
+
+        Rows from 'date_from' up to the end of the longest window starting on
+        'date_to' are recomputed, so extending daily_base with new dates only
+        computes the new rows, while rewriting past dates also refreshes the
+        windows that reach over them. The range is processed in date chunks,
+        each read from daily_base with its lookback, computed client side and
+        written in its own transaction: the chunk's rows are deleted and the
+        new ones copied, so rows of keys cleanup removed go away too.
+
+        Args:
+            date_from: first changed date, the first daily_base date if None.
+            date_to: last changed date, the last daily_base date if None.
+            chunk_days: days of datadate per chunk.
+
+        Raises:
+            ValueError: if the loader has no features.
+        """
+        if not self.features:
+            raise ValueError("No features to build.")
+        window = max(f.window for f in self.features)
+        if date_from is None or date_to is None:
+            first, last = self.target.fetch_date_bounds("daily_base")
+            if first is None:
+                logger.info("daily_base is empty, no features to build.")
+                return
+            date_from = max(date_from or first.date(), first.date())
+            date_to = min(date_to or last.date(), last.date())
+        start = datetime.combine(date_from, datetime.min.time())
+        end = datetime.combine(lookahead(date_to, window), datetime.min.time())
+
+        self.target.execute_query(queries.table_ddl("daily_features"))
+        for feature in self.features:
+            self.target.execute_query(
+                queries.FeaturesQueries.ADD_COLUMN.format(column=feature.name)
+            )
+        self.target.commit_transaction()
+
+        chunks = date_chunks(start, end, chunk_days)
+        logger.info(f"Building features from {start:%Y-%m-%d} to {end:%Y-%m-%d}...")
+        names = [f.name for f in self.features]
+        sources = sorted({f.column for f in self.features})
+        reader = Reader(self._target_dsn)
+        for chunk_start, chunk_end in chunks:
+            arrays = list(
+                reader.iter_arrays(
+                    "daily_base",
+                    sources,
+                    date_from=lookback(chunk_start.date(), window),
+                    date_to=(chunk_end - timedelta(days=1)).date(),
+                )
+            )
+            records = []
+            if arrays:
+                datadates = np.concatenate([a["datadate"] for a in arrays])
+                gvkeys = np.concatenate([a["gvkey"] for a in arrays])
+                columns = {c: np.concatenate([a[c] for a in arrays]) for c in sources}
+                values = compute(gvkeys, datadates, columns, self.features)
+                # Rows before the chunk were only read as lookback.
+                keep = datadates >= np.datetime64(chunk_start, "us")
+                rows = zip(
+                    datadates[keep].astype(object).tolist(),
+                    gvkeys[keep].tolist(),
+                    *(values[n][keep].tolist() for n in names),
+                )
+                records = [tuple(None if v != v else v for v in row) for row in rows]
+
+            self.target.delete_dates("daily_features", chunk_start, chunk_end)
+            for records_slice in self.list_slicer(records, 250_000):
+                if records_slice:
+                    self.target.copy("daily_features", KEY_COLUMNS + tuple(names), records_slice)
+            self.target.commit_transaction()
+            self.metrics.add("daily_features", "features", inserted=len(records))
+            logger.info(f"Features of {len(records)} rows up to {chunk_end:%Y-%m-%d} written.")
+
+    def reconcile(
+        self,
+        true_base: bool = False,
+        entities: Optional[Iterable[str]] = None,
+        pattern: str = "*",
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        on_duplicate: str = DuplicatePolicy.LAST,
+        examples: int = 5,
+    ) -> List[Mismatch]:
+        """Compares the source files with a loaded table, by (entity, month) blocks.
+
+        With a date range, the whole months it touches are compared. Files
+        are read a few days beyond them, since daily_base dates move across
+        month ends, and records are kept by their table date.
+
+        Args:
+            true_base: compare with true_base instead of daily_base.
+            entities: entity names to compare, all if None.
+            pattern: glob selecting source files inside each entity directory.
+            date_from: a date of the first month to compare.
+            date_to: a date of the last month to compare.
+            on_duplicate: 'last' or 'first', as the load used.
+            examples: mismatching keys logged per kind and block.
+
+        Returns:
+            Mismatching blocks.
+        """
+        reconciler = Reconciler(
+            self.target,
+            Reader(self._target_dsn),
+            self.read_table,
+            true_base,
+            on_duplicate,
+            examples,
+        )
+        first_month = last_month = None
+        read_from = read_to = None
+        if date_from is not None:
+            first_month = (date_from.year - 1970) * 12 + date_from.month - 1
+            read_from = date_from.replace(day=1) - timedelta(days=4)
+        if date_to is not None:
+            last_month = (date_to.year - 1970) * 12 + date_to.month - 1
+            read_to = month_start(last_month + 1) + timedelta(days=3)
+
+        for entity in self.resolve_entities(entities):
+            spec = ENTITIES[entity.value]
+            self.source.set_source_dir(spec.source_dir)
+            files = list_files(self.source.source_dir, pattern)
+            logger.info(f"Aggregating {len(files)} {entity} files...")
+            for file in files:
+                reconciler.add(spec, file, self.read_table(spec, file, read_from, read_to))
+        return reconciler.compare(first_month, last_month)
+
+    def cleanup(self, concurrency: int = 4, chunk_days: int = 30) -> None:
+        """Restricts universe to U.S. and removes every useless records from the data
+
+        The invalid record deletes run over datadate chunks, each in its own
+        short transaction, on up to 'concurrency' pooled connections.
+
+        Args:
+            concurrency: connections deleting chunks in parallel.
+            chunk_days: days of datadate per chunk.
+        """
+        logger.info("Cleaning daily_base table...")
+        first, last = self.target.fetch_date_bounds("daily_base")
+        chunks = date_chunks(first, last, chunk_days) if first is not None else []
+        cleanup_queries = queries.CleanupQueries
+        clean_mktcap_vol_rtn = cleanup_queries.CLEAN_MKTCAP_VOL_RTN_CHUNK
+        clean_astec = cleanup_queries.CLEAN_ASTEC_CHUNK
+        if self.target.table_exists("block_hashes"):
+            clean_mktcap_vol_rtn = cleanup_queries.CLEAN_MKTCAP_VOL_RTN_CHUNK_BLOCKS
+            clean_astec = cleanup_queries.CLEAN_ASTEC_CHUNK_BLOCKS
+            # Whole months, so no two chunks drop the same block hash.
+            if first is not None:
+                chunks = month_chunks(first, last, max(chunk_days // 30, 1))
+        self.target.commit_transaction()
+        with ChunkedExecutor(self._target_dsn, concurrency) as executor:
+            logger.info(
+                "Removing invalid records (no market_cap/no volume/returns data/below thresholds)..."
+            )
+            n = executor.run(clean_mktcap_vol_rtn, chunks)
+            logger.info(f"{n} invalid records deleted in {len(chunks)} chunks.")
+
+            logger.info("Removing invalid records (no astec data)...")
+            n = executor.run(clean_astec, chunks)
+            logger.info(f"{n} invalid records deleted in {len(chunks)} chunks.")
+
+        logger.info("Restricting to U.S. gvkeys only...")
+        us_keys = set(self.target.fetch_us_keys())
+        keys = set(self.target.fetch_keys())
+        invalid_keys = list(keys - us_keys)
+        n = len(invalid_keys)
+
+        invalid_keys = self.list_slicer(invalid_keys, 100)
+        i = 0
+        for keys_slice in invalid_keys:
+            logger.debug(f"Deleted {i * 100}/{n} invalid keys.")
+            self.target.execute(queries.CleanupQueries.CLEAN_GVKEYS, keys_slice)
+            self.target.commit_transaction()
+            i += 1
+
+        logger.debug(f"Deleted {n}/{n} invalid keys.")
+        logger.info("daily_base is now composed only of valid U.S. records.")
+
+    def maintain(
+        self, tables: Iterable[str], dead_ratio: float = 0.1, modified_ratio: float = 0.1
+    ) -> None:
+        """Vacuums and analyzes the loaded tables that need it, and logs the
+        results like the load metrics.
+
+        Args:
+            tables: tables the load touched.
+            dead_ratio: dead tuple share above which a table is vacuumed.
+            modified_ratio: share of tuples modified since the last analyze
+                above which a table is vacuumed.
+        """
+        logger.info("Running maintenance...")
+        metrics = LoadMetrics()
+        Maintenance(self.target, dead_ratio, modified_ratio).run(tables, metrics)
+        metrics.log()
+
+    def close(self) -> None:
+        """Disconnects from the target if a connection was opened."""
+        if self._target is not None:
+            self._target.disconnect()
+            self._target = None
+
+    @staticmethod
+    def list_slicer(lst: List, slice_len: int) -> List[List]:
+        """Slice list into list of lists.
+
+        Args:
+            lst: list to slice.
+            slice_len: size of each slice.
+
+        Returns:
+            Sliced list.
+        """
+        res = []
+        i = 0
+        while i + slice_len < len(lst):
+            res.append(lst[i : i + slice_len])  # noqa
+            i = i + slice_len
+        res.append(lst[i:])
+        return res
+
+    @staticmethod
+    def iter_slicer(iterator: Iterator, slice_len: int) -> Iterator[List]:
+        """Slice iterator into lists, without materializing it.
+
+        Args:
+            iterator: iterator to slice.
+            slice_len: size of each slice.
+
+        Returns:
+            Iterator over the slices.
+        """
+        while True:
+            res = list(islice(iterator, slice_len))
+            if not res:
+                return
+            yield res
+
+
+# Loader of a worker process, see Loader.run_parallel.
+_worker_loader: Optional[Loader] = None
+
+
+def _init_worker(options: Dict, log_level: int) -> None:
+    global _worker_loader
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d]: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    _worker_loader = Loader(**options)
+
+
+def _describe(unit: Unit) -> str:
+    if unit.row_group is None:
+        return f"{unit.entity} {unit.file_name}"
+    return f"{unit.entity} {unit.file_name} row group {unit.row_group}"
+
+
+def _load_unit(
+    unit: Unit,
+    true_base: bool,
+    date_from: Optional[date],
+    date_to: Optional[date],
+    on_duplicate: str,
+) -> Tuple[Dict, Set[datetime], Set[datetime]]:
+    loader = _worker_loader
+    loader.metrics = LoadMetrics()
+    loader._rtn_dates = set()
+    loader._feature_dates = set()
+    entity = Entity(unit.entity)
+    records = loader.read_records(
+        entity,
+        unit.file_name,
+        true_base,
+        date_from,
+        date_to,
+        DuplicatePolicy(on_duplicate),
+        unit.row_group,
+    )
+    # Workers of different entities upsert the same keys: writing them in one
+    # key order makes their row locks queue instead of deadlocking.
+    records.sort(key=lambda r: (r[1], r[0]))
+    try:
+        loader.write(entity, records, true_base)
+        loader.commit()
+    except Exception:
+        # Leaves the worker's connection usable for its next unit.
+        loader.target.rollback_transaction()
+        raise
+    return dict(loader.metrics.counts), loader._rtn_dates, loader._feature_dates
@@ -0,0 +1,79 @@
+"""Post-load table maintenance."""
+
+import logging
+from typing import Iterable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class TableStats(NamedTuple):
+    """Tuple and size statistics of a table, from pg_stat_user_tables."""
+
+    table: str
+    live_tuples: int
+    dead_tuples: int
+    modified_since_analyze: int
+    total_bytes: int
+
+    @property
+    def dead_ratio(self) -> float:
+        """Share of dead tuples, a proxy for bloat."""
+        return self.dead_tuples / max(self.live_tuples + self.dead_tuples, 1)
+
+    @property
+    def modified_ratio(self) -> float:
+        """Share of live tuples changed since statistics were last gathered."""
+        return self.modified_since_analyze / max(self.live_tuples, 1)
+
+
+class Maintenance:
+    """VACUUM (ANALYZE) of the tables a load touched, when they need it.
+
+    Upserts and deletes leave dead tuples behind and make planner statistics
+    stale until autovacuum catches up. Tables are vacuumed right after the
+    load if their dead tuple or modified tuple share is above a threshold.
+    """
+
+    def __init__(
+        self, target, dead_ratio: float = 0.1, modified_ratio: float = 0.1
+    ) -> None:
+        self.target = target
+        self.dead_ratio = dead_ratio
+        self.modified_ratio = modified_ratio
+
+    def run(self, tables: Iterable[str], metrics=None) -> None:
+        """Measures tables and vacuums the ones above the thresholds.
+
+        Args:
+            tables: tables to check.
+            metrics: load metrics to add the results to, if given.
+        """
+        for table in tables:
+            stats = self.target.fetch_table_stats(table)
+            if stats is None:
+                logger.warning(f"{table}: no statistics, maintenance skipped (missing table?).")
+                continue
+            logger.info(
+                f"{table}: {stats.live_tuples} live, {stats.dead_tuples} dead tuples "
+                f"({stats.dead_ratio:.1%}), {stats.modified_ratio:.1%} modified since "
+                f"analyze, {stats.total_bytes / 1024**2:.1f} MB."
+            )
+            vacuum = (
+                stats.dead_ratio > self.dead_ratio or stats.modified_ratio > self.modified_ratio
+            )
+            if vacuum:
+                logger.info(f"Running VACUUM (ANALYZE) on {table}...")
+                self.target.vacuum(table)
+                after = self.target.fetch_table_stats(table)
+                if after is not None:
+                    logger.info(
+                        f"{table}: {after.dead_tuples} dead tuples left, "
+                        f"{after.total_bytes / 1024**2:.1f} MB."
+                    )
+            if metrics is not None:
+                metrics.add(
+                    table,
+                    "maintenance",
+                    dead_tuples=stats.dead_tuples,
+                    vacuumed=int(vacuum),
+                )
@@ -0,0 +1,30 @@
+"""Load metrics."""
+
+from collections import Counter, defaultdict
+import logging
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LoadMetrics:
+    """Counters of a load, per (table, entity)."""
+
+    def __init__(self) -> None:
+        self.counts: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+
+    def add(self, table: str, entity: str, **counts: int) -> None:
+        """Adds counts for a table and entity.
+
+        Args:
+            table: target table.
+            entity: entity the counts belong to.
+            counts: counter increments, e.g. inserted=10.
+        """
+        self.counts[(table, entity)].update(counts)
+
+    def log(self) -> None:
+        """Logs one summary line per (table, entity)."""
+        for (table, entity), counts in self.counts.items():
+            summary = ", ".join(f"{v} {k}" for k, v in sorted(counts.items()))
+            logger.info(f"{table}/{entity}: {summary}.")
@@ -1,10 +0,0 @@
-"""Models in this importer."""
-
-from .astec import Astec
-from .market_cap import MarketCap
-from .returns import Returns
-from .shares_out import SharesOut
-from .volume import Volume
-
-
-__all__ = ["Astec", "MarketCap", "Returns", "SharesOut", Volume]
@@ -1,9 +1,13 @@
 """Data source interactions."""
 
+from .pipelined import PipelinedTarget
+from .reader import Reader
 from .source import Source
 from .target import Target
 
 __all__ = [
+    "PipelinedTarget",
+    "Reader",
     "Source",
     "Target",
 ]
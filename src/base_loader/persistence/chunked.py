@@ -0,0 +1,108 @@
+"""Parallel execution of a statement over datadate chunks."""
+
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import logging
+from typing import List, Tuple
+
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+def date_chunks(first: datetime, last: datetime, days: int) -> List[Tuple[datetime, datetime]]:
+    """Splits [first, last] into [start, end) ranges of 'days' days.
+
+    Args:
+        first: first date, inclusive.
+        last: last date, inclusive.
+        days: days per chunk.
+
+    Returns:
+        Chunks, in date order.
+    """
+    chunks = []
+    start = first
+    while start <= last:
+        end = start + timedelta(days=days)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def month_chunks(first: datetime, last: datetime, months: int) -> List[Tuple[datetime, datetime]]:
+    """Splits [first, last] into [start, end) ranges of whole calendar months.
+
+    Args:
+        first: first date, inclusive.
+        last: last date, inclusive.
+        months: months per chunk.
+
+    Returns:
+        Chunks, in date order.
+    """
+    chunks = []
+    start = datetime(first.year, first.month, 1)
+    while start <= last:
+        month = start.year * 12 + start.month - 1 + months
+        end = datetime(month // 12, month % 12 + 1, 1)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+class ChunkedExecutor:
+    """Runs one statement per datadate chunk over pooled connections.
+
+    Each chunk is its own short transaction, so locks are held for one chunk
+    at a time and WAL is written in small bursts instead of one huge one, and
+    chunks on different connections run in parallel.
+    """
+
+    def __init__(self, connection_string: str, concurrency: int = 4) -> None:
+        self.concurrency = concurrency
+        self._pool = ThreadedConnectionPool(1, concurrency, connection_string)
+
+    def __enter__(self) -> "ChunkedExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def run(self, query: str, chunks: List[Tuple[datetime, datetime]]) -> int:
+        """Executes a query once per chunk, committing each chunk.
+
+        Args:
+            query: statement taking the chunk's start and end as parameters,
+                optionally ending in a SELECT of the rows it affected.
+            chunks: [start, end) datadate ranges.
+
+        Returns:
+            Total rows affected.
+        """
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self._execute, query, c): c for c in chunks}
+            for i, future in enumerate(as_completed(futures)):
+                start, end = futures[future]
+                rows = future.result()
+                total += rows
+                logger.info(
+                    f"{i + 1}/{len(chunks)} chunks done, [{start:%Y-%m-%d}, {end:%Y-%m-%d}): "
+                    f"{rows} rows affected."
+                )
+        return total
+
+    def close(self) -> None:
+        """Closes every pooled connection."""
+        self._pool.closeall()
+
+    def _execute(self, query: str, chunk: Tuple[datetime, datetime]) -> int:
+        connection = self._pool.getconn()
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.execute(query, chunk)
+                # Statements ending in a SELECT return their own count.
+                return cursor.fetchone()[0] if cursor.description else cursor.rowcount
+        finally:
+            self._pool.putconn(connection)
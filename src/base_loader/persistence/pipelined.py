@@ -0,0 +1,178 @@
+"""Pipelined target."""
+
+from collections import deque
+import logging
+from time import monotonic
+from typing import Deque, Iterator, List, Optional, Tuple
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+from base_loader.throttle import Throttle
+
+from .target import PAGE_SIZE, Target
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    """A pipelined statement failed; names the records of its page.
+
+    The transaction is aborted, as with any failed statement, and pages sent
+    after the failing one were not executed.
+    """
+
+    def __init__(self, first: int, records: List[Tuple], error: Exception) -> None:
+        super().__init__(
+            f"Statement for records {first}-{first + len(records) - 1} of the batch failed: "
+            f"{error}"
+        )
+        self.first = first
+        self.records = records
+        self.error = error
+
+
+class PipelinedTarget(Target):
+    """Target keeping several statements in flight on its connection.
+
+    Target sends one VALUES page at a time and waits for its result, so on a
+    high latency link every page costs a full round trip. Here pages are
+    sent in psycopg 3 pipeline mode: up to 'depth' statements are
+    outstanding, and the next page is built and sent while earlier ones are
+    executed. Results are still read page by page, in order, so counts and a
+    failing page are attributed exactly. Statements run in the same single
+    transaction as with Target.
+
+    Needs psycopg 3 (pip install 'psycopg[binary]'), next to psycopg2.
+    """
+
+    def __init__(
+        self, connection_string: str, throttle: Optional[Throttle] = None, depth: int = 8
+    ) -> None:
+        if psycopg is None:
+            raise ImportError("Pipelined writes need psycopg 3: pip install 'psycopg[binary]'.")
+        if depth < 1:
+            raise ValueError("Pipeline depth must be at least 1.")
+        super().__init__(connection_string, throttle)
+        self.depth = depth
+
+    @staticmethod
+    def _connect(connection_string: str):
+        # Client side binding, so statements are built like psycopg2 builds them.
+        return psycopg.connect(
+            connection_string, autocommit=False, cursor_factory=psycopg.ClientCursor
+        )
+
+    def upsert(
+        self, query: str, records: List[Tuple], template: Optional[str] = None
+    ) -> Tuple[int, int, int]:
+        """Upserts a batch of records and counts what happened to them.
+
+        Takes the arguments of Target.upsert.
+
+        Raises:
+            PipelineError: if a page's statement failed.
+        """
+        rows = self._pipeline(query, records, template, fetch=True)
+        inserted = sum(1 for r in rows if r[0])
+        updated = len(rows) - inserted
+
+        return inserted, updated, len(records) - len(rows)
+
+    def execute(self, query: str, records: List[Tuple]) -> None:
+        """Execute batch of records into database.
+
+        Args:
+            query: query to execute.
+            records: records to persist.
+
+        Raises:
+            PipelineError: if a page's statement failed.
+        """
+        self._pipeline(query, records, None, fetch=False)
+
+    def _pipeline(
+        self, query: str, records: List[Tuple], template: Optional[str], fetch: bool
+    ) -> List[Tuple]:
+        if not records:
+            return []
+        if template is None:
+            template = f"({', '.join(['%s'] * len(records[0]))})"
+        head, _, tail = query.partition("%s")
+        throttle = self.throttle if fetch else None
+
+        builder = self._connection.cursor()
+        # (first record, cursor, send time) of the outstanding pages, oldest first.
+        window: Deque[Tuple[int, object, float]] = deque()
+        rows: List[Tuple] = []
+        try:
+            with self._connection.pipeline() as pipeline:
+                for first in range(0, len(records), PAGE_SIZE):
+                    page = records[first : first + PAGE_SIZE]  # noqa
+                    statement = head + ",".join(builder.mogrify(template, r) for r in page) + tail
+                    if throttle is not None:
+                        throttle.wait(len(page), len(statement))
+                    cursor = self._connection.cursor()
+                    cursor.execute(statement)
+                    window.append((first, cursor, monotonic()))
+                    if len(window) < self.depth:
+                        continue
+                    if fetch:
+                        self._collect(window, rows, throttle)
+                    else:
+                        # Statements without results can only be waited for
+                        # all together.
+                        pipeline.sync()
+                        window.clear()
+                while fetch and window:
+                    self._collect(window, rows, throttle)
+        except psycopg.Error as e:
+            # Pages before the failing one have their results, later ones
+            # were aborted with it.
+            first = next((f for f, c, _ in window if c.pgresult is None), None)
+            if first is None:
+                raise
+            page = records[first : first + PAGE_SIZE]  # noqa
+            logger.error(f"Statement for records {first}-{first + len(page) - 1} failed.")
+            raise PipelineError(first, page, e) from e
+
+        if throttle is not None:
+            # Replication lag is only queried once the pipeline is done.
+            self._observe()
+        return rows
+
+    @staticmethod
+    def _collect(window: Deque, rows: List[Tuple], throttle: Optional[Throttle]) -> None:
+        """Waits for the oldest outstanding page, feeding its latency to the throttle."""
+        _, cursor, start = window[0]
+        rows.extend(cursor.fetchall())
+        window.popleft()
+        if throttle is not None:
+            throttle.observe(monotonic() - start)
+
+    @staticmethod
+    def _mogrify(cursor, query: str, params: Tuple) -> str:
+        return cursor.mogrify(query, params)
+
+    @staticmethod
+    def _copy_to(cursor, query: str) -> str:
+        with cursor.copy(query) as copy:
+            return b"".join(bytes(data) for data in copy).decode()
+
+    @staticmethod
+    def _copy_to_binary(cursor, query: str) -> bytes:
+        with cursor.copy(query) as copy:
+            return b"".join(bytes(data) for data in copy)
+
+    @staticmethod
+    def _copy_from(cursor, query: str, pieces: Iterator[str]) -> bool:
+        """Runs a COPY ... FROM STDIN, False if a key already existed."""
+        try:
+            with cursor.copy(query) as copy:
+                for piece in pieces:
+                    copy.write(piece)
+        except psycopg.errors.UniqueViolation:
+            return False
+        return True
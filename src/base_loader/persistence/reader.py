@@ -0,0 +1,278 @@
+"""Reader."""
+
+from datetime import date, timedelta
+import logging
+import queue
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import psycopg2
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from base_loader.schema import DAILY_BASE, KEY_COLUMNS, TRUE_BASE
+
+logger = logging.getLogger(__name__)
+
+# Binary COPY header: 11 bytes signature, 4 bytes flags, 4 bytes extension length.
+HEADER_BYTES = 19
+# Binary COPY trailer: a -1 field count.
+TRAILER_BYTES = 2
+# Microseconds between the Postgres (2000-01-01) and Unix epochs.
+POSTGRES_EPOCH_US = 946_684_800 * 1_000_000
+
+
+class Reader:
+    """Bulk reader of daily_base and true_base slices.
+
+    Slices are streamed with COPY ... TO STDOUT (FORMAT binary). Non-key
+    columns are sent as float8, NULL as NaN, so every row has the same width
+    and whole chunks decode with one numpy structured dtype, with no per-row
+    parsing. COPY runs on a background thread that hands chunks over through
+    a bounded queue, so memory stays bounded by a few chunks.
+    """
+
+    _tables = {"daily_base": DAILY_BASE, "true_base": TRUE_BASE}
+
+    def __init__(self, connection_string: str) -> None:
+        self._connection_string = connection_string
+
+    def iter_arrays(
+        self,
+        table: str,
+        columns: Optional[Sequence[str]] = None,
+        gvkeys: Optional[Sequence[int]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        chunk_rows: int = 1_000_000,
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """Streams a slice of a table as numpy arrays.
+
+        Args:
+            table: 'daily_base' or 'true_base'.
+            columns: non-key columns to read, all if None. The key columns
+                are always read.
+            gvkeys: gvkeys to read, all if None.
+            date_from: first date, inclusive, no lower bound if None.
+            date_to: last date, inclusive, no upper bound if None.
+            chunk_rows: rows per chunk.
+
+        Yields:
+            Column name to array dicts: datadate as datetime64[us], gvkey as
+            int32, other columns as float64 with NaN for NULL.
+
+        Raises:
+            ValueError: if the table or a column is unknown.
+        """
+        names = self.resolve_columns(table, columns)
+        # Each row: field count, then a length and a value per column.
+        fields = [("fields", ">i2")]
+        for i, name in enumerate(names):
+            fields += [(f"length_{i}", ">i4"), (name, self.wire_type(name))]
+        row_type = np.dtype(fields)
+        query = self.query(table, names, gvkeys, date_from, date_to)
+        for chunk in self._iter_chunks(query, row_type.itemsize, chunk_rows):
+            rows = np.frombuffer(chunk, dtype=row_type)
+            arrays = {}
+            for name in names:
+                values = rows[name]
+                if name == "datadate":
+                    micros = values.astype(np.int64) + POSTGRES_EPOCH_US
+                    arrays[name] = micros.view("datetime64[us]")
+                else:
+                    arrays[name] = values.astype(values.dtype.newbyteorder("="))
+            yield arrays
+
+    def iter_batches(self, table: str, **kwargs) -> Iterator[pa.RecordBatch]:
+        """Streams a slice of a table as Arrow record batches.
+
+        Takes the arguments of iter_arrays. NaN values are returned as nulls.
+        """
+        for arrays in self.iter_arrays(table, **kwargs):
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(v, from_pandas=v.dtype.kind == "f") for v in arrays.values()],
+                names=list(arrays),
+            )
+
+    def read(self, table: str, **kwargs) -> pa.Table:
+        """Reads a slice of a table into one Arrow table.
+
+        Takes the arguments of iter_arrays.
+        """
+        names = self.resolve_columns(table, kwargs.get("columns"))
+        schema = pa.schema([(n, self.arrow_type(n)) for n in names])
+        return pa.Table.from_batches(list(self.iter_batches(table, **kwargs)), schema=schema)
+
+    def write_parquet(self, table: str, output_dir: str, **kwargs) -> None:
+        """Writes a slice of a table to parquet files partitioned by year.
+
+        Takes the arguments of iter_arrays. Files are written under
+        'output_dir/year=YYYY/', one batch at a time.
+        """
+        names = self.resolve_columns(table, kwargs.get("columns"))
+        schema = pa.schema([(n, self.arrow_type(n)) for n in names] + [("year", pa.int32())])
+        batches = (
+            batch.append_column("year", pc.year(batch.column("datadate")).cast(pa.int32()))
+            for batch in self.iter_batches(table, **kwargs)
+        )
+        ds.write_dataset(
+            batches,
+            output_dir,
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("year", pa.int32())]), flavor="hive"),
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        logger.info(f"{table} slice written to {output_dir}.")
+
+    @classmethod
+    def resolve_columns(cls, table: str, columns: Optional[Sequence[str]] = None) -> List[str]:
+        """Key columns followed by the requested, or all, other columns.
+
+        Raises:
+            ValueError: if the table or a column is unknown.
+        """
+        if table not in cls._tables:
+            raise ValueError(f"Unknown table '{table}', expected one of {', '.join(cls._tables)}.")
+        available = [c.name for c in cls._tables[table] if c.name not in KEY_COLUMNS]
+        if columns is None:
+            return list(KEY_COLUMNS) + available
+        unknown = [c for c in columns if c not in available and c not in KEY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+        return list(KEY_COLUMNS) + [c for c in columns if c not in KEY_COLUMNS]
+
+    @staticmethod
+    def arrow_type(name: str) -> pa.DataType:
+        """Arrow type of an exported column."""
+        if name == "datadate":
+            return pa.timestamp("us")
+        if name == "gvkey":
+            return pa.int32()
+        return pa.float64()
+
+    @staticmethod
+    def wire_type(name: str) -> str:
+        """Big-endian numpy type of a column in the binary COPY stream."""
+        if name == "datadate":
+            return ">i8"
+        if name == "gvkey":
+            return ">i4"
+        return ">f8"
+
+    @staticmethod
+    def query(
+        table: str,
+        names: Sequence[str],
+        gvkeys: Optional[Sequence[int]],
+        date_from: Optional[date],
+        date_to: Optional[date],
+    ) -> str:
+        """Builds the binary COPY of a slice, with fixed-width columns."""
+        select = ", ".join(
+            n if n in KEY_COLUMNS else f"COALESCE({n}::float8, 'NaN')" for n in names
+        )
+        conditions = ["TRUE"]
+        if gvkeys is not None:
+            conditions.append(f"gvkey IN ({', '.join(str(int(g)) for g in gvkeys)})")
+        if date_from is not None:
+            conditions.append(f"datadate >= '{date_from.isoformat()}'")
+        if date_to is not None:
+            conditions.append(f"datadate < '{(date_to + timedelta(days=1)).isoformat()}'")
+        return (
+            f"COPY (SELECT {select} FROM {table} WHERE {' AND '.join(conditions)}) "
+            "TO STDOUT (FORMAT binary)"
+        )
+
+    def _iter_chunks(self, query: str, row_bytes: int, chunk_rows: int) -> Iterator[bytes]:
+        chunks: "queue.Queue" = queue.Queue(maxsize=2)
+        sink = _ChunkSink(chunks, row_bytes, chunk_rows)
+        errors = []
+
+        def produce() -> None:
+            connection = psycopg2.connect(self._connection_string)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(query, sink)
+                sink.finish()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+                chunks.put(None)
+
+        thread = threading.Thread(target=produce, name="copy-reader", daemon=True)
+        thread.start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            sink.cancelled = True
+            while thread.is_alive():
+                # Unblocks the producer if the consumer stopped early.
+                try:
+                    chunks.get_nowait()
+                except queue.Empty:
+                    thread.join(0.1)
+        if errors:
+            raise errors[0]
+
+
+def binary_rows(data: bytes, row_type: np.dtype) -> np.ndarray:
+    """Rows of a whole binary COPY stream of fixed-width columns, zero copy.
+
+    Args:
+        data: COPY ... TO STDOUT (FORMAT binary) output, header and trailer
+            included.
+        row_type: structured dtype of a row: field count, then a length and a
+            value per column.
+
+    Returns:
+        Structured array over 'data'.
+
+    Raises:
+        ValueError: if the stream does not hold whole rows.
+    """
+    extension = int.from_bytes(data[15:19], "big")
+    rows = memoryview(data)[HEADER_BYTES + extension : len(data) - TRAILER_BYTES]  # noqa
+    if len(rows) % row_type.itemsize:
+        raise ValueError("COPY stream ended in the middle of a row.")
+    return np.frombuffer(rows, dtype=row_type)
+
+
+class _ChunkSink:
+    """File-like COPY target cutting the stream into whole-row chunks."""
+
+    def __init__(self, chunks: "queue.Queue", row_bytes: int, chunk_rows: int) -> None:
+        self.chunks = chunks
+        self.row_bytes = row_bytes
+        self.chunk_bytes = row_bytes * chunk_rows
+        self.cancelled = False
+        self._buffer = bytearray()
+        self._header = True
+
+    def write(self, data: bytes) -> int:
+        if self.cancelled:
+            raise InterruptedError("COPY reader closed.")
+        self._buffer += data
+        if self._header and len(self._buffer) >= HEADER_BYTES:
+            extension = int.from_bytes(self._buffer[15:19], "big")
+            if len(self._buffer) >= HEADER_BYTES + extension:
+                del self._buffer[: HEADER_BYTES + extension]
+                self._header = False
+        if not self._header and len(self._buffer) >= self.chunk_bytes + TRAILER_BYTES:
+            self.chunks.put(bytes(self._buffer[: self.chunk_bytes]))
+            del self._buffer[: self.chunk_bytes]
+        return len(data)
+
+    def finish(self) -> None:
+        rows = self._buffer[:-TRAILER_BYTES]
+        if len(rows) % self.row_bytes:
+            raise ValueError("COPY stream ended in the middle of a row.")
+        if rows:
+            self.chunks.put(bytes(rows))
@@ -1,21 +1,35 @@
 """Source."""
+import csv
+from datetime import date, datetime, time, timedelta
 import logging
 import os
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Sequence, Tuple
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import pyarrow.parquet as pq
 
+from base_loader.cache import DecodedCache
+from base_loader.discovery import resolve_source
+
 logger = logging.getLogger(__name__)
 
+# Suffixes of CSV source files and their compression; other files are parquet.
+CSV_COMPRESSION = {".csv": None, ".csv.gz": "gzip", ".csv.zst": "zstd", ".csv.zstd": "zstd"}
+# Decompressed bytes parsed per CSV block.
+CSV_BLOCK_BYTES = 16 * 1024**2
+
 
 class Source:
     """Source class."""
 
     source_dir: str
 
-    def __init__(self, source: str) -> None:
+    def __init__(self, source: str, cache: Optional[DecodedCache] = None) -> None:
         self.source = self.set_source(source)
+        self.cache = cache
 
     @staticmethod
     def set_source(source: str):
@@ -24,11 +38,7 @@ class Source:
         Returns:
             Absolute path to the source .
         """
-        local_data_path = os.path.join(
-            Path(os.path.abspath(os.curdir)).parent.parent, source
-        )
-
-        return local_data_path
+        return resolve_source(source)
 
     def set_source_dir(self, source_dir: str):
         """Sets path to the directory 'local_data'.
@@ -50,40 +60,485 @@ class Source:
         local_data_path = self.source_dir
         return os.path.join(local_data_path, file_name)
 
-    def get_records(
-        self, file_name, unflatten: bool, transpose: bool = False
-    ) -> List[Tuple]:
-        """Returns all records from file in the source directory.
+    def get_long_table(
+        self,
+        file_name,
+        transpose: bool = False,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> pa.Table:
+        """Returns the non-null cells of a wide file as a (gvkey, date, value) table.
+
+        Args:
+            file_name: file inside the source directory.
+            transpose: whether the wide layout is stored as gvkeys x dates
+                instead of dates x gvkeys.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+            row_group: only read this row group, the whole file if None.
 
         Returns:
-            List of records, which are lists.
+            Table with one row per non-null cell.
         """
         file_path = self.set_source_file(file_name)
+        if is_csv(file_path):
+            raise ValueError(f"{file_path}: CSV sources must use the records layout.")
+        layout = "transposed" if transpose else "wide"
+        key = (layout, date_from, date_to, row_group)
+        table = self.cached(file_path, key)
+        if table is None:
+            logger.info("Unflattening file...")
+            if transpose:
+                batches = list(self.iter_transposed(file_path, date_from, date_to, row_group))
+            else:
+                batches = list(self.iter_wide(file_path, date_from, date_to, row_group))
+            table = self.store(file_path, key, long_table(batches))
+
+        return table
+
+    def get_column_table(
+        self,
+        file_name,
+        columns: Sequence[str],
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> pa.Table:
+        """Returns a projection of a record-layout file as a table.
+
+        Only the requested columns are decoded, from a memory-mapped file and
+        straight from Arrow without going through pandas. Columns are matched
+        by name, case-insensitively.
+
+        Args:
+            file_name: file inside the source directory.
+            columns: columns to read, the first one being the record date.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+            row_group: only read this row group, the whole file if None.
+
+        Returns:
+            Table with the columns, named as in the file.
+
+        Raises:
+            ValueError: if the file schema does not provide the columns.
+        """
+        file_path = self.set_source_file(file_name)
+        key = ("columns", tuple(c.lower() for c in columns), date_from, date_to, row_group)
+        table = self.cached(file_path, key)
+        if table is None:
+            table = self.store(
+                file_path,
+                key,
+                self.read_columns(file_path, columns, date_from, date_to, row_group),
+            )
+
+        return table
+
+    def read_columns(
+        self,
+        file_path: str,
+        columns: Sequence[str],
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> pa.Table:
+        """Reads a projection of a record-layout file.
+
+        Args:
+            file_path: parquet or CSV file.
+            columns: columns to read, the first one being the record date.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+            row_group: only read this row group, the whole file if None.
+
+        Returns:
+            Table with the columns, named as in the file.
+
+        Raises:
+            ValueError: if the file schema does not provide the columns.
+        """
+        if is_csv(file_path):
+            return self.read_csv_columns(file_path, columns, date_from, date_to, row_group)
+
+        schema = pq.read_schema(file_path, memory_map=True)
+        names = self.resolve_columns(schema, columns, file_path)
+
+        date_type = schema.field(names[0]).type
+        filters = []
+        if date_from is not None:
+            filters.append((names[0], ">=", filter_value(date_type, date_from)))
+        if date_to is not None:
+            upper = date_to + timedelta(days=1)
+            filters.append((names[0], "<", filter_value(date_type, upper)))
+
         logger.info("Unpacking file...")
-        table = pq.read_table(file_path)
-        logger.info("Building dataframe...")
-        df = table.to_pandas()
-        if transpose:
-            df = df.transpose()
-        if unflatten:
-            logger.info("Unflattening...")
-            records = self.unflatten(df)
-        else:
-            records = df.to_records()
-        del df
-        logger.info("Records generated.")
-
-        return records
+        return read_table(file_path, names, filters or None, row_group)
+
+    @staticmethod
+    def read_csv_columns(
+        file_path: str,
+        columns: Sequence[str],
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> pa.Table:
+        """Reads a projection of a record-layout CSV file, plain or compressed.
+
+        The file is decompressed and parsed as a stream of blocks, several
+        blocks at a time on Arrow's thread pool. Only the requested columns
+        are converted, with explicit types instead of inferred ones: the date
+        as a timestamp, every other column as float64. Rows outside the date
+        range are dropped block by block, so memory is bounded by a few
+        blocks plus the rows kept.
+
+        Args:
+            file_path: '.csv', '.csv.gz' or '.csv.zst' file with a header row.
+            columns: columns to read, the first one being the record date.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+            row_group: a CSV file is a single unit, row group 0, if not None.
+
+        Returns:
+            Table with the columns, named as in the file.
+
+        Raises:
+            ValueError: if the header does not provide the columns or a value
+                does not parse.
+        """
+        if row_group not in (None, 0):
+            raise ValueError(f"{file_path} is a CSV file, it has no row group {row_group}.")
+        header = {n.lower(): n for n in read_csv_header(file_path)}
+        missing = [c for c in columns if c.lower() not in header]
+        if missing:
+            raise ValueError(f"{file_path} is missing columns: {', '.join(missing)}")
+        names = [header[c.lower()] for c in columns]
+
+        types = {name: pa.float64() for name in names[1:]}
+        types[names[0]] = pa.timestamp("us")
+        lower = upper = None
+        if date_from is not None:
+            lower = datetime.combine(date_from, time())
+        if date_to is not None:
+            upper = datetime.combine(date_to + timedelta(days=1), time())
+
+        logger.info("Parsing file...")
+        batches = []
+        stream = pa.input_stream(file_path, compression=csv_compression(file_path))
+        try:
+            reader = pacsv.open_csv(
+                stream,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_BYTES),
+                convert_options=pacsv.ConvertOptions(include_columns=names, column_types=types),
+            )
+            for batch in reader:
+                mask = None
+                if lower is not None:
+                    mask = pc.greater_equal(batch.column(0), pa.scalar(lower, types[names[0]]))
+                if upper is not None:
+                    below = pc.less(batch.column(0), pa.scalar(upper, types[names[0]]))
+                    mask = below if mask is None else pc.and_(mask, below)
+                batches.append(batch if mask is None else batch.filter(mask))
+            schema = reader.schema
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"{file_path}: {e}")
+        finally:
+            stream.close()
+        return pa.Table.from_batches(batches, schema=schema)
+
+    def cached(self, file_path: str, key: Tuple) -> Optional[pa.Table]:
+        """Returns a file's decoded table from the cache, if there is one."""
+        if self.cache is None:
+            return None
+        return self.cache.get(self.cache.fingerprint(file_path, key))
+
+    def store(self, file_path: str, key: Tuple, table: pa.Table) -> pa.Table:
+        """Stores a file's decoded table in the cache, if there is one."""
+        if self.cache is not None:
+            self.cache.put(self.cache.fingerprint(file_path, key), table)
+        return table
+
+    @staticmethod
+    def resolve_columns(
+        schema: pa.Schema, columns: Sequence[str], file_path: str
+    ) -> List[str]:
+        """Matches expected columns against a file schema.
+
+        Args:
+            schema: file schema.
+            columns: expected columns, the first one being the record date.
+            file_path: file, for error messages.
+
+        Returns:
+            Column names as spelled in the file.
+
+        Raises:
+            ValueError: if a column is missing or has an unexpected type.
+        """
+        names = {n.lower(): n for n in schema.names}
+        missing = [c for c in columns if c.lower() not in names]
+        if missing:
+            raise ValueError(f"{file_path} is missing columns: {', '.join(missing)}")
+
+        resolved = [names[c.lower()] for c in columns]
+        date_type = schema.field(resolved[0]).type
+        if not (pa.types.is_timestamp(date_type) or pa.types.is_date(date_type)):
+            raise ValueError(f"{file_path}: '{resolved[0]}' is {date_type}, expected a date.")
+        for name in resolved[1:]:
+            value_type = schema.field(name).type
+            if not (pa.types.is_integer(value_type) or pa.types.is_floating(value_type)):
+                raise ValueError(f"{file_path}: '{name}' is {value_type}, expected a number.")
+
+        return resolved
+
+    @staticmethod
+    def iter_wide(
+        file_path: str,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> Iterator[pa.RecordBatch]:
+        """Streams the non-null cells of a wide (dates x gvkeys) file.
+
+        Args:
+            file_path: parquet file, dates as index and one column per gvkey.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+            row_group: only read this row group, the whole file if None.
+
+        Yields:
+            (gvkey, date, value) batches, one per record batch and gvkey column.
+
+        Raises:
+            ValueError: if the file has no date index column.
+        """
+        schema = pq.read_schema(file_path, memory_map=True)
+        index = index_columns(schema)
+        if not index:
+            raise ValueError(f"{file_path} has no date index column.")
+        date_column = index[0]
+        filters = Source.date_filters(file_path, date_from, date_to)
+
+        table = read_table(file_path, None, filters, row_group)
+        for batch in table.to_batches():
+            dates = batch.column(date_column)
+            for name in batch.schema.names:
+                if name in index:
+                    continue
+                column = batch.column(name)
+                mask = non_null(column)
+                if pc.any(mask).as_py():
+                    yield cells(
+                        pa.repeat(name, pc.sum(mask).as_py()),
+                        dates.filter(mask),
+                        column.filter(mask),
+                    )
+        del table
 
     @staticmethod
-    def unflatten(df) -> List[Tuple]:
-        dictionary = df.to_dict()
-        records = []
-        i = 0
-        for gvkey in dictionary.keys():
-            if i % 1000 == 0:
-                logger.debug(f"{i}/{len(dictionary.keys())} gvkeys resolved.")
-            for date in dictionary[gvkey].keys():
-                records.append((gvkey, date, dictionary[gvkey][date]))
-            i += 1
-        return records
+    def iter_transposed(
+        file_path: str,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        row_group: Optional[int] = None,
+    ) -> Iterator[pa.RecordBatch]:
+        """Streams the non-null cells of a transposed (gvkeys x dates) file.
+
+        The file is read one row group at a time in its stored orientation,
+        so no transposed copy of the frame is ever built: each date column of
+        a row group yields the gvkeys and values of its non-null cells.
+
+        Args:
+            file_path: parquet file, gvkeys as index and one column per date.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+            row_group: only read this row group, all of them if None.
+
+        Yields:
+            (gvkey, date, value) batches, one per row group and date column.
+
+        Raises:
+            ValueError: if the file has no gvkey index column.
+        """
+        parquet = pq.ParquetFile(file_path, memory_map=True)
+        schema = parquet.schema_arrow
+        index = index_columns(schema)
+        if not index:
+            raise ValueError(f"{file_path} has no gvkey index column.")
+        gvkey_column = index[0]
+        date_columns = [
+            c
+            for c in schema.names
+            if c not in index and in_range(parse_date(c), date_from, date_to)
+        ]
+
+        row_groups = range(parquet.num_row_groups) if row_group is None else [row_group]
+        for i in row_groups:
+            logger.debug(f"{i}/{parquet.num_row_groups} row groups reshaped.")
+            table = parquet.read_row_group(i, columns=[gvkey_column] + date_columns)
+            gvkeys = table.column(gvkey_column).combine_chunks()
+            for name in date_columns:
+                column = table.column(name).combine_chunks()
+                mask = non_null(column)
+                if pc.any(mask).as_py():
+                    yield cells(
+                        gvkeys.filter(mask),
+                        pa.repeat(name, pc.sum(mask).as_py()),
+                        column.filter(mask),
+                    )
+            del table
+
+    @staticmethod
+    def date_filters(
+        file_path: str,
+        date_from: Optional[date],
+        date_to: Optional[date],
+    ) -> Optional[List[Tuple]]:
+        """Translates a date range into parquet row filters on a wide file.
+
+        Only the file footer is read. The transposed layout projects its date
+        columns in iter_transposed instead.
+
+        Args:
+            file_path: parquet file, dates as index.
+            date_from: first date to read, inclusive.
+            date_to: last date to read, inclusive.
+
+        Returns:
+            pyarrow filters, None to read all rows.
+        """
+        if date_from is None and date_to is None:
+            return None
+
+        schema = pq.read_schema(file_path)
+        index = index_columns(schema)
+        if not index:
+            logger.warning(f"No date column found in {file_path}, reading all dates.")
+            return None
+
+        date_column = index[0]
+        date_type = schema.field(date_column).type
+        filters = []
+        if date_from is not None:
+            filters.append((date_column, ">=", filter_value(date_type, date_from)))
+        if date_to is not None:
+            upper = date_to + timedelta(days=1)
+            filters.append((date_column, "<", filter_value(date_type, upper)))
+
+        return filters
+
+
+def read_table(
+    file_path: str,
+    columns: Optional[List[str]],
+    filters: Optional[List[Tuple]],
+    row_group: Optional[int] = None,
+) -> pa.Table:
+    """Reads a memory-mapped parquet file, or one of its row groups.
+
+    Args:
+        file_path: parquet file.
+        columns: columns to read, all if None.
+        filters: pyarrow row filters, None to read all rows.
+        row_group: only read this row group, the whole file if None.
+
+    Returns:
+        Table.
+    """
+    if row_group is None:
+        return pq.read_table(file_path, columns=columns, filters=filters, memory_map=True)
+    table = pq.ParquetFile(file_path, memory_map=True).read_row_group(
+        row_group, columns=columns, use_pandas_metadata=True
+    )
+    if filters:
+        table = table.filter(pq.filters_to_expression(filters))
+    return table
+
+
+def is_csv(file_path: str) -> bool:
+    """Whether a source file is a CSV file, plain or compressed."""
+    return file_path.lower().endswith(tuple(CSV_COMPRESSION))
+
+
+def csv_compression(file_path: str) -> Optional[str]:
+    """Compression codec of a CSV source file, None if it is plain."""
+    for suffix, compression in CSV_COMPRESSION.items():
+        if file_path.lower().endswith(suffix):
+            return compression
+    return None
+
+
+def read_csv_header(file_path: str) -> List[str]:
+    """Column names of a CSV file, decompressing only its first line."""
+    head = b""
+    with pa.input_stream(file_path, compression=csv_compression(file_path)) as stream:
+        while b"\n" not in head:
+            chunk = stream.read(64 * 1024)
+            if not chunk:
+                break
+            head += chunk
+    line = head.split(b"\n", 1)[0].decode("utf-8-sig").rstrip("\r")
+    return next(csv.reader([line]), [])
+
+
+def index_columns(schema: pa.Schema) -> List[str]:
+    """Names of the pandas index columns stored in a file."""
+    return [
+        c
+        for c in (schema.pandas_metadata or {}).get("index_columns", [])
+        if isinstance(c, str)
+    ]
+
+
+def non_null(column: pa.Array) -> pa.Array:
+    """Mask of the cells holding a value, i.e. neither null nor NaN."""
+    if pa.types.is_floating(column.type):
+        return pc.and_kleene(pc.is_valid(column), pc.invert(pc.is_nan(column)))
+    return pc.is_valid(column)
+
+
+def cells(gvkeys: pa.Array, dates: pa.Array, values: pa.Array) -> pa.RecordBatch:
+    """Builds a (gvkey, date, value) batch, numeric values as float64."""
+    if pa.types.is_integer(values.type) or pa.types.is_decimal(values.type):
+        values = values.cast(pa.float64())
+    return pa.RecordBatch.from_arrays([gvkeys, dates, values], names=["gvkey", "date", "value"])
+
+
+def long_table(batches: List[pa.RecordBatch]) -> pa.Table:
+    """Concatenates (gvkey, date, value) batches into a table of one chunk.
+
+    Wide files yield one small batch per record batch and gvkey column:
+    merged, the table is modeled in a few large batches instead.
+    """
+    if not batches:
+        return pa.table({"gvkey": pa.array([], pa.string()), "date": [], "value": []})
+    return pa.Table.from_batches(batches).combine_chunks()
+
+
+def parse_date(value: str) -> Optional[date]:
+    """Parses a 'YYYY-MM-DD...' string, returns None if it is not a date."""
+    try:
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def in_range(d: Optional[date], date_from: Optional[date], date_to: Optional[date]) -> bool:
+    """Checks a date against an inclusive range, unparseable dates are kept."""
+    if d is None:
+        return True
+    if date_from is not None and d < date_from:
+        return False
+    if date_to is not None and d > date_to:
+        return False
+    return True
+
+
+def filter_value(date_type: pa.DataType, d: date):
+    """Casts a date bound to the type of the column it is compared with."""
+    if pa.types.is_string(date_type) or pa.types.is_large_string(date_type):
+        return d.isoformat()
+    if pa.types.is_timestamp(date_type):
+        return datetime.combine(d, time())
+    return d
@@ -1,20 +1,50 @@
 """Target."""
 
-from typing import List, Tuple
+from datetime import date, timedelta
+import io
+from time import monotonic
+from typing import Iterator, List, Optional, Sequence, Tuple
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extensions
 from psycopg2.extras import execute_values
 
+from base_loader.maintenance import TableStats
+from base_loader.queries import BlocksQueries
+from base_loader.throttle import Throttle
+
+# Rows per statement sent by execute_values.
+PAGE_SIZE = 100
+
+
+class PieceReader:
+    """Minimal file over text pieces, so copy_expert streams them one by one."""
+
+    def __init__(self, pieces: Iterator[str]) -> None:
+        self._pieces = pieces
+
+    def read(self, size: int = -1) -> str:
+        """Returns the next piece, whatever the size asked, '' once done."""
+        return next(self._pieces, "")
+
 
 class Target:
     """Target class."""
 
-    def __init__(self, connection_string: str) -> None:
+    def __init__(self, connection_string: str, throttle: Optional[Throttle] = None) -> None:
         self._connection_string = connection_string
-        self._connection = psycopg2.connect(connection_string)
-        self._connection.autocommit = False
+        self._connection = self._connect(connection_string)
         self._tx_cursor = None
+        self.throttle = throttle
+        # Bytes per upserted row, measured on the last batch sent.
+        self._row_bytes = 100.0
+
+    @staticmethod
+    def _connect(connection_string: str):
+        connection = psycopg2.connect(connection_string)
+        connection.autocommit = False
+        return connection
 
     @property
     def cursor(self) -> psycopg2.extensions.cursor:
@@ -34,6 +64,10 @@ class Target:
         """Commits a transaction."""
         self._connection.commit()
 
+    def rollback_transaction(self) -> None:
+        """Rolls back the current transaction."""
+        self._connection.rollback()
+
     def disconnect(self) -> None:
         """Disconnect from database."""
         self._connection.close()
@@ -56,11 +90,300 @@ class Target:
 
         return keys if keys else None
 
+    def fetch_all(self, query: str, params: Tuple = ()) -> List[Tuple]:
+        """Runs a parameterized query and fetches every row."""
+        cursor = self.cursor
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
     def execute_query(self, query: str) -> None:
         """Executes query without variables."""
         cursor = self.cursor
         cursor.execute(query)
 
+    def upsert(
+        self, query: str, records: List[Tuple], template: Optional[str] = None
+    ) -> Tuple[int, int, int]:
+        """Upserts a batch of records and counts what happened to them.
+
+        The query must return one boolean 'inserted' per written row, e.g.
+        'RETURNING (xmax = 0)'; rows skipped by the conflict guard return none.
+
+        Args:
+            query: upsert (or update) query to execute.
+            records: records to persist.
+            template: VALUES row template, psycopg2's default if None.
+
+        Returns:
+            Number of inserted, updated and unchanged records.
+        """
+        cursor = self.cursor
+        rows = []
+        for first in range(0, len(records), PAGE_SIZE):
+            page = records[first : first + PAGE_SIZE]  # noqa
+            if self.throttle is not None:
+                self.throttle.wait(len(page), int(len(page) * self._row_bytes))
+            start = monotonic()
+            rows.extend(
+                execute_values(
+                    cur=cursor,
+                    sql=query,
+                    argslist=page,
+                    template=template,
+                    page_size=PAGE_SIZE,
+                    fetch=True,
+                )
+            )
+            if self.throttle is not None:
+                self._row_bytes = len(cursor.query) / len(page)
+                self._observe(monotonic() - start)
+        inserted = sum(1 for r in rows if r[0])
+        updated = len(rows) - inserted
+
+        return inserted, updated, len(records) - len(rows)
+
+    def copy(self, table: str, columns: Sequence[str], records: List[Tuple]) -> bool:
+        """Inserts records with COPY, inside a savepoint.
+
+        The data is streamed in pieces of PAGE_SIZE records, each sent once
+        the throttle allows it.
+
+        Args:
+            table: table to insert into.
+            columns: columns of the records.
+            records: records of numbers and timestamps, which need no escaping.
+
+        Returns:
+            False, with nothing inserted, if a key already existed.
+        """
+        cursor = self.cursor
+        cursor.execute("SAVEPOINT copy_insert;")
+        query = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        if not self._copy_from(cursor, query, self._copy_pieces(records)):
+            cursor.execute("ROLLBACK TO SAVEPOINT copy_insert;")
+            return False
+        cursor.execute("RELEASE SAVEPOINT copy_insert;")
+        if self.throttle is not None:
+            self._observe()
+        return True
+
+    def _copy_pieces(self, records: List[Tuple]) -> Iterator[str]:
+        """COPY text of records, PAGE_SIZE records per piece.
+
+        A piece is only requested once the previous one was sent, so the time
+        in between feeds the throttle like a statement latency.
+        """
+        for first in range(0, len(records), PAGE_SIZE):
+            page = records[first : first + PAGE_SIZE]  # noqa
+            text = "".join(
+                "\t".join("\\N" if v is None else str(v) for v in record) + "\n"
+                for record in page
+            )
+            if self.throttle is not None:
+                self.throttle.wait(len(page), len(text))
+            start = monotonic()
+            yield text
+            if self.throttle is not None:
+                # Replication lag cannot be queried in the middle of a COPY.
+                self.throttle.observe(monotonic() - start)
+
+    def fetch_replication_lag(self) -> float:
+        """Fetches the replay lag of the slowest replica, in seconds."""
+        cursor = self.cursor
+        cursor.execute(
+            "SELECT COALESCE(EXTRACT(EPOCH FROM MAX(replay_lag)), 0) FROM pg_stat_replication;"
+        )
+        return float(cursor.fetchone()[0])
+
+    def _observe(self, latency: Optional[float] = None) -> None:
+        lag = self.fetch_replication_lag() if self.throttle.lag_due() else None
+        self.throttle.observe(latency, lag)
+
+    def copy_keys(
+        self,
+        table: str,
+        epoch: date,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> bytes:
+        """Copies a table's keys out, packed as (gvkey << 32) | days since epoch.
+
+        Args:
+            table: table to read.
+            epoch: day zero of the packed dates.
+            date_from: first date, inclusive, no lower bound if None.
+            date_to: last date, inclusive, no upper bound if None.
+
+        Returns:
+            Binary COPY stream of one bigint column, the packed keys.
+        """
+        cursor = self.cursor
+        conditions = ["TRUE"]
+        if date_from is not None:
+            conditions.append(self._mogrify(cursor, "datadate >= %s", (date_from,)))
+        if date_to is not None:
+            upper = date_to + timedelta(days=1)
+            conditions.append(self._mogrify(cursor, "datadate < %s", (upper,)))
+        query = self._mogrify(
+            cursor,
+            "COPY (SELECT (gvkey::bigint << 32) | (datadate::date - %s) "
+            f"FROM {table} WHERE {' AND '.join(conditions)}) TO STDOUT (FORMAT binary)",
+            (epoch,),
+        )
+        return self._copy_to_binary(cursor, query)
+
+    def copy_values(
+        self, table: str, column: str, epoch: date, dates: Sequence[date]
+    ) -> str:
+        """Copies a column's non-null values out for some dates.
+
+        Args:
+            table: table to read.
+            column: numeric column to read, as float8.
+            epoch: day zero of the copied dates.
+            dates: dates to read.
+
+        Returns:
+            Newline separated 'days since epoch<TAB>value' rows.
+        """
+        cursor = self.cursor
+        query = self._mogrify(
+            cursor,
+            f"COPY (SELECT datadate::date - %s, {column}::float8 FROM {table} "
+            f"WHERE datadate = ANY(%s::timestamp[]) AND {column} IS NOT NULL) TO STDOUT",
+            (epoch, list(dates)),
+        )
+        return self._copy_to(cursor, query)
+
+    @staticmethod
+    def _mogrify(cursor, query: str, params: Tuple) -> str:
+        return cursor.mogrify(query, params).decode()
+
+    @staticmethod
+    def _copy_to(cursor, query: str) -> str:
+        buffer = io.StringIO()
+        cursor.copy_expert(query, buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _copy_to_binary(cursor, query: str) -> bytes:
+        buffer = io.BytesIO()
+        cursor.copy_expert(query, buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _copy_from(cursor, query: str, pieces: Iterator[str]) -> bool:
+        """Runs a COPY ... FROM STDIN, False if a key already existed."""
+        try:
+            cursor.copy_expert(query, PieceReader(pieces))
+        except psycopg2.errors.UniqueViolation:
+            return False
+        return True
+
+    def fetch_block_hashes(
+        self, table: str, entity: str, gvkeys: List[int], month_from: date, month_to: date
+    ) -> List[Tuple]:
+        """Fetches stored block hashes of an entity.
+
+        Args:
+            table: table the blocks were written to.
+            entity: entity the blocks belong to.
+            gvkeys: gvkeys to fetch.
+            month_from: first month, inclusive.
+            month_to: last month, inclusive.
+
+        Returns:
+            (gvkey, month, hash, rows) tuples.
+        """
+        cursor = self.cursor
+        cursor.execute(BlocksQueries.FETCH, (table, entity, gvkeys, month_from, month_to))
+        return cursor.fetchall()
+
+    def table_exists(self, table: str) -> bool:
+        """Checks whether a table exists."""
+        cursor = self.cursor
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+        return cursor.fetchone()[0]
+
+    def fetch_table_stats(self, table: str) -> Optional[TableStats]:
+        """Fetches a table's tuple counts and size.
+
+        Args:
+            table: table to measure.
+
+        Returns:
+            Table statistics, None if the table does not exist or has no
+            statistics yet.
+        """
+        cursor = self.cursor
+        cursor.execute(
+            "SELECT n_live_tup, n_dead_tup, n_mod_since_analyze, "
+            "pg_total_relation_size(relid) "
+            "FROM pg_stat_user_tables WHERE relname = %s;",
+            (table,),
+        )
+        row = cursor.fetchone()
+        self._connection.commit()
+        return TableStats(table, *row) if row is not None else None
+
+    def vacuum(self, table: str) -> None:
+        """Runs VACUUM (ANALYZE) on a table, outside of a transaction.
+
+        Args:
+            table: table to vacuum.
+        """
+        self._connection.commit()
+        self._connection.autocommit = True
+        try:
+            self._connection.cursor().execute(f"VACUUM (ANALYZE) {table};")
+        finally:
+            self._connection.autocommit = False
+
+    def fetch_date_bounds(self, table: str) -> Tuple[Optional[date], Optional[date]]:
+        """Fetches the first and last dates of a table, None if it is empty.
+
+        Two index lookups with the table's datadate index, see db/daily_base.sql.
+        """
+        cursor = self.cursor
+        cursor.execute(f"SELECT MIN(datadate), MAX(datadate) FROM {table};")
+        return cursor.fetchone()
+
+    def delete_dates(self, table: str, start: date, end: date) -> int:
+        """Deletes the rows of a table in [start, end), without committing.
+
+        Returns:
+            Deleted rows.
+        """
+        cursor = self.cursor
+        cursor.execute(f"DELETE FROM {table} WHERE datadate >= %s AND datadate < %s;", (start, end))
+        return cursor.rowcount
+
+    def fetch_dates(
+        self, table: str, date_from: Optional[date] = None, date_to: Optional[date] = None
+    ) -> List[date]:
+        """Fetches the distinct dates of a table.
+
+        Args:
+            table: table to read.
+            date_from: first date, inclusive, no lower bound if None.
+            date_to: last date, inclusive, no upper bound if None.
+
+        Returns:
+            Sorted dates.
+        """
+        cursor = self.cursor
+        conditions = ["TRUE"]
+        if date_from is not None:
+            conditions.append(self._mogrify(cursor, "datadate >= %s", (date_from,)))
+        if date_to is not None:
+            upper = date_to + timedelta(days=1)
+            conditions.append(self._mogrify(cursor, "datadate < %s", (upper,)))
+        cursor.execute(
+            f"SELECT DISTINCT datadate FROM {table} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY datadate;"
+        )
+        return [r[0] for r in cursor.fetchall()]
+
     def execute(self, query: str, records: List[Tuple]) -> None:
         """Execute batch of records into database.
 
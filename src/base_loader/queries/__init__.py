@@ -1,10 +1,21 @@
 """Init for file loader Queries."""
 
-from .astec import Queries as AstecQueries
+from .blocks import Queries as BlocksQueries
+from .builder import entity_queries
 from .cleanup import Queries as CleanupQueries
-from .market_cap import Queries as MarketCapQueries
-from .returns import Queries as ReturnsQueries
-from .shares_out import Queries as SharesOutQueries
-from .volume import Queries as VolumeQueries
+from .ddl import table_ddl
+from .features import Queries as FeaturesQueries
+from .jobs import Queries as JobsQueries
+from .reconcile import reconcile_totals
+from .winsorize import Queries as WinsorizeQueries
 
-__all__ = ["AstecQueries", "CleanupQueries", "MarketCapQueries", "ReturnsQueries", "SharesOutQueries"]
+__all__ = [
+    "BlocksQueries",
+    "CleanupQueries",
+    "entity_queries",
+    "FeaturesQueries",
+    "JobsQueries",
+    "reconcile_totals",
+    "table_ddl",
+    "WinsorizeQueries",
+]
@@ -1,10 +1,15 @@
 """Queries Base."""
 
+from typing import Tuple
+
 
 class BaseQueries:
     """Base queries class."""
 
+    COLUMNS: Tuple[str, ...]
     UPSERT: str
+    UPDATE: str
+    TEMPLATE: str
 
     # IF EVENT LOGS ARE IMPLEMENTED ADD:
     # LOAD_STATE AND APPEND_LOG
@@ -0,0 +1,18 @@
+"""Block hash queries, over the block_hashes table of db/block_hashes.sql."""
+
+
+class Queries:
+    """Block hash queries class."""
+
+    FETCH = (
+        "SELECT gvkey, month, hash, rows "
+        "FROM block_hashes "
+        "WHERE target_table = %s AND entity = %s AND gvkey = ANY(%s) "
+        "AND month BETWEEN %s AND %s;"
+    )
+
+    UPSERT = (
+        "INSERT INTO block_hashes (target_table, entity, gvkey, month, hash, rows) VALUES %s "
+        "ON CONFLICT (target_table, entity, gvkey, month) DO "
+        "UPDATE SET hash=EXCLUDED.hash, rows=EXCLUDED.rows;"
+    )
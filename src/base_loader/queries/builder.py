@@ -0,0 +1,98 @@
+"""Query builder over the target table schema."""
+
+from functools import lru_cache
+from typing import Sequence, Tuple, Type
+
+from base_loader.schema import columns as schema_columns, KEY_COLUMNS
+
+from .base import BaseQueries
+
+
+def upsert(columns: Sequence[str]) -> str:
+    """Builds the upsert of an entity's columns into '{tbl}'.
+
+    Only the key and the given columns are sent. On conflict, the columns are
+    updated only if one of them changed, and every written row returns whether
+    it was inserted.
+
+    Args:
+        columns: columns the entity owns, excluding the key.
+
+    Returns:
+        Upsert query, with a '{tbl}' placeholder for the table name.
+    """
+    names = ", ".join(KEY_COLUMNS + tuple(columns))
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in columns)
+    current = ", ".join(f"{{tbl}}.{c}" for c in columns)
+    excluded = ", ".join(f"EXCLUDED.{c}" for c in columns)
+
+    return (
+        f"INSERT INTO {{tbl}} ({names}) VALUES %s "
+        f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO "
+        f"UPDATE SET {updates} "
+        f"WHERE ({current}) IS DISTINCT FROM ({excluded}) "
+        "RETURNING (xmax = 0) AS inserted;"
+    )
+
+
+def update(columns: Sequence[str]) -> str:
+    """Builds the bulk update of an entity's columns in '{tbl}'.
+
+    Rows are matched on the key and only rewritten if one of the columns
+    changed. Every written row returns 'inserted' false, like upsert() does
+    for conflicting rows, so both paths are counted the same way.
+
+    Args:
+        columns: columns the entity owns, excluding the key.
+
+    Returns:
+        Update query, with a '{tbl}' placeholder for the table name.
+    """
+    names = ", ".join(KEY_COLUMNS + tuple(columns))
+    updates = ", ".join(f"{c}=v.{c}" for c in columns)
+    key = " AND ".join(f"t.{c} = v.{c}" for c in KEY_COLUMNS)
+    current = ", ".join(f"t.{c}" for c in columns)
+    incoming = ", ".join(f"v.{c}" for c in columns)
+
+    return (
+        f"UPDATE {{tbl}} AS t SET {updates} "
+        f"FROM (VALUES %s) AS v ({names}) "
+        f"WHERE {key} AND ({current}) IS DISTINCT FROM ({incoming}) "
+        "RETURNING false AS inserted;"
+    )
+
+
+def template(columns: Sequence[str]) -> str:
+    """Builds a VALUES row template casting the key and columns to their types.
+
+    VALUES lists are not typed by a target table, so columns that are NULL in
+    every row would otherwise be resolved as text.
+
+    Args:
+        columns: columns the entity owns, excluding the key.
+
+    Returns:
+        Template for psycopg2's execute_values.
+    """
+    casts = ", ".join(f"%s::{c.sql_type}" for c in schema_columns(KEY_COLUMNS + tuple(columns)))
+    return f"({casts})"
+
+
+@lru_cache(maxsize=None)
+def entity_queries(columns: Tuple[str, ...]) -> Type[BaseQueries]:
+    """Builds the queries class of an entity owning the given columns.
+
+    Args:
+        columns: columns the entity owns, excluding the key.
+
+    Returns:
+        Queries class with COLUMNS, UPSERT, UPDATE and TEMPLATE.
+    """
+
+    class Queries(BaseQueries):
+        COLUMNS = columns
+        UPSERT = upsert(columns)
+        UPDATE = update(columns)
+        TEMPLATE = template(columns)
+
+    return Queries
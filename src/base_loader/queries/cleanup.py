@@ -4,20 +4,16 @@
 class Queries:
     """Cleanup queries class."""
     # CHANGE VOLUME CONSTRAINTS BELOW IF NEEDED
-    CLEAN_MKTCAP_VOL_RTN = (
-        "DELETE "
-        "FROM daily_base "
-        "WHERE market_cap < 100 "
+    INVALID_MKTCAP_VOL_RTN = (
+        "(market_cap < 100 "
         "OR volume < 1000000 "
         "OR market_cap IS NULL "
         "OR volume IS NULL "
-        "OR rtn IS NULL;"
+        "OR rtn IS NULL)"
     )
 
-    CLEAN_ASTEC = (
-        "DELETE "
-        "FROM daily_base "
-        "WHERE utilization_pct IS NULL "
+    INVALID_ASTEC = (
+        "(utilization_pct IS NULL "
         "AND bar IS NULL "
         "AND age IS NULL "
         "AND tickets IS NULL "
@@ -27,7 +23,41 @@ class Queries:
         "AND loan_rate_max IS NULL "
         "AND loan_rate_min IS NULL "
         "AND loan_rate_range IS NULL "
-        "AND loan_rate_stdev IS NULL;"
+        "AND loan_rate_stdev IS NULL)"
+    )
+
+    CLEAN_MKTCAP_VOL_RTN = f"DELETE FROM daily_base WHERE {INVALID_MKTCAP_VOL_RTN};"
+    CLEAN_ASTEC = f"DELETE FROM daily_base WHERE {INVALID_ASTEC};"
+
+    # Same deletes over a [start, end) datadate range.
+    CLEAN_MKTCAP_VOL_RTN_CHUNK = (
+        "DELETE FROM daily_base "
+        f"WHERE datadate >= %s AND datadate < %s AND {INVALID_MKTCAP_VOL_RTN};"
+    )
+    CLEAN_ASTEC_CHUNK = (
+        "DELETE FROM daily_base "
+        f"WHERE datadate >= %s AND datadate < %s AND {INVALID_ASTEC};"
+    )
+
+    # Chunk deletes that also drop the block hashes of the (gvkey, month)
+    # blocks they delete from, so change detection writes those blocks again.
+    CLEAN_MKTCAP_VOL_RTN_CHUNK_BLOCKS = (
+        "WITH deleted AS (DELETE FROM daily_base "
+        f"WHERE datadate >= %s AND datadate < %s AND {INVALID_MKTCAP_VOL_RTN} "
+        "RETURNING gvkey, datadate), "
+        "invalidated AS (DELETE FROM block_hashes h USING deleted d "
+        "WHERE h.target_table = 'daily_base' AND h.gvkey = d.gvkey "
+        "AND h.month = date_trunc('month', d.datadate)::date) "
+        "SELECT COUNT(*) FROM deleted;"
+    )
+    CLEAN_ASTEC_CHUNK_BLOCKS = (
+        "WITH deleted AS (DELETE FROM daily_base "
+        f"WHERE datadate >= %s AND datadate < %s AND {INVALID_ASTEC} "
+        "RETURNING gvkey, datadate), "
+        "invalidated AS (DELETE FROM block_hashes h USING deleted d "
+        "WHERE h.target_table = 'daily_base' AND h.gvkey = d.gvkey "
+        "AND h.month = date_trunc('month', d.datadate)::date) "
+        "SELECT COUNT(*) FROM deleted;"
     )
 
     CLEAN_GVKEYS = (
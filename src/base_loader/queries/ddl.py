@@ -0,0 +1,8 @@
+"""DDL of the tables the loader creates itself, read from the package's db/*.sql."""
+
+from importlib import resources
+
+
+def table_ddl(table: str) -> str:
+    """Reads the idempotent CREATE statements of a table from db/<table>.sql."""
+    return resources.files("base_loader").joinpath("db", f"{table}.sql").read_text()
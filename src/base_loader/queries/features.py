@@ -0,0 +1,8 @@
+"""Feature queries, over the daily_features table of db/daily_features.sql."""
+
+
+class Queries:
+    """Feature queries class."""
+
+    # Columns of features other than the default ones of db/daily_features.sql.
+    ADD_COLUMN = "ALTER TABLE daily_features ADD COLUMN IF NOT EXISTS {column} DOUBLE PRECISION;"
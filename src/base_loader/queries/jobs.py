@@ -0,0 +1,53 @@
+"""Work queue queries, over the load_jobs table of db/load_jobs.sql."""
+
+
+class Queries:
+    """Work queue queries class."""
+
+    ENQUEUE = (
+        "INSERT INTO load_jobs (entity, file_name, row_group, target_table) VALUES %s "
+        "ON CONFLICT (target_table, entity, file_name, row_group) DO NOTHING "
+        "RETURNING job_id;"
+    )
+
+    # Gives up on units whose last allowed attempt died with its worker.
+    EXPIRE = (
+        "UPDATE load_jobs "
+        "SET status = 'failed', error = 'lease expired', updated_at = now() "
+        "WHERE status = 'running' AND leased_until < now() AND attempts >= %(max_attempts)s;"
+    )
+
+    CLAIM = (
+        "UPDATE load_jobs "
+        "SET status = 'running', worker = %(worker)s, attempts = attempts + 1, "
+        "leased_until = now() + %(lease)s * INTERVAL '1 second', updated_at = now() "
+        "WHERE job_id = ("
+        "SELECT job_id FROM load_jobs "
+        "WHERE (status = 'pending' OR (status = 'running' AND leased_until < now())) "
+        "AND attempts < %(max_attempts)s "
+        "ORDER BY job_id "
+        "FOR UPDATE SKIP LOCKED "
+        "LIMIT 1) "
+        "RETURNING job_id, entity, file_name, row_group, target_table;"
+    )
+
+    HEARTBEAT = (
+        "UPDATE load_jobs "
+        "SET leased_until = now() + %(lease)s * INTERVAL '1 second', updated_at = now() "
+        "WHERE job_id = %(job_id)s AND worker = %(worker)s AND status = 'running';"
+    )
+
+    COMPLETE = (
+        "UPDATE load_jobs "
+        "SET status = 'done', leased_until = NULL, error = NULL, updated_at = now() "
+        "WHERE job_id = %(job_id)s AND worker = %(worker)s;"
+    )
+
+    FAIL = (
+        "UPDATE load_jobs "
+        "SET status = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END, "
+        "error = %(error)s, leased_until = NULL, updated_at = now() "
+        "WHERE job_id = %(job_id)s AND worker = %(worker)s;"
+    )
+
+    STATUS = "SELECT status, COUNT(*) FROM load_jobs GROUP BY status ORDER BY status;"
@@ -0,0 +1,40 @@
+"""Reconciliation queries, aggregating a target table by (entity, month) blocks."""
+
+from typing import Dict, Sequence
+
+# Hash of a row's (gvkey, datadate) key, as reconcile.key_hashes computes it:
+# the key packed into a bigint, then two multiplicative rounds modulo 2**31 - 1,
+# small enough for bigint arithmetic never to overflow.
+KEY = "(gvkey::bigint * 100000 + (datadate::date - DATE '1900-01-01'))"
+KEY_HASH = (
+    f"mod(mod(mod({KEY}, 2147483647) * 48271, 2147483647) * 16807 + {KEY} / 2147483647, "
+    "2147483647)"
+)
+
+
+def reconcile_totals(entity_columns: Dict[str, Sequence[str]]) -> str:
+    """Builds the single pass over '{tbl}' aggregating each entity by month.
+
+    A row belongs to an entity when one of the entity's columns is not NULL.
+    For each entity, the query returns the rows, the sum of their key hashes
+    and the sum of each column, all computed in the same GROUP BY.
+
+    Args:
+        entity_columns: columns of each entity, in output order.
+
+    Returns:
+        Query with a '{tbl}' placeholder and two datadate bounds, the first
+        inclusive and the second exclusive, returning the month first.
+    """
+    selects = []
+    for columns in entity_columns.values():
+        present = " OR ".join(f"{c} IS NOT NULL" for c in columns)
+        selects.append(f"COUNT(*) FILTER (WHERE {present})")
+        selects.append(f"COALESCE(SUM({KEY_HASH}) FILTER (WHERE {present}), 0)")
+        selects.extend(f"COALESCE(SUM({c}), 0)" for c in columns)
+
+    return (
+        f"SELECT date_trunc('month', datadate)::date AS month, {', '.join(selects)} "
+        "FROM {tbl} WHERE datadate >= %s AND datadate < %s "
+        "GROUP BY 1 ORDER BY 1;"
+    )
@@ -0,0 +1,17 @@
+"""Winsorize queries."""
+
+
+class Queries:
+    """Winsorize queries class."""
+
+    # Clips rtn to per-date bounds: (datadate, lower_bound, upper_bound) rows.
+    UPDATE = (
+        "UPDATE daily_base AS t "
+        "SET winsorized_5_rtn = LEAST(GREATEST(t.rtn, v.lower_bound), v.upper_bound) "
+        "FROM (VALUES %s) AS v (datadate, lower_bound, upper_bound) "
+        "WHERE t.datadate = v.datadate AND t.rtn IS NOT NULL "
+        "AND t.winsorized_5_rtn IS DISTINCT FROM "
+        "LEAST(GREATEST(t.rtn, v.lower_bound), v.upper_bound) "
+        "RETURNING false AS inserted;"
+    )
+    TEMPLATE = "(%s::TIMESTAMP, %s::DECIMAL(25,15), %s::DECIMAL(25,15))"
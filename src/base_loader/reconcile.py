@@ -0,0 +1,382 @@
+"""Reconciliation of source files against a loaded table, by (entity, month) blocks."""
+
+from datetime import date, timedelta
+import logging
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from base_loader.dedup import DuplicatePolicy
+from base_loader.key_index import encode, EPOCH, EPOCH_OFFSET
+import base_loader.queries as queries
+from base_loader.registry import EntitySpec
+from base_loader.schema import columns as schema_columns
+from base_loader.transform import model_arrays, US_PER_DAY
+
+logger = logging.getLogger(__name__)
+
+# Modulus and multipliers of queries.reconcile.KEY_HASH.
+HASH_MODULUS = 2_147_483_647
+# Days are packed below gvkeys in KEY_HASH's key.
+KEY_DAYS = 100_000
+# Relative tolerance of source sums, accumulated in extended precision from
+# float64 values, against the database's exact ones.
+SUM_TOLERANCE = 1e-12
+
+
+def key_hashes(gvkeys: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Hashes of (gvkey, days since 1970-01-01) keys, like KEY_HASH in SQL."""
+    keys = gvkeys.astype(np.int64) * KEY_DAYS + days.astype(np.int64) + EPOCH_OFFSET
+    x = keys % HASH_MODULUS * 48271 % HASH_MODULUS
+    return (x * 16807 + keys // HASH_MODULUS) % HASH_MODULUS
+
+
+def month_start(month: int) -> date:
+    """First day of a month counted since 1970-01."""
+    return date(1970 + month // 12, month % 12 + 1, 1)
+
+
+def rounding_unit(column: str) -> float:
+    """Smallest step of a target column: values are rounded to it when stored."""
+    match = re.fullmatch(r"DECIMAL\(\d+,(\d+)\)", schema_columns([column])[0].sql_type)
+    return 10.0 ** -int(match.group(1)) if match else 0.0
+
+
+class Block(NamedTuple):
+    """Aggregates of an entity's rows in a month."""
+
+    rows: int
+    key_hash: int
+    # Sum of each entity column.
+    sums: Tuple[float, ...]
+
+
+class Mismatch(NamedTuple):
+    """(entity, month) block whose source and target aggregates differ."""
+
+    entity: str
+    month: date
+    source_rows: int
+    target_rows: int
+    # Keys only in the source, only in the table, and in both with other values.
+    missing: int
+    extra: int
+    different: int
+    examples: Tuple[str, ...]
+
+
+class Reconciler:
+    """Checks that modeled source records match the rows of a loaded table.
+
+    Files are modeled into arrays with model_arrays, so no Python object is
+    built per record, deduplicated by the duplicate policy and aggregated by
+    month as they are added: rows, the sum of their key hashes and the sum of
+    each column. Only the aggregates are kept, so memory does not grow with
+    the history reconciled. The table is aggregated the same way by a single
+    GROUP BY over the compared months. Only the blocks whose aggregates differ
+    are compared key by key: their files are read again for that month, the
+    last file winning like in a load, and so are their rows in the table. A
+    block whose files overlap has inflated aggregates, and is settled there.
+
+    Rows cleanup deleted and records validation quarantined show up as
+    missing, so daily_base is best reconciled before cleanup.
+    """
+
+    def __init__(
+        self,
+        target,
+        reader,
+        read_file: Callable[[EntitySpec, str, Optional[date], Optional[date]], pa.Table],
+        true_base: bool = False,
+        policy: DuplicatePolicy = DuplicatePolicy.LAST,
+        examples: int = 5,
+    ) -> None:
+        self.target = target
+        self.reader = reader
+        self.read_file = read_file
+        self.true_base = true_base
+        self.table = "true_base" if true_base else "daily_base"
+        self.policy = DuplicatePolicy(policy)
+        self.examples = examples
+        self._specs: Dict[str, EntitySpec] = {}
+        # Source aggregates of each entity by month: block, absolute sums
+        # bounding float errors, and the files with records in the month.
+        self._blocks: Dict[str, Dict[int, Tuple[Block, Tuple[float, ...], List[str]]]] = {}
+
+    def add(self, spec: EntitySpec, file: str, table: pa.Table) -> None:
+        """Models and aggregates the table read from one source file of an entity.
+
+        Args:
+            spec: entity spec.
+            file: file the table was read from, read again by 'read_file' if
+                one of its months mismatches.
+            table: table read from the file.
+        """
+        self._specs[spec.name] = spec
+        blocks = self._blocks.setdefault(spec.name, {})
+        micros, gvkeys, values = self._model(spec, table)
+        del table
+        months = to_months(micros)
+        for month, (block, magnitudes) in self._aggregate(
+            spec, months, micros, gvkeys, values
+        ).items():
+            if month not in blocks:
+                blocks[month] = (block, magnitudes, [file])
+                continue
+            total, total_magnitudes, files = blocks[month]
+            blocks[month] = (
+                Block(
+                    total.rows + block.rows,
+                    total.key_hash + block.key_hash,
+                    tuple(a + b for a, b in zip(total.sums, block.sums)),
+                ),
+                tuple(a + b for a, b in zip(total_magnitudes, magnitudes)),
+                files + [file],
+            )
+
+    def _model(
+        self, spec: EntitySpec, table: pa.Table
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Models a file's table, deduplicated by the duplicate policy."""
+        parts = [model_arrays(spec, b, self.true_base) for b in table.to_batches(1_000_000)]
+        if not parts:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, {c: np.array([], dtype=np.float64) for c in spec.columns}
+        micros = np.concatenate([p[0] for p in parts])
+        gvkeys = np.concatenate([p[1] for p in parts])
+        values = {c: np.concatenate([p[2][c] for p in parts]) for c in spec.columns}
+        keep = survivors(micros, gvkeys, self.policy == DuplicatePolicy.LAST)
+        return micros[keep], gvkeys[keep], {c: v[keep] for c, v in values.items()}
+
+    def compare(
+        self, first_month: Optional[int] = None, last_month: Optional[int] = None
+    ) -> List[Mismatch]:
+        """Compares the added files with the table, over whole months.
+
+        Args:
+            first_month: first month to compare, counted since 1970-01, the
+                first month with source records if None.
+            last_month: last month to compare, the last month with source
+                records if None.
+
+        Returns:
+            Mismatching blocks, by entity and month.
+        """
+        known = [m for blocks in self._blocks.values() for m in blocks]
+        if first_month is None:
+            first_month = min(known, default=None)
+        if last_month is None:
+            last_month = max(known, default=None)
+        if first_month is None or last_month is None:
+            logger.info("No source records to reconcile.")
+            return []
+
+        source = {
+            name: {m: b for m, b in blocks.items() if first_month <= m <= last_month}
+            for name, blocks in self._blocks.items()
+        }
+        target = self._fetch_blocks(first_month, last_month)
+
+        mismatches = []
+        compared = 0
+        for name, spec in self._specs.items():
+            empty = Block(0, 0, (0.0,) * len(spec.columns))
+            blocks = sorted(set(source[name]) | set(target[name]))
+            compared += len(blocks)
+            for month in blocks:
+                expected = source[name].get(month, (empty, empty.sums, []))
+                found = target[name].get(month, empty)
+                if self._matches(spec, expected[:2], found):
+                    continue
+                mismatch = self._drill_down(spec, month, expected[2], found)
+                if not (mismatch.missing or mismatch.extra or mismatch.different):
+                    # Only overlapping files, whose shared keys were counted twice.
+                    continue
+                mismatches.append(mismatch)
+                logger.warning(
+                    f"{name} {mismatch.month:%Y-%m}: {mismatch.source_rows} source rows, "
+                    f"{mismatch.target_rows} in {self.table}; {mismatch.missing} missing, "
+                    f"{mismatch.extra} extra, {mismatch.different} different"
+                    + (f" (e.g. {', '.join(mismatch.examples)})." if mismatch.examples else ".")
+                )
+
+        logger.info(
+            f"{compared} (entity, month) blocks of {self.table} compared, "
+            f"{len(mismatches)} mismatching."
+        )
+        return mismatches
+
+    def _month_records(
+        self, spec: EntitySpec, month: int, files: List[str]
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """The records of a month, read again from its files, later files winning."""
+        # Dates move by a business day at most, across month ends too.
+        read_from = month_start(month) - timedelta(days=4)
+        read_to = month_start(month + 1) + timedelta(days=3)
+        parts = []
+        for file in files:
+            micros, gvkeys, values = self._model(
+                spec, self.read_file(spec, file, read_from, read_to)
+            )
+            inside = to_months(micros) == month
+            parts.append(
+                (micros[inside], gvkeys[inside], {c: v[inside] for c, v in values.items()})
+            )
+        if not parts:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, {c: np.array([], dtype=np.float64) for c in spec.columns}
+        micros = np.concatenate([p[0] for p in parts])
+        gvkeys = np.concatenate([p[1] for p in parts])
+        keep = survivors(micros, gvkeys, last=True)
+        return (
+            micros[keep],
+            gvkeys[keep],
+            {c: np.concatenate([p[2][c] for p in parts])[keep] for c in spec.columns},
+        )
+
+    @staticmethod
+    def _aggregate(
+        spec: EntitySpec,
+        months: np.ndarray,
+        micros: np.ndarray,
+        gvkeys: np.ndarray,
+        values: Dict[str, np.ndarray],
+    ) -> Dict[int, Tuple[Block, Tuple[float, ...]]]:
+        """Aggregates records by month, with the absolute sums bounding float errors."""
+        if not len(months):
+            return {}
+        order = np.argsort(months, kind="stable")
+        unique, starts, rows = np.unique(months[order], return_index=True, return_counts=True)
+        hashes = np.add.reduceat(key_hashes(gvkeys, micros // US_PER_DAY)[order], starts)
+        sums, magnitudes = [], []
+        for column in spec.columns:
+            v = values[column][order]
+            v = np.where(np.isnan(v), 0.0, v).astype(np.longdouble)
+            sums.append(np.add.reduceat(v, starts).astype(np.float64).tolist())
+            magnitudes.append(np.add.reduceat(np.abs(v), starts).astype(np.float64).tolist())
+        return {
+            month: (Block(n, h, tuple(s[i] for s in sums)), tuple(m[i] for m in magnitudes))
+            for i, (month, n, h) in enumerate(zip(unique.tolist(), rows.tolist(), hashes.tolist()))
+        }
+
+    def _fetch_blocks(self, first_month: int, last_month: int) -> Dict[str, Dict[int, Block]]:
+        """Aggregates every entity of the table by month in one query."""
+        entity_columns = {name: spec.columns for name, spec in self._specs.items()}
+        query = queries.reconcile_totals(entity_columns).format(tbl=self.table)
+        rows = self.target.fetch_all(
+            query, (month_start(first_month), month_start(last_month + 1))
+        )
+        self.target.commit_transaction()
+
+        blocks: Dict[str, Dict[int, Block]] = {name: {} for name in entity_columns}
+        for row in rows:
+            month = (row[0].year - 1970) * 12 + row[0].month - 1
+            i = 1
+            for name, columns in entity_columns.items():
+                n, h = int(row[i]), int(row[i + 1])
+                sums = tuple(float(s) for s in row[i + 2 : i + 2 + len(columns)])  # noqa
+                i += 2 + len(columns)
+                if n:
+                    blocks[name][month] = Block(n, h, sums)
+        return blocks
+
+    @staticmethod
+    def _matches(
+        spec: EntitySpec, expected: Tuple[Block, Tuple[float, ...]], found: Block
+    ) -> bool:
+        block, magnitudes = expected
+        if (block.rows, block.key_hash) != (found.rows, found.key_hash):
+            return False
+        for column, a, b, m in zip(spec.columns, block.sums, found.sums, magnitudes):
+            # Each stored value is rounded to half a unit of its column's scale.
+            if abs(a - b) > block.rows * rounding_unit(column) / 2 + SUM_TOLERANCE * m:
+                return False
+        return True
+
+    def _drill_down(
+        self, spec: EntitySpec, month: int, files: List[str], found: Block
+    ) -> Mismatch:
+        """Compares a block's records with its rows, key by key."""
+        micros, gvkeys, values = self._month_records(spec, month, files)
+        days = micros // US_PER_DAY
+        source_keys = encode(gvkeys, days)
+
+        first = month_start(month)
+        arrays = list(
+            self.reader.iter_arrays(
+                self.table,
+                list(spec.columns),
+                date_from=first,
+                date_to=month_start(month + 1) - timedelta(days=1),
+            )
+        )
+        target_days = np.concatenate(
+            [a["datadate"].astype("datetime64[D]").view(np.int64) for a in arrays]
+            or [np.array([], dtype=np.int64)]
+        )
+        target_gvkeys = np.concatenate(
+            [a["gvkey"] for a in arrays] or [np.array([], dtype=np.int32)]
+        )
+        target_values = {
+            c: np.concatenate([a[c] for a in arrays] or [np.array([], dtype=np.float64)])
+            for c in spec.columns
+        }
+        present = np.logical_or.reduce([~np.isnan(v) for v in target_values.values()])
+        target_keys = encode(target_gvkeys[present], target_days[present])
+
+        source_order = np.argsort(source_keys)
+        target_order = np.argsort(target_keys)
+        source_keys = source_keys[source_order]
+        target_keys = target_keys[target_order]
+        missing = source_keys[~np.isin(source_keys, target_keys)]
+        extra = target_keys[~np.isin(target_keys, source_keys)]
+
+        common, source_at, target_at = np.intersect1d(
+            source_keys, target_keys, assume_unique=True, return_indices=True
+        )
+        different = np.zeros(len(common), dtype=bool)
+        for column in spec.columns:
+            a = values[column][source_order][source_at]
+            b = target_values[column][present][target_order][target_at]
+            tolerance = rounding_unit(column) + SUM_TOLERANCE * np.abs(a)
+            same = (np.isnan(a) & np.isnan(b)) | (np.abs(a - b) <= tolerance)
+            different |= ~same
+        different_keys = common[different]
+
+        examples = []
+        for label, keys in (("missing", missing), ("extra", extra), ("different", different_keys)):
+            examples.extend(f"{label} {describe(k)}" for k in keys[: self.examples].tolist())
+        return Mismatch(
+            spec.name,
+            first,
+            len(source_keys),
+            found.rows,
+            len(missing),
+            len(extra),
+            len(different_keys),
+            tuple(examples),
+        )
+
+
+def to_months(micros: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 of datadates in microseconds since the epoch."""
+    days = micros // US_PER_DAY
+    return days.astype("datetime64[D]").astype("datetime64[M]").view(np.int64)
+
+
+def survivors(micros: np.ndarray, gvkeys: np.ndarray, last: bool = True) -> np.ndarray:
+    """Sorted positions of the records kept when (datadate, gvkey) keys repeat."""
+    keys = encode(gvkeys, micros // US_PER_DAY)
+    if last:
+        _, positions = np.unique(keys[::-1], return_index=True)
+        return np.sort(len(keys) - 1 - positions)
+    _, positions = np.unique(keys, return_index=True)
+    return np.sort(positions)
+
+
+def describe(key: int) -> str:
+    """'gvkey@YYYY-MM-DD' of a packed key."""
+    day = EPOCH + timedelta(days=key & 0xFFFFFFFF)
+    return f"{key >> 32}@{day.isoformat()}"
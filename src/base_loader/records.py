@@ -0,0 +1,65 @@
+"""Arrow conversion of modeled records."""
+
+from decimal import Decimal
+from typing import Iterator, List, Sequence, Tuple
+
+import pyarrow as pa
+
+from base_loader.schema import Column
+
+
+def arrow_type(column: Column) -> pa.DataType:
+    """Arrow type used to store a column of modeled records.
+
+    Decimals are modeled from floats and keep their full expansion, which does
+    not fit the table's precision, so they are stored as exact strings.
+    """
+    if column.sql_type == "TIMESTAMP":
+        return pa.timestamp("us")
+    if column.sql_type == "INTEGER":
+        return pa.int32()
+    if column.sql_type == "BIGINT":
+        return pa.int64()
+    return pa.string()
+
+
+def arrow_schema(columns: Sequence[Column]) -> pa.Schema:
+    """Arrow schema of records with the given columns."""
+    return pa.schema([(c.name, arrow_type(c)) for c in columns])
+
+
+def to_batch(records: List[Tuple], schema: pa.Schema) -> pa.RecordBatch:
+    """Converts modeled records to a record batch.
+
+    Args:
+        records: modeled records.
+        schema: schema from arrow_schema().
+
+    Returns:
+        Record batch.
+    """
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [r[i] for r in records]
+        if pa.types.is_string(field.type):
+            values = [None if v is None else str(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def from_batch(batch: pa.RecordBatch) -> Iterator[Tuple]:
+    """Converts a record batch from to_batch() back to modeled records.
+
+    Args:
+        batch: record batch.
+
+    Returns:
+        Iterator over the records.
+    """
+    columns = []
+    for field, column in zip(batch.schema, batch.columns):
+        values = column.to_pylist()
+        if pa.types.is_string(field.type):
+            values = [None if v is None else Decimal(v) for v in values]
+        columns.append(values)
+    return zip(*columns)
@@ -0,0 +1,116 @@
+"""Declarative registry of the loaded entities.
+
+Each entity is described by where its files are, how they are laid out, how
+its target columns are computed from them and which way its dates move in
+daily_base. transform.py executes these specs over whole Arrow batches, so
+adding an entity only takes an entry here, plus its columns in schema.py
+and the database.
+"""
+
+from enum import Enum
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class Layout(str, Enum):
+    """Layout of an entity's source files."""
+
+    # Dates as index, one column per gvkey.
+    WIDE = "wide"
+    # gvkeys as index, one column per date.
+    TRANSPOSED = "transposed"
+    # One row per (date, gvkey), one column per field, in parquet or CSV files.
+    RECORDS = "records"
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+class Field(NamedTuple):
+    """Target column of an entity and how it is computed.
+
+    A value is missing when the source cell is null, NaN or zero. Present
+    values are written as the exact Decimal of the source float, or truncated
+    to an int if 'integer' is set. A field with 'minus' is the difference of
+    two other fields, when both are present.
+    """
+
+    column: str
+    # Source column of a RECORDS layout, None for the cell of a wide layout.
+    source: Optional[str] = None
+    integer: bool = False
+    minus: Optional[Tuple[str, str]] = None
+
+
+class EntitySpec(NamedTuple):
+    """How an entity is read, modeled and written."""
+
+    name: str
+    source_dir: str
+    layout: Layout
+    fields: Tuple[Field, ...]
+    # Business days daily_base dates are moved: 1 forward, -1 backwards.
+    shift: int = 1
+    # Date and gvkey columns of a RECORDS layout.
+    date_column: str = "datadate"
+    gvkey_column: str = "gvkey"
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        """Target columns, written after the key."""
+        return tuple(f.column for f in self.fields)
+
+    @property
+    def source_columns(self) -> Tuple[str, ...]:
+        """Source columns of a RECORDS layout: date, gvkey, then fields."""
+        return (self.date_column, self.gvkey_column) + tuple(
+            f.source for f in self.fields if f.source is not None
+        )
+
+
+# In processing order.
+ENTITIES: Dict[str, EntitySpec] = {
+    spec.name: spec
+    for spec in (
+        EntitySpec(
+            "astec",
+            "astec",
+            Layout.RECORDS,
+            # Astec files name their columns as daily_base does, matched
+            # case-insensitively; a file lacking one of them is rejected. They
+            # carry no loan_rate_range, and their other columns are not read.
+            (
+                Field("utilization_pct", "utilization_pct"),
+                Field("bar", "bar", integer=True),
+                Field("age", "age"),
+                Field("tickets", "tickets", integer=True),
+                Field("units", "units"),
+                Field("market_value_usd", "market_value_usd"),
+                Field("loan_rate_avg", "loan_rate_avg"),
+                Field("loan_rate_max", "loan_rate_max"),
+                Field("loan_rate_min", "loan_rate_min"),
+                Field("loan_rate_range", minus=("loan_rate_max", "loan_rate_min")),
+                Field("loan_rate_stdev", "loan_rate_stdev"),
+            ),
+        ),
+        EntitySpec("market_cap", "market_cap", Layout.WIDE, (Field("market_cap"),)),
+        EntitySpec("returns", "returns", Layout.WIDE, (Field("rtn"),), shift=-1),
+        EntitySpec(
+            "shares_out",
+            "shares_out",
+            Layout.TRANSPOSED,
+            (Field("shares_out", integer=True),),
+        ),
+        EntitySpec("volume", "volume", Layout.WIDE, (Field("volume"),)),
+    )
+}
+
+
+class _Entity(str, Enum):
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+# Type of Entity, one member per registered entity, e.g. Entity.ASTEC.
+Entity = _Entity(
+    "Entity", {name.upper(): name for name in ENTITIES}, module=__name__, qualname="Entity"
+)
@@ -0,0 +1,213 @@
+"""Size-aware scheduling of row group units across workers."""
+
+import logging
+import os
+from time import monotonic
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from base_loader.discovery import list_files
+from base_loader.persistence.source import (
+    csv_compression,
+    index_columns,
+    is_csv,
+    read_csv_header,
+    Source,
+)
+from base_loader.registry import ENTITIES, Layout
+
+logger = logging.getLogger(__name__)
+
+# Rough peak memory per source cell while it is decoded, modeled and written:
+# Arrow column, float64 arrays and record tuple, Decimal values included.
+CELL_MEMORY_BYTES = 400
+# CSV files have no footer: their cells are estimated from the file size,
+# assuming this many text bytes per cell and this compression ratio.
+CSV_CELL_BYTES = 12
+CSV_COMPRESSION_RATIO = 5
+
+
+class Unit(NamedTuple):
+    """One row group of a source file, sized from the file footer.
+
+    A parquet file whose row groups share keys is a single unit, row group
+    None, so its duplicates are resolved by one worker. A CSV file is a single
+    unit, row group 0, sized from the file size.
+    """
+
+    entity: str
+    file_name: str
+    row_group: Optional[int]
+    rows: int
+    cells: int
+    uncompressed_bytes: int
+
+    @property
+    def memory(self) -> int:
+        """Estimated peak memory to load the unit, in bytes."""
+        return self.cells * CELL_MEMORY_BYTES
+
+
+def discover_units(directories: Iterable[Tuple[str, str]], pattern: str = "*") -> List[Unit]:
+    """Lists the row groups of the source files, reading each footer once.
+
+    A file whose row groups share keys is listed as one unit, so one worker
+    resolves its duplicates.
+
+    Args:
+        directories: (entity name, source directory) pairs.
+        pattern: glob selecting source files inside each directory.
+
+    Returns:
+        Units, largest first.
+    """
+    units = []
+    for entity, directory in directories:
+        for file in list_files(directory, pattern):
+            if is_csv(file):
+                units.append(csv_unit(entity, directory, file))
+                continue
+            file_path = os.path.join(directory, file)
+            metadata = pq.ParquetFile(file_path, memory_map=True).metadata
+            if shares_keys(file_path, entity):
+                logger.info(f"{file}: keys repeat across row groups, loaded as one unit.")
+                units.append(
+                    Unit(
+                        entity,
+                        file,
+                        None,
+                        metadata.num_rows,
+                        metadata.num_rows * metadata.num_columns,
+                        sum(
+                            metadata.row_group(i).total_byte_size
+                            for i in range(metadata.num_row_groups)
+                        ),
+                    )
+                )
+                continue
+            for i in range(metadata.num_row_groups):
+                row_group = metadata.row_group(i)
+                units.append(
+                    Unit(
+                        entity,
+                        file,
+                        i,
+                        row_group.num_rows,
+                        row_group.num_rows * row_group.num_columns,
+                        row_group.total_byte_size,
+                    )
+                )
+
+    units.sort(key=lambda u: u.cells, reverse=True)
+    logger.info(
+        f"{len(units)} row groups, {sum(u.rows for u in units)} rows, "
+        f"{sum(u.uncompressed_bytes for u in units) / 1024**2:.1f} MB uncompressed."
+    )
+    return units
+
+
+def shares_keys(file_path: str, entity: str) -> bool:
+    """Whether a (datadate, gvkey) key may repeat across a file's row groups.
+
+    The row key column is the date of a record or wide layout and the gvkey
+    of a transposed one. If its footer statistics show disjoint ranges, no
+    key can repeat. Otherwise the key columns are read and compared.
+
+    Args:
+        file_path: parquet file.
+        entity: entity the file belongs to.
+
+    Returns:
+        True if a key is found in two row groups.
+    """
+    parquet_file = pq.ParquetFile(file_path, memory_map=True)
+    metadata = parquet_file.metadata
+    if metadata.num_row_groups < 2:
+        return False
+    spec = ENTITIES[entity]
+    if spec.layout == Layout.RECORDS:
+        columns = Source.resolve_columns(
+            parquet_file.schema_arrow, (spec.date_column, spec.gvkey_column), file_path
+        )
+    else:
+        columns = index_columns(parquet_file.schema_arrow)[:1]
+        if not columns:
+            return False
+
+    position = metadata.schema.names.index(columns[0])
+    ranges = []
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(position).statistics
+        if stats is None or not stats.has_min_max:
+            break
+        ranges.append((stats.min, stats.max))
+    else:
+        ranges.sort()
+        if all(prev[1] < cur[0] for prev, cur in zip(ranges, ranges[1:])):
+            return False
+
+    groups = [
+        parquet_file.read_row_group(i, columns=columns).append_column(
+            "row_group", pa.array([i] * metadata.row_group(i).num_rows, pa.int32())
+        )
+        for i in range(metadata.num_row_groups)
+    ]
+    counts = pa.concat_tables(groups).group_by(columns).aggregate(
+        [("row_group", "count_distinct")]
+    )
+    return counts.num_rows > 0 and counts.column("row_group_count_distinct").to_numpy().max() > 1
+
+
+def csv_unit(entity: str, directory: str, file: str) -> Unit:
+    """Sizes a CSV file, read whole as one unit, from its size and header."""
+    file_path = os.path.join(directory, file)
+    size = os.path.getsize(file_path)
+    if csv_compression(file_path) is not None:
+        size *= CSV_COMPRESSION_RATIO
+    cells = size // CSV_CELL_BYTES
+    return Unit(entity, file, 0, cells // max(len(read_csv_header(file_path)), 1), cells, size)
+
+
+def next_unit(pending: List[Unit], in_flight_memory: int, memory_budget: int) -> int:
+    """Picks the next unit to start, longest processing time first.
+
+    The largest pending unit that fits in the memory left is started; if none
+    fits and nothing is running, the largest one is started alone.
+
+    Args:
+        pending: units not started yet, largest first.
+        in_flight_memory: estimated memory of the running units.
+        memory_budget: memory all running units may use together.
+
+    Returns:
+        Index of the unit in 'pending', -1 to wait for a running unit.
+    """
+    for i, unit in enumerate(pending):
+        if in_flight_memory + unit.memory <= memory_budget:
+            return i
+    return 0 if in_flight_memory == 0 and pending else -1
+
+
+class Progress:
+    """Progress and ETA over units, weighted by their cells."""
+
+    def __init__(self, units: List[Unit]) -> None:
+        self.total_units = len(units)
+        self.total_cells = max(sum(u.cells for u in units), 1)
+        self.done_units = 0
+        self.done_cells = 0
+        self._start = monotonic()
+
+    def advance(self, unit: Unit) -> None:
+        """Records a finished unit and logs progress."""
+        self.done_units += 1
+        self.done_cells += unit.cells
+        elapsed = monotonic() - self._start
+        share = self.done_cells / self.total_cells
+        eta = elapsed / share - elapsed if share else 0.0
+        logger.info(
+            f"{self.done_units}/{self.total_units} units, {share:.1%} of cells loaded, "
+            f"ETA {int(eta // 3600):02d}:{int(eta % 3600 // 60):02d}:{int(eta % 60):02d}."
+        )
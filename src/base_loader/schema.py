@@ -0,0 +1,71 @@
+"""Target table schema, mirroring db/daily_base.sql and db/true_base.sql."""
+
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+from base_loader.registry import ENTITIES
+
+
+class Column(NamedTuple):
+    """Target table column."""
+
+    name: str
+    sql_type: str
+
+
+DAILY_BASE: Tuple[Column, ...] = (
+    Column("datadate", "TIMESTAMP"),
+    Column("gvkey", "INTEGER"),
+    Column("utilization_pct", "DECIMAL(14,8)"),
+    Column("bar", "INTEGER"),
+    Column("age", "DECIMAL(18,7)"),
+    Column("tickets", "INTEGER"),
+    Column("units", "DECIMAL(18,4)"),
+    Column("market_value_usd", "DECIMAL(18,2)"),
+    Column("loan_rate_avg", "DECIMAL(18,9)"),
+    Column("loan_rate_max", "DECIMAL(18,9)"),
+    Column("loan_rate_min", "DECIMAL(18,9)"),
+    Column("loan_rate_range", "DECIMAL(18,9)"),
+    Column("loan_rate_stdev", "DECIMAL(18,9)"),
+    Column("market_cap", "DECIMAL(30,15)"),
+    Column("shares_out", "BIGINT"),
+    Column("volume", "DECIMAL(30,15)"),
+    Column("rtn", "DECIMAL(25,15)"),
+    Column("winsorized_5_rtn", "DECIMAL(25,15)"),
+)
+
+TRUE_BASE: Tuple[Column, ...] = tuple(
+    c for c in DAILY_BASE if c.name != "winsorized_5_rtn"
+)
+
+# Every modeled record starts with the key, in this order.
+KEY_COLUMNS = ("datadate", "gvkey")
+
+# Columns each entity owns, written after the key.
+ENTITY_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    name: spec.columns for name, spec in ENTITIES.items()
+}
+
+
+def columns(names: Sequence[str]) -> Tuple[Column, ...]:
+    """Looks up columns by name.
+
+    Args:
+        names: column names.
+
+    Returns:
+        Columns, in the order of 'names'.
+    """
+    by_name = {c.name: c for c in DAILY_BASE}
+    return tuple(by_name[n] for n in names)
+
+
+def record_columns(entity: str) -> Tuple[Column, ...]:
+    """Columns of an entity's modeled records: the key, then its own columns.
+
+    Args:
+        entity: entity name.
+
+    Returns:
+        Columns, in record order.
+    """
+    return columns(KEY_COLUMNS + ENTITY_COLUMNS[entity])
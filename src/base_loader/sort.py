@@ -0,0 +1,104 @@
+"""Primary key ordering of modeled records."""
+
+import heapq
+import logging
+from operator import itemgetter
+import os
+import shutil
+import tempfile
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+
+from base_loader.records import arrow_schema, from_batch, to_batch
+from base_loader.schema import Column
+
+logger = logging.getLogger(__name__)
+
+# (gvkey, datadate), the order of the target tables' primary key.
+primary_key = itemgetter(1, 0)
+
+
+class ExternalSorter:
+    """Sorts records by (gvkey, datadate), spilling sorted runs to disk.
+
+    Records are buffered in memory until 'memory_rows' is reached, then the
+    buffer is sorted and written as an Arrow IPC run. Iterating merges the runs,
+    read back through memory maps, with the remaining buffer. Sorting is stable,
+    so records sharing a key come out in the order they were added.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[Column],
+        memory_rows: int = 5_000_000,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        self.columns = tuple(columns)
+        self.memory_rows = memory_rows
+        self.schema = arrow_schema(self.columns)
+        self._spill_root = spill_dir
+        self._spill_dir = None
+        self._buffer: List[Tuple] = []
+        self._runs: List[str] = []
+        self._spilled = 0
+
+    def __enter__(self) -> "ExternalSorter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._buffer) + self._spilled
+
+    def add(self, records: List[Tuple]) -> None:
+        """Buffers records, spilling a sorted run when memory is full.
+
+        Args:
+            records: modeled records, (datadate, gvkey, ...) tuples.
+        """
+        self._buffer.extend(records)
+        if len(self._buffer) >= self.memory_rows:
+            self._spill()
+
+    def __iter__(self) -> Iterator[Tuple]:
+        """Yields all added records in (gvkey, datadate) order."""
+        self._buffer.sort(key=primary_key)
+        if not self._runs:
+            return iter(self._buffer)
+        logger.info(f"Merging {len(self._runs)} sorted runs...")
+        runs = [self._read_run(r) for r in self._runs]
+        return heapq.merge(*runs, iter(self._buffer), key=primary_key)
+
+    def close(self) -> None:
+        """Drops buffered records and removes spilled runs."""
+        self._buffer = []
+        self._runs = []
+        self._spilled = 0
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def _spill(self) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="base_loader-sort-", dir=self._spill_root)
+        self._buffer.sort(key=primary_key)
+        path = os.path.join(self._spill_dir, f"run-{len(self._runs):06d}.arrow")
+        logger.info(f"Spilling {len(self._buffer)} sorted records to {path}...")
+
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, self.schema) as writer:
+                for start in range(0, len(self._buffer), 100_000):
+                    chunk = self._buffer[start : start + 100_000]  # noqa
+                    writer.write_batch(to_batch(chunk, self.schema))
+
+        self._runs.append(path)
+        self._spilled += len(self._buffer)
+        self._buffer = []
+
+    def _read_run(self, path: str) -> Iterator[Tuple]:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield from from_batch(reader.get_batch(i))
@@ -0,0 +1,110 @@
+"""Write-ahead spool of modeled batches."""
+
+import logging
+import os
+from typing import Iterator, List, Tuple
+
+import pyarrow as pa
+
+from base_loader.records import arrow_schema, from_batch, to_batch
+from base_loader.schema import record_columns
+
+logger = logging.getLogger(__name__)
+
+
+class Spool:
+    """Durable local copy of the batches written since the last commit.
+
+    Every batch is stored as a zstd-compressed Arrow IPC segment, and synced to
+    disk, before it is sent to the database. Segments are removed once the
+    transaction that wrote them is committed, so after a failure the remaining
+    segments are exactly the batches the database may not have. Replaying them
+    is idempotent since they are written with key-based upserts.
+    """
+
+    def __init__(self, spool_dir: str) -> None:
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        self._unacked: List[str] = []
+        segments = self.segments()
+        self._seq = int(os.path.basename(segments[-1]).split("-")[0]) + 1 if segments else 0
+
+    def append(self, entity: str, table: str, records: List[Tuple]) -> str:
+        """Stores a batch before it is written.
+
+        Args:
+            entity: entity the records belong to.
+            table: table the records are written to.
+            records: modeled records.
+
+        Returns:
+            Segment path.
+        """
+        schema = arrow_schema(record_columns(entity)).with_metadata(
+            {"entity": entity, "table": table}
+        )
+        path = os.path.join(self.spool_dir, f"{self._seq:012d}-{table}-{entity}.arrow")
+        self._seq += 1
+
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with open(f"{path}.tmp", "wb") as f:
+            with pa.ipc.new_file(f, schema, options=options) as writer:
+                for start in range(0, len(records), 100_000):
+                    chunk = records[start : start + 100_000]  # noqa
+                    writer.write_batch(to_batch(chunk, schema))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+        self._unacked.append(path)
+        return path
+
+    def ack(self) -> None:
+        """Drops the segments of the transaction that was just committed."""
+        for path in self._unacked:
+            os.remove(path)
+        self._unacked = []
+
+    def remove(self, path: str) -> None:
+        """Drops a segment once it was replayed and committed."""
+        os.remove(path)
+
+    def discard(self) -> int:
+        """Drops every segment left by a failed run, without replaying it.
+
+        Returns:
+            Dropped segments.
+        """
+        segments = self.segments()
+        for path in segments:
+            os.remove(path)
+        if segments:
+            logger.warning(f"Discarded {len(segments)} spool segments without replaying them.")
+        return len(segments)
+
+    def segments(self) -> List[str]:
+        """Segments not yet acknowledged, oldest first."""
+        return sorted(
+            os.path.join(self.spool_dir, f)
+            for f in os.listdir(self.spool_dir)
+            if f.endswith(".arrow")
+        )
+
+    @staticmethod
+    def read(path: str) -> Tuple[str, str, Iterator[Tuple]]:
+        """Reads a segment back.
+
+        Args:
+            path: segment path.
+
+        Returns:
+            Entity, table and the segment's records.
+        """
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        metadata = reader.schema.metadata
+        records = (
+            r
+            for i in range(reader.num_record_batches)
+            for r in from_batch(reader.get_batch(i))
+        )
+        return metadata[b"entity"].decode(), metadata[b"table"].decode(), records
@@ -0,0 +1,141 @@
+"""Write rate limiting with latency feedback."""
+
+import logging
+from time import monotonic, sleep
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket allowing 'rate' units per second, with one second of burst.
+
+    Taking more tokens than are available leaves the bucket in debt and sleeps
+    until it is paid off, so batches larger than the burst are still paced.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._tokens = rate
+        self._stamp = monotonic()
+
+    def take(self, n: float) -> float:
+        """Takes tokens, sleeping if the bucket runs dry.
+
+        Args:
+            n: tokens to take.
+
+        Returns:
+            Seconds slept.
+        """
+        now = monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        self._tokens -= n
+        if self._tokens >= 0:
+            return 0.0
+        wait = -self._tokens / self.rate
+        sleep(wait)
+        return wait
+
+
+class Throttle:
+    """Limits writes to rows/s and bytes/s, optionally adapting to load.
+
+    With a latency or replication lag threshold, the limits are scaled with
+    additive increase, multiplicative decrease: halved whenever a statement is
+    slower than 'max_latency' or replicas lag more than 'max_lag', and raised
+    back by a tenth of the configured rate otherwise. Statements are observed
+    page by page, so the scale changes at most once per 'adjust_interval'
+    seconds, giving the previous change time to show in latencies.
+    """
+
+    def __init__(
+        self,
+        rows_per_second: Optional[float] = None,
+        bytes_per_second: Optional[float] = None,
+        max_latency: Optional[float] = None,
+        max_lag: Optional[float] = None,
+        lag_interval: float = 5.0,
+        min_scale: float = 0.05,
+        adjust_interval: float = 1.0,
+    ) -> None:
+        if (max_latency or max_lag) and not (rows_per_second or bytes_per_second):
+            raise ValueError("Latency feedback scales a rate limit, set rows/s or bytes/s.")
+        self.rows_per_second = rows_per_second
+        self.bytes_per_second = bytes_per_second
+        self.max_latency = max_latency
+        self.max_lag = max_lag
+        self.lag_interval = lag_interval
+        self.min_scale = min_scale
+        self.adjust_interval = adjust_interval
+        self.scale = 1.0
+        self._rows = TokenBucket(rows_per_second) if rows_per_second else None
+        self._bytes = TokenBucket(bytes_per_second) if bytes_per_second else None
+        self._lag_checked = 0.0
+        self._adjusted = 0.0
+
+    def share(self, n: int) -> "Throttle":
+        """Splits the limits between 'n' writers, each getting a new throttle.
+
+        Args:
+            n: writers sharing the limits.
+
+        Returns:
+            Throttle with the rates divided by 'n' and the same feedback.
+        """
+        return Throttle(
+            self.rows_per_second / n if self.rows_per_second else None,
+            self.bytes_per_second / n if self.bytes_per_second else None,
+            self.max_latency,
+            self.max_lag,
+            self.lag_interval,
+            self.min_scale,
+            self.adjust_interval,
+        )
+
+    def wait(self, rows: int, nbytes: int) -> None:
+        """Blocks until a write of 'rows' rows and 'nbytes' bytes is allowed."""
+        waited = 0.0
+        if self._rows is not None:
+            waited += self._rows.take(rows)
+        if self._bytes is not None:
+            waited += self._bytes.take(nbytes)
+        if waited:
+            logger.debug(f"Throttled for {waited:.2f}s.")
+
+    def lag_due(self) -> bool:
+        """Tells whether replication lag should be measured now."""
+        if self.max_lag is None or monotonic() - self._lag_checked < self.lag_interval:
+            return False
+        self._lag_checked = monotonic()
+        return True
+
+    def observe(self, latency: Optional[float] = None, lag: Optional[float] = None) -> None:
+        """Adapts the rates to the latency of the last statement.
+
+        Args:
+            latency: seconds the last page took, if it was measured.
+            lag: replication lag in seconds, if it was measured.
+        """
+        if self.max_latency is None and self.max_lag is None:
+            return
+        if latency is None and lag is None:
+            return
+        if monotonic() - self._adjusted < self.adjust_interval:
+            return
+        slow = self.max_latency is not None and latency is not None and latency > self.max_latency
+        lagging = self.max_lag is not None and lag is not None and lag > self.max_lag
+        if slow or lagging:
+            scale = max(self.scale / 2, self.min_scale)
+        else:
+            scale = min(self.scale + 0.1, 1.0)
+        if scale != self.scale:
+            self._adjusted = monotonic()
+            reason = "slow statements" if slow else "replication lag" if lagging else "recovered"
+            logger.info(f"Write rate scaled to {scale:.0%} ({reason}).")
+            self.scale = scale
+            if self._rows is not None:
+                self._rows.rate = self.rows_per_second * scale
+            if self._bytes is not None:
+                self._bytes.rate = self.bytes_per_second * scale
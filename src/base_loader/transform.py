@@ -0,0 +1,162 @@
+"""Columnar modeling of source batches into records, driven by entity specs."""
+
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from base_loader.registry import EntitySpec, Layout
+
+US_PER_DAY = 86_400 * 1_000_000
+
+
+def build_records(
+    spec: EntitySpec, micros: np.ndarray, gvkeys: np.ndarray, values: Dict[str, np.ndarray]
+) -> List[Tuple]:
+    """Builds the records of arrays from model_arrays.
+
+    Python objects are only built here, for the records that survived
+    modeling and validation: datetimes, ints and exact Decimals of the source
+    floats.
+
+    Args:
+        spec: entity spec.
+        micros: datadates as int64 microseconds since the epoch.
+        gvkeys: gvkeys as int64.
+        values: float64 values of each target column, NaN where missing.
+
+    Returns:
+        Records, (datadate, gvkey, *spec.columns) tuples, in array order.
+    """
+    datadates = micros.astype("datetime64[us]").astype(object).tolist()
+    columns: Dict[str, List[Optional[object]]] = {}
+    for field in spec.fields:
+        v = values[field.column]
+        mask = (~np.isnan(v)).tolist()
+        if field.minus is not None:
+            lhs, rhs = columns[field.minus[0]], columns[field.minus[1]]
+            columns[field.column] = [a - b if p else None for a, b, p in zip(lhs, rhs, mask)]
+        elif field.integer:
+            v = np.where(np.isnan(v), 0, v).astype(np.int64).tolist()
+            columns[field.column] = [x if p else None for x, p in zip(v, mask)]
+        else:
+            columns[field.column] = [Decimal(x) if p else None for x, p in zip(v.tolist(), mask)]
+
+    return list(zip(datadates, gvkeys.tolist(), *(columns[c] for c in spec.columns)))
+
+
+def model_arrays(
+    spec: EntitySpec, batch: pa.RecordBatch, true_base: bool
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """Models a source batch as arrays, one per key and target column.
+
+    Dates, gvkeys and values are converted column by column. Records with no
+    present value or on a weekend are dropped, and daily_base dates are moved
+    by one business day in the spec's direction, all as array operations.
+
+    Args:
+        spec: entity spec.
+        batch: (gvkey, date, value) cells of a wide or transposed layout, or
+            the spec's source_columns, in order, of a RECORDS layout.
+        true_base: keep source dates instead of shifting them for daily_base.
+
+    Returns:
+        datadates as int64 microseconds since the epoch, gvkeys as int64, and
+        the values of each target column as float64, NaN where missing,
+        truncated for integer fields, for the surviving records in batch order.
+
+    Raises:
+        ValueError: if a date or gvkey is null, or a date does not parse.
+    """
+    if spec.layout == Layout.RECORDS:
+        dates, gvkeys = batch.column(0), batch.column(1)
+        sources = [f for f in spec.fields if f.source is not None]
+        raw = {f.column: batch.column(i + 2) for i, f in enumerate(sources)}
+    else:
+        dates, gvkeys = batch.column("date"), batch.column("gvkey")
+        raw = {f.column: batch.column("value") for f in spec.fields if f.minus is None}
+
+    values = {column: floats(array) for column, array in raw.items()}
+    present = {column: ~np.isnan(v) & (v != 0) for column, v in values.items()}
+    for field in spec.fields:
+        if field.minus is not None:
+            present[field.column] = present[field.minus[0]] & present[field.minus[1]]
+
+    micros = timestamps(dates)
+    days = np.floor_divide(micros, US_PER_DAY)
+    # 1970-01-01 was a Thursday: Monday is 0, Saturday 5, Sunday 6.
+    weekday = (days + 3) % 7
+    keep = np.logical_or.reduce(list(present.values())) & (weekday < 5)
+    if not true_base:
+        micros = micros + shift_days(weekday, spec.shift) * US_PER_DAY
+
+    modeled = {}
+    for field in spec.fields:
+        mask = present[field.column][keep]
+        if field.minus is not None:
+            v = modeled[field.minus[0]] - modeled[field.minus[1]]
+        elif field.integer:
+            v = np.trunc(values[field.column][keep])
+        else:
+            v = values[field.column][keep]
+        modeled[field.column] = np.where(mask, v, np.nan)
+
+    return micros[keep], integers(gvkeys).astype(np.int64)[keep], modeled
+
+
+def floats(array: pa.Array) -> np.ndarray:
+    """Numeric column as float64, NaN for nulls."""
+    if not pa.types.is_float64(array.type):
+        array = array.cast(pa.float64())
+    return array.to_numpy(zero_copy_only=False)
+
+
+def integers(array: pa.Array) -> np.ndarray:
+    """gvkey column as integers, parsed if the gvkeys are column names.
+
+    Raises:
+        ValueError: if a gvkey is null.
+    """
+    if array.null_count:
+        raise ValueError("Null source gvkeys.")
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        array = array.cast(pa.int64())
+    return array.to_numpy(zero_copy_only=False)
+
+
+def timestamps(array: pa.Array) -> np.ndarray:
+    """Date column as int64 microseconds since the epoch.
+
+    Strings are parsed as 'YYYY-MM-DD', timestamps keep their UTC time of day.
+
+    Raises:
+        ValueError: if a date is null or does not parse.
+    """
+    if array.null_count:
+        raise ValueError("Null source dates.")
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        try:
+            array = pc.strptime(array, format="%Y-%m-%d", unit="us")
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"Invalid source date: {e}")
+    array = pc.cast(array, pa.timestamp("us"), safe=False)
+    return array.cast(pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def shift_days(weekday: np.ndarray, direction: int) -> np.ndarray:
+    """Days moving each date one business day forward or backwards.
+
+    Fridays move forward to Monday and Mondays back to Friday.
+
+    Args:
+        weekday: weekdays of the dates, Monday being 0.
+        direction: 1 forward, -1 backwards.
+
+    Returns:
+        Signed day offsets.
+    """
+    if direction > 0:
+        return np.where(weekday == 4, 3, 1)
+    return np.where(weekday == 0, -3, -1)
@@ -0,0 +1,158 @@
+"""Data quality validation of modeled records, with a quarantine for failures."""
+
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from base_loader.records import arrow_schema, to_batch
+from base_loader.registry import EntitySpec
+from base_loader.schema import ENTITY_COLUMNS, record_columns
+from base_loader.transform import build_records
+
+logger = logging.getLogger(__name__)
+
+
+class Rule(NamedTuple):
+    """Check on the values of one column of an entity's records.
+
+    A value fails when it is below 'lower', above 'upper', or above the
+    value of column 'not_above' of the same record. NULL values never fail.
+    """
+
+    code: str
+    entity: str
+    column: str
+    lower: Optional[float] = None
+    upper: Optional[float] = None
+    not_above: Optional[str] = None
+
+
+def load_rules(path: str) -> Tuple[Rule, ...]:
+    """Reads validation rules from a JSON file.
+
+    The file holds a list of objects with the fields of Rule, e.g.
+    {"code": "negative_volume", "entity": "volume", "column": "volume", "lower": 0}.
+
+    Args:
+        path: rules file.
+
+    Returns:
+        Rules, in file order.
+
+    Raises:
+        ValueError: if an entry is not a valid rule.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a list of rules.")
+    rules = []
+    for i, entry in enumerate(entries):
+        unknown = set(entry) - set(Rule._fields)
+        missing = {"code", "entity", "column"} - set(entry)
+        if unknown:
+            raise ValueError(f"{path}: rule {i} has unknown fields {', '.join(sorted(unknown))}.")
+        if missing:
+            raise ValueError(f"{path}: rule {i} misses fields {', '.join(sorted(missing))}.")
+        rules.append(Rule(**entry))
+    return tuple(rules)
+
+
+class Validator:
+    """Evaluates rules over whole batches of modeled records.
+
+    Rules run on the float64 arrays of model_arrays, before any Python
+    object is built, each rule one vectorized mask; NaN, a missing value,
+    never fails. Records failing any rule are dropped and written to a
+    parquet file in the quarantine directory, as they would have been
+    loaded, with the codes of the rules they failed. A dropped record leaves
+    its daily_base row without the entity's columns, so cleanup may delete
+    the row.
+    """
+
+    def __init__(self, quarantine_dir: str, rules: Sequence[Rule]) -> None:
+        self.quarantine_dir = quarantine_dir
+        self.rules = tuple(rules)
+        unknown = [r.code for r in self.rules if not self._known(r)]
+        if unknown:
+            raise ValueError(f"Rules on unknown entity columns: {', '.join(unknown)}")
+        os.makedirs(quarantine_dir, exist_ok=True)
+
+    @staticmethod
+    def _known(rule: Rule) -> bool:
+        columns = ENTITY_COLUMNS.get(rule.entity, ())
+        return rule.column in columns and rule.not_above in columns + (None,)
+
+    def validate(
+        self,
+        spec: EntitySpec,
+        micros: np.ndarray,
+        gvkeys: np.ndarray,
+        values: Dict[str, np.ndarray],
+        name: str,
+    ) -> Tuple[np.ndarray, Dict[str, int]]:
+        """Finds the records failing a rule of their entity.
+
+        Args:
+            spec: spec of the records' entity.
+            micros: datadates, as from model_arrays.
+            gvkeys: gvkeys, as from model_arrays.
+            values: values of each column, as from model_arrays.
+            name: name of the quarantine file, without extension.
+
+        Returns:
+            Mask of the valid records, and violations per rule code, only for
+            rules that failed.
+        """
+        valid = np.ones(len(micros), dtype=bool)
+        rules = [r for r in self.rules if r.entity == spec.name]
+        if not rules or not len(micros):
+            return valid, {}
+
+        failed = {}
+        with np.errstate(invalid="ignore"):
+            for rule in rules:
+                v = values[rule.column]
+                mask = np.zeros(len(v), dtype=bool)
+                if rule.lower is not None:
+                    mask |= v < rule.lower
+                if rule.upper is not None:
+                    mask |= v > rule.upper
+                if rule.not_above is not None:
+                    mask |= v > values[rule.not_above]
+                if mask.any():
+                    failed[rule.code] = mask
+
+        if not failed:
+            return valid, {}
+        valid = ~np.logical_or.reduce(list(failed.values()))
+        violations = {code: int(mask.sum()) for code, mask in failed.items()}
+        logger.warning(
+            f"{name}: {len(valid) - int(valid.sum())}/{len(valid)} records failed validation "
+            f"({', '.join(f'{c}: {n}' for c, n in violations.items())})."
+        )
+
+        rows = np.flatnonzero(~valid)
+        records = build_records(
+            spec, micros[rows], gvkeys[rows], {c: v[rows] for c, v in values.items()}
+        )
+        reasons = [
+            ",".join(code for code, mask in failed.items() if mask[i]) for i in rows.tolist()
+        ]
+        self._quarantine(spec.name, records, reasons, name)
+        return valid, violations
+
+    def _quarantine(
+        self, entity: str, records: List[Tuple], reasons: List[str], name: str
+    ) -> None:
+        schema = arrow_schema(record_columns(entity))
+        batch = to_batch(records, schema)
+        batch = batch.append_column("reasons", pa.array(reasons, type=pa.string()))
+        path = os.path.join(self.quarantine_dir, f"{name}.parquet")
+        pq.write_table(pa.Table.from_batches([batch]), path)
+        logger.info(f"{len(records)} records quarantined to {path}.")
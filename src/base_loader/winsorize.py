@@ -0,0 +1,41 @@
+"""Cross-sectional winsorization of returns."""
+
+from typing import Tuple
+
+import numpy as np
+
+# Returns are clipped to their 5th and 95th percentile on each date.
+LOWER = 0.05
+UPPER = 0.95
+
+
+def percentile_bounds(
+    groups: np.ndarray, values: np.ndarray, lower: float = LOWER, upper: float = UPPER
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Computes the lower and upper percentiles of every group at once.
+
+    Values are sorted by (group, value) with a single lexsort, then each
+    percentile is interpolated between the two ranks around it, like
+    PERCENTILE_CONT and numpy's default 'linear' method do.
+
+    Args:
+        groups: group of each value, e.g. days of the datadate.
+        values: values to winsorize, without NaNs.
+        lower: lower percentile, as a fraction.
+        upper: upper percentile, as a fraction.
+
+    Returns:
+        Sorted unique groups, and their lower and upper bounds.
+    """
+    order = np.lexsort((values, groups))
+    groups = groups[order]
+    values = values[order]
+    unique, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+
+    def interpolate(q: float) -> np.ndarray:
+        pos = starts + q * (counts - 1)
+        below = np.floor(pos).astype(np.int64)
+        above = np.ceil(pos).astype(np.int64)
+        return values[below] + (values[above] - values[below]) * (pos - below)
+
+    return unique, interpolate(lower), interpolate(upper)